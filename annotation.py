@@ -24,6 +24,7 @@
 
 import os
 import json
+import jsonio
 from collections import namedtuple
 
 # A point in the polygon
@@ -163,7 +164,7 @@ class Annotation:
             json.dump(self, f, default=lambda o: o.__dict__, sort_keys=True, indent=4)
 
     def fromJsonText(self, jsonText):
-        jsonDict = json.loads(jsonText)
+        jsonDict = jsonio.loads(jsonText)
         self.objects   = []
         for objIn in jsonDict[ 'children' ]:
             obj = CsObject()
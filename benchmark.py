@@ -0,0 +1,331 @@
+#!/usr/bin/python
+#   ----------------------
+#   The Tsinghua-Daimler Cyclist Benchmark
+#   ----------------------
+#
+#
+#   License agreement
+#-  ----------------
+#
+#   This dataset is made freely available for non-commercial purposes such as academic research, teaching, scientific publications, or personal experimentation. Permission is granted to use, copy, and distribute the data given that you agree:
+#   1. That the dataset comes "AS IS", without express or implied warranty. Although every effort has been made to ensure accuracy, Daimler (or the website host) does not accept any responsibility for errors or omissions.
+#   2. That you include a reference to the above publication in any published work that makes use of the dataset.
+#   3. That if you have altered the content of the dataset or created derivative work, prominent notices are made so that any recipients know that they are not receiving the original data.
+#   4. That you may not use or distribute the dataset or any derivative work for commercial purposes as, for example, licensing or selling the data, or using the data with a purpose to procure a commercial gain.
+#   5. That this original license notice is retained with all copies or derivatives of the dataset.
+#   6. That all rights not expressly granted to you are reserved by Daimler. 
+#
+#   Contact
+#   -------
+#
+#   Fabian Flohr
+#   mail: tdcb at fabian-flohr.de
+
+
+# Benchmarks of the hot paths of the tools on synthetic workloads (see synthetic.py):
+#   evaluateFrame       Evaluator.evaluateFrame, one call per frame (the loading of the frames is not measured)
+#   calcPR              Evaluator.calcPR over the dets of all frames, one call per repeat
+#   annotationJson      Annotation.fromJsonText, one call per frame
+#   disparityImage      CDepth.readFromDisparityImage, one call per frame
+#   imageToWorld        CIsoCamera.image_to_world, one call per box
+#
+# A scale gives the number of frames and boxes per frame (see SCALES). The frames are drawn from a pool of at most
+# poolFrames distinct synthetic frames (and disparityImages distinct images). Each benchmark runs in its own process
+# and reports the throughput (items per second), the percentiles of the latency of a single call and the peak memory
+# of the process. A benchmark stops early after maxSeconds, the results are based on the items processed until then.
+#
+# The results can be saved as json baseline and compared with a baseline, regressions (throughput lower or median
+# latency higher than the tolerance allows) are flagged and lead to exit code 1:
+#   python benchmark.py --scale 10k --save /tmp/baseline.json
+#   python benchmark.py --scale 10k --compare /tmp/baseline.json --tolerance 0.2
+
+import os
+import sys
+import json
+import shutil
+import Queue
+import argparse
+import platform
+import resource
+import tempfile
+import multiprocessing
+import numpy as np
+from timeit import default_timer as timer
+from synthetic import SyntheticDataset
+from evaluation import Evaluator
+from annotation import Annotation
+from camera import CIsoCamera
+from depth import CDepth
+
+BENCHMARK_VERSION = 1
+# unit of ru_maxrss per MB: kilobytes on Linux, bytes on macOS
+MAXRSS_PER_MB = 1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0
+# name -> (number of frames, boxes per frame)
+SCALES = {'1k': (1000, 10), '10k': (10000, 10), '100k': (100000, 10), '1k-100': (1000, 100), '1k-1000': (1000, 1000)}
+BENCHMARKS = ['evaluateFrame', 'calcPR', 'annotationJson', 'disparityImage', 'imageToWorld']
+
+
+class BenchmarkSuite(object):
+    def __init__(self, scale='1k', seed=0):
+
+        # ################################################
+        # ######### CONFIGURATION ##########
+
+        # name of the scale (see SCALES)
+        self.scale = scale
+        self.nFrames, self.boxesPerFrame = SCALES[scale]
+        # seed of the synthetic frames
+        self.seed = seed
+        # number of distinct synthetic frames, the workloads cycle through them
+        self.poolFrames = 200
+        # number of distinct disparity images
+        self.disparityImages = 10
+        # number of calls of calcPR
+        self.repeats = 5
+        # maximal run time of a single benchmark in seconds
+        self.maxSeconds = 60.0
+        # folder of the synthetic frames (temporary folder if None)
+        self.dataFolder = None
+
+        # ################################################
+
+    def getDataset(self):
+        # synthetic dataset with about boxesPerFrame gt objects and dets per frame
+        dataset = SyntheticDataset(self.seed)
+        dataset.objectsPerFrame = self.boxesPerFrame * 0.6
+        dataset.falsePositivesPerFrame = self.boxesPerFrame * 0.4
+        return dataset
+
+    # writes the pool of synthetic frames to the data folder
+    def prepare(self):
+        if self.dataFolder is None:
+            self.dataFolder = tempfile.mkdtemp(prefix='tdcbBenchmark_')
+        nPool = min(self.poolFrames, self.nFrames)
+        dataset = self.getDataset()
+        dataset.write(self.dataFolder, self.disparityImages, disparity=True, camera=True)
+        dataset.write(self.dataFolder, max(nPool - self.disparityImages, 0), firstFrame=self.disparityImages, disparity=False,
+                      camera=False)
+
+    def cleanup(self):
+        shutil.rmtree(self.dataFolder, ignore_errors=True)
+
+    def getFolder(self, name):
+        if name == 'detection':
+            return os.path.join(self.dataFolder, 'detection', 'synthetic')
+        return os.path.join(self.dataFolder, name, 'test', 'tsinghuaDaimlerDataset')
+
+    def getFiles(self, name, ext):
+        folder = self.getFolder(name)
+        return sorted(os.path.join(folder, fileName) for fileName in os.listdir(folder) if fileName.endswith(ext))
+
+    # Measures the latency of call(item) for each item, until all items are processed or maxSeconds elapsed. Returns
+    # the results as dict
+    def measure(self, items, call, prepareCall=None):
+        peakBefore = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        latencies = list()
+        start = timer()
+        for item in items:
+            if prepareCall is not None:
+                item = prepareCall(item)
+            callStart = timer()
+            call(item)
+            latencies.append(timer() - callStart)
+            if callStart - start > self.maxSeconds:
+                break
+        seconds = float(np.sum(latencies))
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        latencies = np.array(latencies) * 1000.0
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) if len(latencies) > 0 else (np.nan, np.nan, np.nan)
+        return {'nItems': len(latencies), 'seconds': seconds, 'throughput': len(latencies) / max(seconds, 1e-12),
+                'p50Ms': p50, 'p90Ms': p90, 'p99Ms': p99,
+                'peakMemoryMB': peak / MAXRSS_PER_MB, 'peakMemoryIncreaseMB': (peak - peakBefore) / MAXRSS_PER_MB}
+
+    # the frames of the scale, cycling through the pool
+    def iterFrames(self, pool, nFrames=None):
+        for idxFrame in xrange(self.nFrames if nFrames is None else nFrames):
+            yield pool[idxFrame % len(pool)]
+
+    def benchEvaluateFrame(self):
+        evaluator = Evaluator(self.getFolder('labelData'))
+        evaluator.pathToDetFiles = self.getFolder('detection')
+        evaluator.verbose = 0
+        if not evaluator.loadDataset():
+            return None
+
+        # parsed frames (the lists are copied before each call, evaluateFrame sorts and updates them)
+        pool = list()
+        while evaluator.currentGtFileIdx < len(evaluator.framePairs):
+            evaluator.loadFrame()
+            pool.append((evaluator.currentGtFile, evaluator.gtList, evaluator.detList))
+        evaluator.clear()
+
+        def prepareCall(frame):
+            evaluator.currentGtFile = evaluator.currentDetFile = frame[0]
+            evaluator.gtList = [dict(gt) for gt in frame[1]]
+            evaluator.detList = [dict(det) for det in frame[2]]
+        return self.measure(self.iterFrames(pool), lambda item: evaluator.evaluateFrame(), prepareCall)
+
+    def benchCalcPR(self):
+        # dets and gt of all frames with random scores and match states
+        rng = np.random.RandomState(self.seed)
+        nDets = self.nFrames * self.boxesPerFrame
+        evaluator = Evaluator(self.getFolder('labelData'))
+        isPositive = rng.uniform(size=nDets) < 0.5
+        matched = np.where(isPositive, (rng.uniform(size=nDets) < 0.9).astype(np.int8), 0)
+        matched[rng.uniform(size=nDets) < 0.05] = -1
+        evaluator.detAll.extend(rng.normal(size=nDets) + isPositive, matched)
+        evaluator.gtAll.extend(rng.uniform(size=nDets) < 0.3, np.zeros(nDets, dtype=bool))
+
+        return self.measure(xrange(self.repeats), lambda item: evaluator.calcPR())
+
+    def benchAnnotationJson(self):
+        pool = list()
+        for filePath in self.getFiles('labelData', '_labelData.json'):
+            with open(filePath, 'r') as f:
+                pool.append(f.read())
+        annotation = Annotation()
+        return self.measure(self.iterFrames(pool), annotation.fromJsonText)
+
+    def benchDisparityImage(self):
+        pool = self.getFiles('disparity', '_disparity.png')
+        cam = CIsoCamera()
+        cam.loadFromJson(self.getFiles('camera', '_camera.json')[0])
+        dep = CDepth()
+        dep.setCamera(cam)
+        return self.measure(self.iterFrames(pool), dep.readFromDisparityImage)
+
+    def benchImageToWorld(self):
+        cam = CIsoCamera()
+        cam.loadFromJson(self.getFiles('camera', '_camera.json')[0])
+
+        # bottom center of each gt box with the disparity of the road at that row
+        dataset = self.getDataset()
+        points = list()
+        for filePath in self.getFiles('labelData', '_labelData.json'):
+            with open(filePath, 'r') as f:
+                for obj in json.load(f)['children']:
+                    distance = dataset.intrinsic['fy'] * dataset.extrinsic['z'] / max(obj['maxrow'] - dataset.intrinsic['v0'], 1.0)
+                    points.append(((obj['mincol'] + obj['maxcol']) / 2.0, obj['maxrow'], cam.intrinsic.fx * cam.extrinsic.baseline / distance))
+
+        return self.measure(self.iterFrames(points, self.nFrames * self.boxesPerFrame), lambda p: cam.image_to_world(p[0], p[1], p[2]))
+
+    def runBenchmark(self, name):
+        return getattr(self, 'bench' + name[0].upper() + name[1:])()
+
+    # Runs the given benchmarks, each in its own process. Returns the results as dict (see saveResults)
+    def run(self, names=None):
+        results = {'version': BENCHMARK_VERSION, 'scale': self.scale, 'nFrames': self.nFrames,
+                   'boxesPerFrame': self.boxesPerFrame, 'python': platform.python_version(),
+                   'numpy': np.__version__, 'benchmarks': dict()}
+        bCleanup = self.dataFolder is None
+        self.prepare()
+        try:
+            for name in names or BENCHMARKS:
+                results['benchmarks'][name] = runInProcess(self, name)
+        finally:
+            if bCleanup:
+                self.cleanup()
+                self.dataFolder = None
+        return results
+
+
+# Runs a benchmark in a child process, so that the peak memory belongs to the benchmark only. If the child exits
+# without result (e.g. killed when out of memory), the result is an error with its exit code
+def runInProcess(suite, name, pollSeconds=1.0):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=runBenchmarkWorker, args=(suite, name, queue))
+    process.start()
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=pollSeconds)
+        except Queue.Empty:
+            if process.is_alive():
+                continue
+            # a result put right before the exit may still be on its way
+            try:
+                result = queue.get(timeout=pollSeconds)
+            except Queue.Empty:
+                process.join()
+                result = {'error': 'exit code {}'.format(process.exitcode)}
+    process.join()
+    return result
+
+
+def runBenchmarkWorker(suite, name, queue):
+    try:
+        queue.put(suite.runBenchmark(name))
+    except Exception as e:
+        queue.put({'error': '{}: {}'.format(type(e).__name__, e)})
+        raise
+
+
+def printResults(results):
+    print 'Scale {} ({} frames, {} boxes per frame)'.format(results['scale'], results['nFrames'], results['boxesPerFrame'])
+    print '{:<16} {:>9} {:>12} {:>10} {:>10} {:>10} {:>10}'.format('benchmark', 'items', 'items/s', 'p50 ms', 'p90 ms', 'p99 ms', 'peak MB')
+    for name in sorted(results['benchmarks']):
+        result = results['benchmarks'][name]
+        if result is None or 'error' in result:
+            print '{:<16} ERROR: {}'.format(name, result['error'] if result else 'no data')
+            continue
+        print '{:<16} {:>9} {:>12.1f} {:>10.4f} {:>10.4f} {:>10.4f} {:>10.1f}'.format(
+            name, result['nItems'], result['throughput'], result['p50Ms'], result['p90Ms'], result['p99Ms'], result['peakMemoryMB'])
+
+
+# Compares the results with a baseline of the same scale. Returns a list of (benchmark, message) of the regressions
+def compareResults(results, baseline, tolerance=0.2):
+    regressions = list()
+    if baseline['scale'] != results['scale']:
+        print 'ERROR: Baseline of scale {} cannot be compared with scale {}.'.format(baseline['scale'], results['scale'])
+        return [('all', 'scale mismatch')]
+    for name, result in sorted(results['benchmarks'].items()):
+        base = baseline['benchmarks'].get(name)
+        if base is None or result is None or 'error' in base or 'error' in result:
+            continue
+        ratio = result['throughput'] / base['throughput']
+        print '{:<16} throughput {:>7.1%} of baseline, p50 {:.4f} ms (baseline {:.4f} ms)'.format(name, ratio, result['p50Ms'], base['p50Ms'])
+        if ratio < 1.0 - tolerance:
+            regressions.append((name, 'throughput {:.1f}/s, baseline {:.1f}/s'.format(result['throughput'], base['throughput'])))
+        if result['p50Ms'] > base['p50Ms'] * (1.0 + tolerance):
+            regressions.append((name, 'p50 {:.4f} ms, baseline {:.4f} ms'.format(result['p50Ms'], base['p50Ms'])))
+    return regressions
+
+
+# runs the benchmarks, saves or compares the results
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmarks of the Tsinghua-Daimler Cyclist Benchmark tools on synthetic data.')
+    parser.add_argument('--scale', choices=sorted(SCALES.keys()), default='1k')
+    parser.add_argument('--benchmark', choices=BENCHMARKS, action='append', help='benchmark to run, can be repeated (default: all)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-seconds', type=float, default=60.0, help='maximal run time of a single benchmark')
+    parser.add_argument('--data', help='folder of the synthetic frames (kept), default: temporary folder')
+    parser.add_argument('--save', help='save the results as json baseline')
+    parser.add_argument('--compare', help='compare the results with this json baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative tolerance of the comparison')
+    opts = parser.parse_args(argv[1:])
+
+    suite = BenchmarkSuite(opts.scale, opts.seed)
+    suite.maxSeconds = opts.max_seconds
+    suite.dataFolder = opts.data
+    results = suite.run(opts.benchmark)
+    printResults(results)
+
+    if opts.save:
+        with open(opts.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print 'Saved results to: ' + opts.save
+
+    if opts.compare:
+        with open(opts.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compareResults(results, baseline, opts.tolerance)
+        for name, message in regressions:
+            print 'REGRESSION {}: {}'.format(name, message)
+        if regressions:
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -24,10 +24,24 @@
 
 import os
 import json
+import struct
+import numpy as np
+import jsonio
 from collections import namedtuple
 from annotation import JsonFrameObject
 
 
+# Packed detection results: all frames of one detection method in a single binary file. The file starts with
+# PACKED_MAGIC, followed by one record per frame: the length of the frame identifier and the number of detections
+# (PACKED_RECORD_HEADER), the frame identifier and the detections as PACKED_DET_DTYPE array. Records are only appended,
+# if a frame is written multiple times the last record is used. Detections without score are stored with score NaN.
+PACKED_MAGIC = 'TDCBDT01'
+PACKED_RECORD_HEADER = struct.Struct('<II')
+# identities are truncated to 16 characters
+PACKED_DET_DTYPE = np.dtype([('mincol', '<f8'), ('minrow', '<f8'), ('maxcol', '<f8'), ('maxrow', '<f8'),
+                             ('score', '<f8'), ('identity', 'S16')])
+
+
 # A single detection/object, using the same python layout as the json object
 class JsonDetObject:
     def __init__(self):
@@ -35,7 +49,7 @@ class JsonDetObject:
         self.maxrow = 0
         self.mincol = 0
         self.maxcol = 0
-        self.score = 0          # string
+        self.score = None       # float, None: no score (the evaluation uses its initScore)
 
         self.identity = "None"    # string, class informationen, e.g. "pedestrian"
         self.trackid = "None"     # string
@@ -51,8 +65,8 @@ class JsonDetObject:
         self.maxcol = int(jsonText['maxcol'])
         self.maxrow = int(jsonText['maxrow'])
 
-        # detection score (float)
-        self.score = float(jsonText['score'])
+        # detection score (float), missing if the detector has no scores
+        self.score = float(jsonText['score']) if jsonText.get('score') is not None else None
 
         # class type (str)
         self.identity = str(jsonText['identity'])
@@ -110,7 +124,7 @@ class Detection:
             json.dump(self, f, default=lambda o: o.__dict__, sort_keys=True, indent=4)
 
     def fromJsonText(self, jsonText):
-        jsonDict = json.loads(jsonText)
+        jsonDict = jsonio.loads(jsonText)
         self.objects   = []
         for objIn in jsonDict[ 'children' ]:
             obj = JsonDetObject()
@@ -133,6 +147,16 @@ class Detection:
 
         return allObjects
 
+    # frame identifier of the current frame, e.g. tsinghuaDaimlerDataset_2014-12-04_082614_000027014
+    def getFrameId(self):
+        return str.replace(str(self.imgName), '_leftImg8bit.png', '')
+
+    # append the current frame with all detections to a packed results file (see PACKED_MAGIC), the file is created if
+    # it does not exist. To write many frames use a PackedDetectionWriter instead, which keeps the file open
+    def appendToPackedFile(self, packedFile):
+        with PackedDetectionWriter(packedFile) as writer:
+            writer.write(self)
+
     # parse the imgName included in the groundtruth files into the right name scheme required by the evaluation script
     def createDetJsonFileNameFromImgName(self, imgNameFromGt):
         # e.g.:
@@ -142,6 +166,109 @@ class Detection:
 
 
 
+# Appends frames to a packed detection results file
+class PackedDetectionWriter:
+    def __init__(self, packedFile):
+        self.file = open(packedFile, 'ab')
+        # new file: start with the magic string
+        if self.file.tell() == 0:
+            self.file.write(PACKED_MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    # write all detections of the given Detection object
+    def write(self, detection):
+        dets = np.zeros(len(detection.objects), dtype=PACKED_DET_DTYPE)
+        for idx, obj in enumerate(detection.objects):
+            score = np.nan if obj.score is None else obj.score
+            dets[idx] = (obj.mincol, obj.minrow, obj.maxcol, obj.maxrow, score, obj.identity)
+        self.writeFrame(detection.getFrameId(), dets)
+
+    # write one frame given as PACKED_DET_DTYPE array
+    def writeFrame(self, frameId, dets):
+        frameId = str(frameId)
+        self.file.write(PACKED_RECORD_HEADER.pack(len(frameId), len(dets)))
+        self.file.write(frameId)
+        self.file.write(np.ascontiguousarray(dets, dtype=PACKED_DET_DTYPE).tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+# Reads a packed detection results file. buildIndex scans only the record headers, readFrame then reads a single frame.
+# The file stays open between the reads, frames read in the order of the file are read sequentially
+class PackedDetectionReader(object):
+    def __init__(self, packedFile):
+        self.packedFile = packedFile
+        # frame identifier -> (offset, number of detections) of the last record of the frame
+        self.index = None
+        self.file = None
+
+    # the open file is not pickled (e.g. when sending the reader to worker processes)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['file'] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    # closes the file opened by readFrame, the next readFrame opens it again
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def isValid(self):
+        with open(self.packedFile, 'rb') as f:
+            return f.read(len(PACKED_MAGIC)) == PACKED_MAGIC
+
+    # iterate over the record headers: (frameId, offset of the detections, number of detections)
+    def iterRecordHeaders(self, f):
+        f.seek(len(PACKED_MAGIC))
+        while True:
+            header = f.read(PACKED_RECORD_HEADER.size)
+            if len(header) < PACKED_RECORD_HEADER.size:
+                break
+            idLen, nDets = PACKED_RECORD_HEADER.unpack(header)
+            frameId = f.read(idLen)
+            offset = f.tell()
+            yield frameId, offset, nDets
+            f.seek(offset + nDets * PACKED_DET_DTYPE.itemsize)
+
+    def buildIndex(self):
+        self.index = dict()
+        with open(self.packedFile, 'rb') as f:
+            for frameId, offset, nDets in self.iterRecordHeaders(f):
+                self.index[frameId] = (offset, nDets)
+        return self.index
+
+    def getFrameIds(self):
+        if self.index is None:
+            self.buildIndex()
+        return sorted(self.index.keys())
+
+    # all detections of the given frame as PACKED_DET_DTYPE array, None if the frame is not part of the file
+    def readFrame(self, frameId):
+        if self.index is None:
+            self.buildIndex()
+        if frameId not in self.index:
+            return None
+        offset, nDets = self.index[frameId]
+        if self.file is None:
+            self.file = open(self.packedFile, 'rb')
+        self.file.seek(offset)
+        return np.frombuffer(self.file.read(nDets * PACKED_DET_DTYPE.itemsize), dtype=PACKED_DET_DTYPE)
+
+
+
 if __name__ == "__main__":
     jsonFile = "./Detections_sample.json"
     det = Detection('tsinghuaDaimlerDataset_2014-12-04_082614_000027014_leftImg8bit.png')
@@ -160,4 +287,7 @@ if __name__ == "__main__":
     # export the current frame with all added detection and save as json-file at given path
     #det.toJsonFile("./tsinghuaDaimlerDataset_2014-12-04_082614_000027014_detections.json")
 
+    # or append it to a packed results file containing all frames of the detection method
+    #det.appendToPackedFile("./ACF_detections.tdcbdet")
+
     testList = det.getLinearObjects()
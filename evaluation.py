@@ -25,9 +25,171 @@ import os
 import glob
 import json
 import re
+import copy
 import numpy as np
-import matplotlib.pyplot as plt
+import multiprocessing
 import sys
+import tempfile
+import csv
+import hashlib
+import argparse
+import jsonio
+from gtcache import GtCache
+from resultcache import ResultCache
+from instrumentation import Instrumentation, profileCall
+from detection import PackedDetectionReader
+
+# matplotlib.pyplot, imported on first use by getPyplot
+plt = None
+
+# Columns of the summary (see Evaluator.writeSummary) in the order of the CSV file
+SUMMARY_FIELDS = ['method', 'difficulty', 'ignoreOtherVRU', 'minIoU', 'nmsThreshold', 'attribute', 'group', 'nofPos',
+                  'recall', 'avgPrec', 'lower', 'upper', 'logAvgMissRate', 'nFrames']
+
+# Tags of the gt annotations which are relevant for the evaluation, see tagMask
+TAGS = ["occluded>10", "occluded>30", "occluded>40", "occluded>50", "occluded>80"]
+
+# Frame identifier of the dataset: tsinghuaDaimlerDataset_<date>_<sequence>_<frame>
+FRAME_ID_PATTERN = re.compile(r'_(\d{4}-\d{2}-\d{2})_(\d+)_(\d+)$')
+
+# Record of a spill run file (see Evaluator.spillDetRun), sorted desc by score
+SPILL_DTYPE = np.dtype([('score', '<f8'), ('matched', 'i1')])
+
+# Growable structured array of records (one per det or gt), the capacity is doubled when it is exceeded
+class RecordBuffer(object):
+    dtype = None
+
+    def __init__(self, capacity=1024):
+        self.data = np.zeros(capacity, dtype=self.dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    # appends n zeroed records, returns the slice of the new records
+    def append(self, n):
+        end = self.size + n
+        if end > len(self.data):
+            data = np.zeros(max(end, 2 * len(self.data)), dtype=self.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+        else:
+            self.data[self.size:end] = 0
+        records = slice(self.size, end)
+        self.size = end
+        return records
+
+    def getColumn(self, name):
+        return self.data[name][:self.size]
+
+    # sets the given columns (name=values) of the given records
+    def setColumns(self, records, columns):
+        for name, values in columns.items():
+            self.data[name][records] = values
+
+    def clear(self):
+        self.size = 0
+
+# Score and match state (1: matched, -1: matched with ignored gt, 0: not matched) of dets, 9 bytes per det
+class DetectionBuffer(RecordBuffer):
+    dtype = np.dtype([('score', np.float64), ('matched', np.int8)])
+
+    # appends dets, further columns are given by name (e.g. box=boxes)
+    def extend(self, scores, matched, **columns):
+        records = self.append(len(scores))
+        self.data['score'][records] = scores
+        self.data['matched'][records] = matched
+        self.setColumns(records, columns)
+
+    def getScores(self):
+        return self.getColumn('score')
+
+    def getMatched(self):
+        return self.getColumn('matched')
+
+# DetectionBuffer with the bb (x, y, w, h), class code, index of the matched gt record (-1: not matched) and index of the
+# frame of each det, 34 bytes per det. Only used for calcBreakdown (see keepDetRecords)
+class DetectionRecordBuffer(DetectionBuffer):
+    dtype = np.dtype([('score', np.float64), ('matched', np.int8), ('box', np.float32, (4,)), ('classCode', np.uint8),
+                      ('gtIdx', np.int32), ('frameIdx', np.int32)])
+
+# Bb (x, y, w, h), class code, ignore flag, match state, tags (bitmask, see tagMask) and index of the frame of gt,
+# 24 bytes per gt
+class GtBuffer(RecordBuffer):
+    dtype = np.dtype([('box', np.float32, (4,)), ('classCode', np.uint8), ('ignore', np.bool_), ('matched', np.bool_),
+                      ('tags', np.uint8), ('frameIdx', np.int32)])
+
+    # appends gt, further columns are given by name (e.g. box=boxes)
+    def extend(self, ignore, matched, **columns):
+        records = self.append(len(ignore))
+        self.data['ignore'][records] = ignore
+        self.data['matched'][records] = matched
+        self.setColumns(records, columns)
+
+    # number of non ignored gt
+    def getNofPos(self):
+        return self.size - int(np.count_nonzero(self.getColumn('ignore')))
+
+# Number of true and false positive dets in nBins equally wide score bins. The score range adapts to the added scores:
+# if a score lies outside of the range, the bin width is doubled (pairs of bins are merged) until it fits. The memory
+# is independent of the number of dets
+class ScoreHistogram(object):
+    def __init__(self, nBins=4096):
+        self.nBins = nBins + nBins % 2 # even, to merge pairs of bins
+        self.low = None
+        self.width = None
+        self.tp = np.zeros(self.nBins, dtype=np.int64)
+        self.fp = np.zeros(self.nBins, dtype=np.int64)
+
+    # adds dets with the given scores and match states, dets matched with an ignored gt (-1) are not counted
+    def add(self, scores, matched):
+        scores = np.asarray(scores, dtype=np.float64)
+        matched = np.asarray(matched)
+        isValid = matched != -1
+        scores = scores[isValid]
+        matched = matched[isValid]
+        if len(scores) == 0:
+            return
+        # an infinite score would expand the range forever
+        if not np.all(np.isfinite(scores)):
+            raise ValueError('Det scores must be finite for the score histogram, got {}'.format(scores[~np.isfinite(scores)][0]))
+
+        minScore = scores.min()
+        maxScore = scores.max()
+        if self.low is None:
+            # the highest score lies in the last bin
+            self.low = minScore
+            self.width = (maxScore - minScore) / (self.nBins - 1)
+            if self.width <= 0:
+                self.width = max(abs(minScore), 1.0) * 1e-6
+        while maxScore >= self.low + self.nBins * self.width:
+            self.expandUp()
+        while minScore < self.low:
+            self.expandDown()
+
+        idxBins = np.minimum(((scores - self.low) / self.width).astype(np.int64), self.nBins - 1)
+        self.tp += np.bincount(idxBins[matched == 1], minlength=self.nBins)
+        self.fp += np.bincount(idxBins[matched == 0], minlength=self.nBins)
+
+    # doubles the bin width, the lower bound of the range stays
+    def expandUp(self):
+        for counts in (self.tp, self.fp):
+            counts[:self.nBins // 2] = counts[0::2] + counts[1::2]
+            counts[self.nBins // 2:] = 0
+        self.width *= 2
+
+    # doubles the bin width, the upper bound of the range stays
+    def expandDown(self):
+        for counts in (self.tp, self.fp):
+            counts[self.nBins // 2:] = counts[0::2] + counts[1::2]
+            counts[:self.nBins // 2] = 0
+        self.low -= self.nBins * self.width
+        self.width *= 2
+
+    # number of true and false positive dets per non empty bin, sorted desc by score
+    def getCounts(self):
+        isUsed = (self.tp + self.fp)[::-1] > 0
+        return self.tp[::-1][isUsed], self.fp[::-1][isUsed]
 
 class Evaluator():
     def __init__(self, gtFilePath):
@@ -39,6 +201,8 @@ class Evaluator():
         self.verbose = 0
         # Different difficulties can be selected (easy, moderate, hard). See the paper for further details
         self.difficulty = 'easy'
+        # All difficulties, evaluated at once by runAllSettings
+        self.difficulties = ['easy', 'moderate', 'hard']
         # If true, other VRU ground truth boxes are used during the matching process, therefore other classes (e.g. motorcyclists)
         # which are detected and classified as the primary detection class (e.g. cyclist) do not cause a false positive
         self.ignoreOtherVRU = True  # if true other VRUs (see toleratedOtherClasses) are marked with the ignored flag, otherwise they are discarded
@@ -58,14 +222,39 @@ class Evaluator():
         self.gtExt = "_labelData.json"
         # extension of the det json-files
         self.detExt = "_detection.json"
+        # reader of the packed det file (see detection.py), if pathToDetFiles is a packed file instead of a directory
+        self.detReader = None
+        # path of the binary gt cache (see gtcache.py), e.g. /tmp/gtCache_test.bin. If set, the gt files are
+        # compiled into this file on the first run and read from it as long as none of the gt files changes
+        self.gtCacheFile = None
+        # currently loaded gt cache (None if no cache is used)
+        self.gtCache = None
+        # json module used to decode the gt and det files (see jsonio.JSON_BACKENDS), None: the fastest installed one
+        self.jsonBackend = None
+        # number of files read ahead in a background thread while the frames are evaluated, 0: no read-ahead
+        self.readAhead = 64
+        # reader of the files of the frames currently evaluated (see startPrefetch)
+        self.prefetcher = None
 
         # gt and det lists of the current frame
         self.detList = list()
         self.gtList = list()
 
-        # gt and det lists over the whole dataset
-        self.detListAll = list()
-        self.gtListAll = list()
+        # det and gt records over the whole dataset (see DetectionBuffer, DetectionRecordBuffer and GtBuffer)
+        self.detAll = DetectionBuffer()
+        self.gtAll = GtBuffer()
+        # tp and fp counts of all det per score bin, used instead of detAll if approximatePR is set
+        self.scoreHistogram = None
+        # (file, number of dets) of the spilled runs if spillDir is set
+        self.spillRuns = list()
+        # class names of the det and gt records, indexed by their class code
+        self.classNames = list()
+        # identifiers of the frames of the det and gt records, indexed by their frame index
+        self.frameIds = list()
+        # results of all runs as rows (dicts with keys of SUMMARY_FIELDS), see writeSummary
+        self.summary = list()
+        # phase timers and counters (see instrumentation.py), disabled by default: instrumentation.enabled = True
+        self.instrumentation = Instrumentation()
 
         # name of the currently processed frame/file
         self.currentDetFile = None
@@ -77,6 +266,12 @@ class Evaluator():
         self.gtFiles = list()
         # list of all det files
         self.detFiles = list()
+        # (gtFile, detFile) of all gt frames, joined by frame identifier (detFile is None if there is no det file)
+        self.framePairs = list()
+        # number of gt frames without det file
+        self.nMissingDetFiles = 0
+        # compiled regular expressions to extract the frame identifier from gt and det file names, by file extension
+        self.frameIdPatterns = dict()
 
         # ################################################
         # ######### DO NOT EDIT BELOW THIS LINE ##########
@@ -89,6 +284,20 @@ class Evaluator():
         self.toleratedOtherClasses = ['pedestrian', 'bike', 'motorcyclist', 'tricyclist', 'wheelchairuser', 'mopedrider']
         # Minimal intersection over union between a ground truth bb and a detection bb to establish the match
         self.minIoU = 0.5
+        # Frames with at least this number of det/gt pairs are matched on the overlapping pairs only (see calcIoUPairs),
+        # if the number of candidate pairs found by sort and sweep (see getOverlapCandidates) is at most
+        # sparseIoUMaxShare of all pairs. Requires minIoU > 0, the matches are the same
+        self.sparseIoUMinPairs = 20000
+        self.sparseIoUMaxShare = 0.1
+        # If set, the dets of each frame are reduced by greedy non maximum suppression with this IoU threshold before
+        # the evaluation, e.g. 0.5 (see calcNMSKeep). Used to evaluate raw detector output
+        self.nmsThreshold = None
+        # If set, only this number of dets with the highest scores is kept per frame (after NMS)
+        self.nmsTopK = None
+        # NMS thresholds evaluated by runNMSSweep
+        self.nmsThresholds = [0.3, 0.4, 0.5, 0.6, 0.7]
+        # IoU thresholds evaluated by runIoUSweep (0.5, 0.55, ..., 0.95)
+        self.iouThresholds = np.round(np.linspace(0.5, 0.95, 10), 2)
         # If no detection score is specified by the given detection, this value is used instead
         self.initScore = 1.0
         # If true, one ground truth annotation can be matched with multiple detections
@@ -96,6 +305,40 @@ class Evaluator():
         # reference points used to calculate the average precision
         self.referencePoints = np.linspace(0, 1, 11) # 0, 0.1, ..., 1.0
         self.referencePoints.sort() # expect reference points to be sorted ascending
+        # FPPI points used to calculate the log-average miss rate
+        self.fppiPoints = np.logspace(-2, 0, 9) # 0.01, 0.0178, ..., 1.0
+        # If true, run, runComparison and runNMSSweep plot the PR-graphs (matplotlib is imported on first use)
+        self.plot = True
+        # If true, run plots the MR-FPPI curves next to the PR-curves
+        self.plotMissRate = True
+        # bounds of the gt height bins in pixel used by calcBreakdown
+        self.heightBins = [0, 30, 45, 60, 90, 150, np.inf]
+        # If true, the bb, class, matched gt and frame of each det are kept (see DetectionRecordBuffer), set by
+        # runBreakdown. Otherwise only the score and match state are kept
+        self.keepDetRecords = False
+        # If true, the dets are only counted in score bins (see ScoreHistogram) instead of being kept, the PR-curve and
+        # the average precision are approximated. The memory is independent of the number of dets
+        self.approximatePR = False
+        # number of score bins if approximatePR is set
+        self.nScoreBins = 4096
+        # number of randomly sampled frames to estimate the error of approximatePR, 0: no estimation
+        self.nApproximationSampleFrames = 200
+        # Directory for temporary spill files, e.g. /tmp. If set, the dets are written to sorted run files whenever
+        # spillRunSize dets are collected and the exact PR-curve is calculated by merging the runs (bounded memory)
+        self.spillDir = None
+        # number of dets kept in memory before they are spilled
+        self.spillRunSize = 1000000
+        # number of dets read at once from each run while merging
+        self.spillBlockSize = 65536
+        # maximal number of points of the PR-curve returned from the spill runs (the curve is subsampled evenly)
+        self.maxCurvePoints = 100000
+        # Directory of the result cache (see resultcache.py), e.g. /tmp/tdcbResults. If set, run stores the curves of
+        # each method and setting and reuses them as long as the gt files, det files and configuration are unchanged.
+        # The per frame results are stored as well, only the frames with changed det files are matched again
+        # (see evaluateDatasetIncremental)
+        self.resultCacheDir = None
+        # size limit of the result cache directory in bytes, the least recently used results are removed first
+        self.resultCacheMaxBytes = 256 * 1024 * 1024
 
 
     # Load the currently selected dataset (given by gtFilePath and detFilePath)
@@ -106,26 +349,37 @@ class Evaluator():
         self.detFiles = []
 
         # Load all ground truth files
-        if os.path.isdir(self.pathToGtFiles) and len(self.gtFiles) <= 0:
-            # Search for all *.json to get the file list
-            self.gtFiles = glob.glob(self.pathToGtFiles + '/*' + self.gtExt )
-            self.gtFiles.sort()
-            self.currentGtFileIdx = 0
-
-            # check if empty
-            if len(self.gtFiles) == 0:
-                print "ERROR: No ground truth files found at given location! ABORT."
-		print "Given path was: {} and gt ext looked for was {}".format(self.pathToGtFiles, self.gtExt)
-                return 0
-        else:
-            print "ERROR: Not a vaild ground truth path."
-            print "Given path was: " + self.pathToGtFiles
+        if not self.loadGtFiles():
             return 0
 
         # Load all detection files at given location
-        if os.path.isdir(self.pathToDetFiles):
+        return self.loadDetFiles()
+
+    # Load the list of all detection files (given by detFilePath), the gt files have to be loaded already
+    def loadDetFiles(self):
+        self.detFiles = []
+        if self.detReader is not None:
+            self.detReader.close()
+        self.detReader = None
+        if os.path.isfile(self.pathToDetFiles):
+            # packed det file, each contained frame is represented by a virtual det file name
+            self.detReader = PackedDetectionReader(self.pathToDetFiles)
+            if not self.detReader.isValid():
+                print "ERROR: Not a valid packed detection file."
+                print "Given path was: " + self.pathToDetFiles
+                return 0
+            self.detFiles = [os.path.join(self.pathToDetFiles, frameId + self.detExt) for frameId in self.detReader.getFrameIds()]
+            self.currentDetFileIdx = 0
+
+            # check if empty
+            if len(self.detFiles) == 0:
+                print "ERROR: No detection frames found in given packed file! ABORT."
+                print "Given path was: {}".format(self.pathToDetFiles)
+                return 0
+        elif os.path.isdir(self.pathToDetFiles):
             # Search for all *.json to get the file list
-            self.detFiles = glob.glob(self.pathToDetFiles + '/*' + self.detExt)
+            with self.instrumentation.phase('glob'):
+                self.detFiles = glob.glob(self.pathToDetFiles + '/*' + self.detExt)
             self.detFiles.sort()
             self.currentDetFileIdx = 0
 
@@ -139,115 +393,90 @@ class Evaluator():
             print "Given path was: " + self.pathToDetFiles
             return 0
 
-        if (len(self.detFiles) != len(self.gtFiles)):
-            print "ERROR: Number of detection json files does not match the number of ground truth json files."
-            print "Please provide for each image in the ground truth set one detection file in the format tsinghuaDaimlerDataset_{seq:0>6}_{frame:0>9}_{self.detExt}."
-            return 0
+        # join gt and det files by their frame identifier
+        self.framePairs, self.nMissingDetFiles = self.pairFrameFiles()
+        if self.nMissingDetFiles > 0:
+            print "WARNING: No detection file for {} of {} ground truth frames, these frames are evaluated without detections.".format(self.nMissingDetFiles, len(self.gtFiles))
+            print "Detection files are expected in the format tsinghuaDaimlerDataset_{{date}}_{{seq:0>6}}_{{frame:0>9}}{}.".format(self.detExt)
 
         return 1
 
 
+    # Load the list of all ground truth files (given by gtFilePath) and the gt cache, if configured
+    def loadGtFiles(self):
+        if os.path.isdir(self.pathToGtFiles):
+            # Search for all *.json to get the file list
+            with self.instrumentation.phase('glob'):
+                self.gtFiles = glob.glob(self.pathToGtFiles + '/*' + self.gtExt )
+            self.gtFiles.sort()
+            self.currentGtFileIdx = 0
+
+            # check if empty
+            if len(self.gtFiles) == 0:
+                print "ERROR: No ground truth files found at given location! ABORT."
+		print "Given path was: {} and gt ext looked for was {}".format(self.pathToGtFiles, self.gtExt)
+                return 0
+
+            # load the gt from the binary cache, (re)compile it if the gt files have changed
+            self.gtCache = None
+            if self.gtCacheFile:
+                self.loadGtCache()
+        else:
+            print "ERROR: Not a vaild ground truth path."
+            print "Given path was: " + self.pathToGtFiles
+            return 0
+
+        return 1
+
     def loadFrame(self):
-        # get current det and gt filename
-        detFilePath = self.detFiles[self.currentDetFileIdx]
-        gtFilePath = self.gtFiles[self.currentGtFileIdx]
+        # get current gt filename and the det filename with the same frame identifier (None: no detections)
+        gtFilePath, detFilePath = self.framePairs[self.currentGtFileIdx]
+        gFrameId = self.getFrameId(gtFilePath, self.gtExt)
 
         # Check Data
         if not os.path.isfile(gtFilePath):
             print 'Given groundtruth json file not found: {}'.format(gtFilePath)
-            return
-        if not os.path.isfile(detFilePath):
-            print 'Given detection json file not found: {}'.format(detFilePath)
-            return
-        dFile = os.path.basename(detFilePath)
-        gFile = os.path.basename(gtFilePath)
-        dFrameId = re.search('(.*?)' + self.detExt, dFile).group(1)
-        gFrameId = re.search('(.*?)' + self.gtExt, gFile).group(1)
-        if gFrameId != dFrameId:
-            print 'Error: Frame identifier do not match. Check number and order of files in groundtruth and detection folder. Abort current frame.'
-            if dFrameId > gFrameId:
-                self.currentGtFileIdx +=1
-            else:
-                self.currentDetFileIdx += 1
+            self.currentGtFileIdx += 1
+            self.currentDetFileIdx += 1
             return 0
 
+        # read annotation (gt) json file, determine the ignore flag of each gt for the current settings
+        gtFrame = self.parseGtFile(gtFilePath)
+        isUsed, isIgnored = self.calcGtIgnore(gtFrame, self.difficulty, self.ignoreOtherVRU)
 
-        # read annotation (gt) json file
-        with open(gtFilePath, 'r') as f:
-            jsonGtText = f.read()
-
-        # get each annotation from current json file
-        jsonDict = json.loads(jsonGtText)
         self.gtList = []
-        for gtIn in jsonDict[ 'children' ]:
-            type = gtIn['identity']
-            h = gtIn['maxrow'] - gtIn['minrow']
-            w = gtIn['maxcol'] - gtIn['mincol']
-
-            # set ignore flag
-            if type == self.detectionsType:
-                ignore = 0
-            elif self.ignoreOtherVRU and type in self.toleratedOtherClasses:
-                ignore = 1
-            elif h < 30 or "occluded>80" in gtIn['tags']:
-                # Do not skip detections, which are to small or occluded
-                ignore = 1
-            else:
-                # dont use this annotation
-                continue
-
-            # determine if current gt is within difficulty, otherwise set ignore
-            if h < 30 or "occluded>80" in gtIn['tags']:
-                # either smaller than 30px or occluded more than half of the object -> ignore = 1
-                ignore = 1
-            elif self.difficulty != "hard" and (h < 45 or "occluded>40" in gtIn['tags']):
-                # mod, but gt h < 45 or occluded more than 10
-                ignore = 1
-            elif self.difficulty != "hard" and self.difficulty != "moderate" and (h < 60 or "occluded>10" in gtIn['tags']):
-                # easy, but gt h < 60 or occluded
-                ignore = 1
-
+        for idxGt in np.flatnonzero(isUsed):
+            x, y, w, h = gtFrame['boxes'][idxGt]
             gt = {
-                'x': gtIn['mincol'],
-                'y': gtIn['minrow'],
+                'x': x,
+                'y': y,
                 'w': w,
                 'h': h,
-                'type': type,
-                'ignore': ignore,
+                'type': gtFrame['identity'][idxGt],
+                'ignore': int(isIgnored[idxGt]),
+                'tags': gtFrame['tags'][idxGt],
                 'matched': 0,       # used during the evaluation
             }
             self.gtList.append(gt)
 
+        # read detection json file, remove the dets suppressed by NMS (if enabled)
+        detFrame = self.applyNMS(self.parseDetFile(detFilePath))
 
-        # read detection json file
-        with open(detFilePath, 'r') as f:
-            jsonDetText = f.read()
-
-        # save each detection from current json file
-        jsonDict = json.loads(jsonDetText)
         self.detList = []
-        for detIn in jsonDict[ 'children' ]:
-
-            if 'score' in detIn:
-                score = detIn['score']
-            else:
-                score = self.initScore
-
+        for idxDet in range(len(detFrame['scores'])):
+            x, y, w, h = detFrame['boxes'][idxDet]
             det = {
-                'x': detIn['mincol'],
-                'y': detIn['minrow'],
-                'w': detIn['maxcol'] - detIn['mincol'],
-                'h': detIn['maxrow'] - detIn['minrow'],
-                'type': detIn['identity'],
-                'score': score,
+                'x': x,
+                'y': y,
+                'w': w,
+                'h': h,
+                'type': self.detectionsType,
+                'score': detFrame['scores'][idxDet],
                 'matched': 0,       # used during the evaluation
             }
-	     
-            # we only accept detections of type detectionsType (here only "cyclist"). All other detections are ignored
-	    if detIn['identity'] == self.detectionsType:
-                self.detList.append(det)
+            self.detList.append(det)
 
-        self.currentDetFile = dFrameId
+        self.currentDetFile = gFrameId
         self.currentGtFile = gFrameId
 
         if self.verbose > 0:
@@ -258,59 +487,449 @@ class Evaluator():
         return 1
 
 
-    def evaluateFrame(self):
-
-        # sort det lists by detection score desc
-        self.detList.sort(key=lambda k: k['score'], reverse=True)
+    def loadGtCache(self):
+        # Loads the gt cache for the current gt files, the cache is compiled if it does not exist or is outdated
+        self.gtCache = None
+        gtCache = GtCache(self.gtCacheFile)
+        if not gtCache.load(self.gtFiles, TAGS):
+            print "Compiling ground truth cache: {}".format(self.gtCacheFile)
+            frameIds, frames = self.parseAllGtFiles()
+            try:
+                gtCache.write(self.gtFiles, TAGS, frameIds, frames)
+            except (IOError, OSError) as e:
+                print "WARNING: Could not write ground truth cache, continue without it: {}".format(e)
+                return 0
+            if not gtCache.load(self.gtFiles, TAGS):
+                print "WARNING: Ground truth files changed while compiling the cache, continue without it."
+                return 0
 
-        # sort gt_list by ignore flag (ignored gt at the end of the list)
-        self.gtList.sort(key=lambda k: k['ignore'])
+        self.gtCache = gtCache
+        return 1
 
-        # iterate over all detections (sorted by score) and find best matching gt (highest IoU)
-        for det in self.detList:
-            maxIoU = self.minIoU
-            idxBestGt = -1
-            matchedWithIgnore = False
+    def loadGtMemory(self):
+        # Parses all gt files once and keeps them in memory in the compact form of the gt cache (without cache file)
+        frameIds, frames = self.parseAllGtFiles()
+        gtCache = GtCache(None)
+        gtCache.fromFrames(TAGS, frameIds, frames)
+        self.gtCache = gtCache
+
+    def parseAllGtFiles(self):
+        # frame identifiers and parsed frames of all gt files
+        frameIds = [self.getFrameId(gtFilePath, self.gtExt) for gtFilePath in self.gtFiles]
+        self.startPrefetch([(gtFilePath, None) for gtFilePath in self.gtFiles])
+        try:
+            frames = [self.parseGtFile(gtFilePath) for gtFilePath in self.gtFiles]
+        finally:
+            self.stopPrefetch()
+        return frameIds, frames
+
+    def startPrefetch(self, framePairs):
+        # Starts to read the gt and det json files of the given frame pairs in the order of the frames in a background
+        # thread (see jsonio.FilePrefetcher), if readAhead > 0. Files of the gt cache and packed det files are skipped
+        self.stopPrefetch()
+        filePaths = list()
+        for gtFilePath, detFilePath in framePairs:
+            if self.gtCache is None:
+                filePaths.append(gtFilePath)
+            if detFilePath is not None and self.detReader is None:
+                filePaths.append(detFilePath)
+        if self.readAhead > 0 and len(filePaths) > 0:
+            self.prefetcher = jsonio.FilePrefetcher(filePaths, self.readAhead)
+
+    def stopPrefetch(self):
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
+
+    def readFile(self, filePath):
+        # text of a json file, prefetched if possible
+        with self.instrumentation.phase('read'):
+            if self.prefetcher is not None:
+                text = self.prefetcher.read(filePath)
+            else:
+                with open(filePath, 'r') as f:
+                    text = f.read()
+        self.instrumentation.count('bytesRead', len(text))
+        return text
+
+    def parseGtFile(self, gtFilePath):
+        # Reads a gt json file (or the frame from the gt cache, if loaded). Returns the boxes (rows of x, y, w, h), the
+        # class and a bitmask of the tags (see tagMask) of each annotation, independent of the difficulty and ignore
+        # settings
+        if self.gtCache is not None:
+            gtFrame = self.gtCache.getFrame(self.getFrameId(gtFilePath, self.gtExt))
+            if gtFrame is not None:
+                return gtFrame
+
+        jsonGtText = self.readFile(gtFilePath)
+        with self.instrumentation.phase('jsonLoads'):
+            jsonDict = jsonio.loads(jsonGtText, self.jsonBackend)
+
+        boxes, identity, tagLists = jsonio.decodeGtObjects(jsonDict[ 'children' ])
+        tags = np.array(map(tagMask, tagLists), dtype=np.int32)
+
+        return {'boxes': boxes, 'identity': identity, 'tags': tags}
+
+    def parseDetFile(self, detFilePath):
+        # Reads a det json file (or the frame from the packed det file, if loaded). Returns the boxes (rows of
+        # x, y, w, h) and scores of all dets of type detectionsType. A frame without det file (None) has no dets
+        if detFilePath is None:
+            return {'boxes': np.zeros((0, 4)), 'scores': np.zeros(0)}
+
+        if self.detReader is not None:
+            dets = self.detReader.readFrame(self.getFrameId(detFilePath, self.detExt))
+            dets = dets[dets['identity'] == self.detectionsType]
+            boxes = np.column_stack([dets['mincol'], dets['minrow'], dets['maxcol'] - dets['mincol'], dets['maxrow'] - dets['minrow']])
+            # dets without score are stored with score NaN, as in the json files their score is initScore
+            scores = np.array(dets['score'])
+            scores[np.isnan(scores)] = self.initScore
+            return {'boxes': boxes.reshape(-1, 4), 'scores': scores}
+
+        jsonDetText = self.readFile(detFilePath)
+        with self.instrumentation.phase('jsonLoads'):
+            jsonDict = jsonio.loads(jsonDetText, self.jsonBackend)
+
+        # we only accept detections of type detectionsType (here only "cyclist"). All other detections are ignored
+        boxes, scores = jsonio.decodeDetObjects(jsonDict[ 'children' ], self.detectionsType, self.initScore)
+
+        return {'boxes': boxes, 'scores': scores}
+
+    def calcGtIgnore(self, gtFrame, difficulty, ignoreOtherVRU):
+        # Determines for each gt of a parsed frame if it is used for the evaluation and if it is marked as ignored
+        identity = gtFrame['identity']
+        h = gtFrame['boxes'][:, 3]
+        tags = gtFrame['tags']
+
+        isType = identity == self.detectionsType
+        isOtherVRU = np.array([t in self.toleratedOtherClasses for t in identity], dtype=bool)
+        # either smaller than 30px or occluded more than half of the object
+        isHard = (h < 30) | ((tags & tagMask(["occluded>80"])) != 0)
+
+        # other VRU are only used (as ignored) if ignoreOtherVRU is set. Do not skip detections, which are to small
+        # or occluded. All other annotations are not used
+        isUsed = isType | isHard
+        if ignoreOtherVRU:
+            isUsed |= isOtherVRU
+
+        # determine if current gt is within difficulty, otherwise set ignore
+        isIgnored = ~isType | isHard
+        if difficulty != "hard":
+            # mod, but gt h < 45 or occluded more than 10
+            isIgnored |= (h < 45) | ((tags & tagMask(["occluded>40"])) != 0)
+        if difficulty != "hard" and difficulty != "moderate":
+            # easy, but gt h < 60 or occluded
+            isIgnored |= (h < 60) | ((tags & tagMask(["occluded>10"])) != 0)
+
+        return isUsed, isIgnored
+
+    def getFrameId(self, filePath, ext):
+        # frame identifier of a gt or det file, e.g. tsinghuaDaimlerDataset_2014-12-04_082614_000027014
+        pattern = self.frameIdPatterns.get(ext)
+        if pattern is None:
+            pattern = self.frameIdPatterns[ext] = re.compile('(.*?)' + re.escape(ext))
+        return pattern.search(os.path.basename(filePath)).group(1)
+
+    def pairFrameFiles(self):
+        # Joins the gt and det files by their frame identifier. Returns the (gtFile, detFile) pairs of all gt files in
+        # their order and the number of gt files without det file (detFile is None). Det files without gt are not used
+        detFileIndex = dict((self.getFrameId(detFilePath, self.detExt), detFilePath) for detFilePath in self.detFiles)
+        framePairs = [(gtFilePath, detFileIndex.get(self.getFrameId(gtFilePath, self.gtExt))) for gtFilePath in self.gtFiles]
+        nMissingDetFiles = sum(1 for framePair in framePairs if framePair[1] is None)
+
+        return framePairs, nMissingDetFiles
+
+    def evaluateDatasetParallel(self, workers):
+        # Evaluates all frames of the currently loaded dataset with a pool of worker processes. Each worker parses
+        # and matches a contiguous chunk of frames. The results are merged in frame order, so that calcPRFromArrays
+        # yields exactly the same result as the serial evaluation
+        results = self.mapFrameChunks(evaluateFrameChunk, self.framePairs, workers)
+
+        scores = np.concatenate([np.zeros(0)] + [r[0] for r in results])
+        matched = np.concatenate([np.zeros(0, dtype=np.int8)] + [r[1] for r in results])
+        nofPos = sum(r[2] for r in results)
+        nProcessedFrames = sum(r[3] for r in results)
+
+        return scores, matched, nofPos, nProcessedFrames
+
+    def mapFrameChunks(self, chunkFunc, framePairs, workers, *chunkArgs):
+        # Splits the frame pairs into contiguous chunks and applies chunkFunc((evaluator, chunk) + chunkArgs) to each
+        # chunk with a pool of worker processes. Returns the results in the order of the chunks, the instrumentation
+        # of the workers is added to the instrumentation of this evaluator
+        # the evaluator is sent to the workers without its file lists, they only get their own chunk
+        worker = copy.copy(self)
+        worker.spillRuns = list() # the spill runs belong to this evaluator
+        worker.clear()
+        worker.gtFiles = list()
+        worker.detFiles = list()
+        worker.framePairs = list()
+        worker.instrumentation = Instrumentation(self.instrumentation.enabled)
+        worker.prefetcher = None
+
+        nChunks = min(len(framePairs), workers * 4)
+        chunkSize = int(np.ceil(len(framePairs) / float(max(nChunks, 1))))
+        chunks = [(chunkFunc, worker, framePairs[idx:idx + chunkSize]) + chunkArgs for idx in range(0, len(framePairs), chunkSize)]
+
+        results = list()
+        for result, instrumentation in mapWorkers(evaluateFrameChunkInstrumented, chunks, workers):
+            self.instrumentation.merge(instrumentation)
+            results.append(result)
+        return results
+
+    def evaluateFramePairs(self, framePairs, settings):
+        # Parses each given frame once and matches it for every given setting (difficulty, ignoreOtherVRU, minIoU) or
+        # (difficulty, ignoreOtherVRU, minIoU, nmsThreshold), without nmsThreshold self.nmsThreshold is used. The IoU
+        # of the dets and gt of a frame is calculated once and shared by all settings.
+        # Returns the scores of all det in frame order (the same for all settings), the number of det of each frame and
+        # per setting the match states of the det (-1 for det suppressed by NMS) and the number of non ignored gt of
+        # each frame
+        scoresAll = list()
+        matchedAll = dict((setting, list()) for setting in settings)
+        nofPos = dict((setting, np.zeros(len(framePairs), dtype=np.int64)) for setting in settings)
+        detCounts = np.zeros(len(framePairs), dtype=np.int64)
+
+        # settings which share the same NMS threshold and gt ignore flags
+        settingGroups = dict()
+        for setting in settings:
+            nmsThreshold = setting[3] if len(setting) > 3 else self.nmsThreshold
+            settingGroups.setdefault(nmsThreshold, dict()).setdefault(setting[:2], list()).append(setting)
+        minIoUMin = min(setting[2] for setting in settings) if len(settings) > 0 else self.minIoU
+
+        self.startPrefetch(framePairs)
+        try:
+            for idxFrame, (gtFilePath, detFilePath) in enumerate(framePairs):
+                gtFrame = self.parseGtFile(gtFilePath)
+                detFrame = self.parseDetFile(detFilePath)
+
+                # sort dets by detection score desc
+                order = np.argsort(-detFrame['scores'], kind='mergesort')
+                detBoxes = detFrame['boxes'][order]
+                detScores = detFrame['scores'][order]
+                scoresAll.append(detScores)
+                detCounts[idxFrame] = len(order)
+
+                with self.instrumentation.phase('matching'):
+                    # with several NMS thresholds, the overlapping pairs of the dets and the IoU of the dets with all gt
+                    # (once with the regular union and once with the union used for ignored gt) are calculated once for
+                    # the raw dets, each threshold selects the kept dets
+                    nGt = len(gtFrame['boxes'])
+                    nmsPairs = None
+                    iouRaw = None
+                    if len(settingGroups) > 1:
+                        nmsThresholds = [nmsThreshold for nmsThreshold in settingGroups if nmsThreshold is not None]
+                        if len(nmsThresholds) > 0:
+                            nmsPairs = self.calcNMSPairs(detBoxes, min(nmsThresholds))
+                        iouRaw = (self.calcFrameIoU(gtFrame['boxes'], np.zeros(nGt, dtype=bool), detBoxes, minIoUMin),
+                                  self.calcFrameIoU(gtFrame['boxes'], np.ones(nGt, dtype=bool), detBoxes, minIoUMin))
+
+                    for nmsThreshold, groups in settingGroups.items():
+                        idxKept = np.flatnonzero(self.calcNMSKeep(detBoxes, detScores, nmsThreshold, self.nmsTopK, nmsPairs))
+
+                        # IoU of the kept det with all gt
+                        if iouRaw is None:
+                            iouRegular = self.calcFrameIoU(gtFrame['boxes'], np.zeros(nGt, dtype=bool), detBoxes[idxKept], minIoUMin)
+                            iouIgnore = self.calcFrameIoU(gtFrame['boxes'], np.ones(nGt, dtype=bool), detBoxes[idxKept], minIoUMin)
+                        else:
+                            iouRegular = self.selectDetIoU(iouRaw[0], idxKept)
+                            iouIgnore = self.selectDetIoU(iouRaw[1], idxKept)
+
+                        for (difficulty, ignoreFlag), groupSettings in groups.items():
+                            isUsed, isIgnored = self.calcGtIgnore(gtFrame, difficulty, ignoreFlag)
+
+                            idxGts = self.sortUsedGt(isUsed, isIgnored)
+                            gtIgnore = isIgnored[idxGts]
+                            iou = self.selectGtIoU(iouRegular, iouIgnore, idxGts, gtIgnore)
+
+                            for setting in groupSettings:
+                                detMatched = np.full(len(order), -1, dtype=np.int8)
+                                detMatched[idxKept] = self.matchFrame(iou, gtIgnore, setting[2])[0]
+                                matchedAll[setting].append(detMatched)
+                                nofPos[setting][idxFrame] = len(gtIgnore) - int(np.count_nonzero(gtIgnore))
+                self.countFrame(len(order), len(gtFrame['boxes']))
+        finally:
+            self.stopPrefetch()
+
+        scores = np.concatenate([np.zeros(0)] + scoresAll)
+        matched = dict((setting, np.concatenate([np.zeros(0, dtype=np.int8)] + matchedAll[setting])) for setting in settings)
+
+        return scores, detCounts, matched, nofPos
+
+    def calcNMSKeep(self, boxes, scores, nmsThreshold, topK=None, nmsPairs=None):
+        # Greedy non maximum suppression: in the order of their scores (desc, stable), dets are kept unless their IoU
+        # with an already kept det exceeds nmsThreshold. Of the kept dets, only the topK with the highest scores remain.
+        # nmsThreshold None or topK None disables the respective step. nmsPairs are the overlapping pairs of the sorted
+        # dets (see calcNMSPairs) with at least all pairs with IoU > nmsThreshold, calculated if not given. Returns a
+        # flag for each det if it is kept
+        keep = np.ones(len(scores), dtype=bool)
+        order = np.argsort(-scores, kind='mergesort')
+
+        if nmsThreshold is not None and len(scores) > 1:
+            # each det suppresses the following dets only
+            if nmsPairs is None:
+                nmsPairs = self.calcNMSPairs(boxes[order], nmsThreshold)
+            isSuppressing = nmsPairs['iou'] > nmsThreshold
+            pairDet = nmsPairs['idxDet'][isSuppressing]
+            pairOther = nmsPairs['idxOther'][isSuppressing]
+
+            suppressed = np.zeros(len(scores), dtype=bool)
+            idxDets, starts = np.unique(pairDet, return_index=True)
+            ends = np.append(starts[1:], len(pairDet))
+            for idxDet, start, end in zip(idxDets, starts, ends):
+                if not suppressed[idxDet]:
+                    suppressed[pairOther[start:end]] = True
+            keep[order[suppressed]] = False
+
+        if topK is not None:
+            idxKept = order[keep[order]]
+            keep[idxKept[topK:]] = False
+
+        return keep
+
+    def calcNMSPairs(self, sortedBoxes, minIoU=0):
+        # Overlapping pairs of the given det bbs (sorted desc by score) with IoU > minIoU, used by calcNMSKeep. Sort
+        # and sweep as getOverlapCandidates, but each pair is found once, from the bb which starts first. Returns a
+        # dict with the index of the det with the higher score, the index of the other det and their IoU of all pairs,
+        # sorted by both indices
+        nDets = len(sortedBoxes)
+        bestCandidates = None
+        for axis in [0, 1]:
+            start = sortedBoxes[:, axis]
+            end = sortedBoxes[:, axis + 2] + start
+            sortedStart = np.argsort(start, kind='mergesort')
+
+            # the bbs following in the order of the starts which start before the end
+            rangeStart = np.arange(1, nDets + 1)
+            rangeCount = np.maximum(np.searchsorted(start[sortedStart], end[sortedStart], side='left') - rangeStart, 0)
+            if bestCandidates is None or rangeCount.sum() < bestCandidates[1].sum():
+                bestCandidates = (rangeStart, rangeCount, sortedStart)
+        rangeStart, rangeCount, sortedStart = bestCandidates
+
+        idxFirst = np.repeat(sortedStart, rangeCount)
+        idxSecond = sortedStart[expandRanges(rangeStart, rangeCount)]
+        iou = self.calcIoUElementwise(sortedBoxes[idxSecond], np.zeros(len(idxSecond), dtype=bool), sortedBoxes[idxFirst])
+        isOverlap = iou > minIoU
+        idxDet = np.minimum(idxFirst, idxSecond)[isOverlap]
+        idxOther = np.maximum(idxFirst, idxSecond)[isOverlap]
+        order = np.argsort(idxDet * nDets + idxOther)
+        return {'idxDet': idxDet[order], 'idxOther': idxOther[order], 'iou': iou[isOverlap][order]}
+
+    def applyNMS(self, detFrame):
+        # parsed det frame (see parseDetFile) reduced to the dets kept by calcNMSKeep with nmsThreshold and nmsTopK
+        if self.nmsThreshold is None and self.nmsTopK is None:
+            return detFrame
+        keep = self.calcNMSKeep(detFrame['boxes'], detFrame['scores'], self.nmsThreshold, self.nmsTopK)
+        return {'boxes': detFrame['boxes'][keep], 'scores': detFrame['scores'][keep]}
+
+    def sortUsedGt(self, isUsed, isIgnored):
+        # indices of the used gt, sorted by ignore flag (ignored gt at the end of the list)
+        idxGts = np.flatnonzero(isUsed)
+        return idxGts[np.argsort(isIgnored[idxGts], kind='mergesort')]
+
+    def matchParsedFrame(self, gtFrame, detFrame, difficulty, ignoreOtherVRU, minIoU=None):
+        # Matches a parsed frame (see parseGtFile and parseDetFile) for a single setting. Returns the scores of the det
+        # sorted desc, their match states and the number of non ignored gt. Dets suppressed by NMS (if enabled) are removed
+        detFrame = self.applyNMS(detFrame)
+        order = np.argsort(-detFrame['scores'], kind='mergesort')
+
+        isUsed, isIgnored = self.calcGtIgnore(gtFrame, difficulty, ignoreOtherVRU)
+        idxGts = self.sortUsedGt(isUsed, isIgnored)
+        gtIgnore = isIgnored[idxGts]
+
+        with self.instrumentation.phase('matching'):
+            iou = self.calcFrameIoU(gtFrame['boxes'][idxGts], gtIgnore, detFrame['boxes'][order], minIoU)
+            detMatched, detGtIdx, gtMatched = self.matchFrame(iou, gtIgnore, minIoU)
+        self.countFrame(len(order), len(gtIgnore))
+
+        return detFrame['scores'][order], detMatched, len(gtIgnore) - int(np.count_nonzero(gtIgnore))
+
+    def evaluateDatasetFrames(self, settings, workers=1):
+        # Evaluates the currently loaded dataset for all given settings (difficulty, ignoreOtherVRU, minIoU) with a
+        # single pass over the files. Returns the evaluated frame pairs, the per frame results (see evaluateFramePairs)
+        # merged over all frames and the number of frames without det file
+        framePairs = self.framePairs
+
+        if workers > 1 and len(framePairs) > 0:
+            results = self.mapFrameChunks(evaluateFrameChunkSettings, framePairs, workers, settings)
+        else:
+            results = [self.evaluateFramePairs(framePairs, settings)]
 
-            # iterate over all gt annotations
-            for idx_gt, gt in enumerate(self.gtList):
-                matchedGt = gt['matched']
+        scores = np.concatenate([r[0] for r in results])
+        detCounts = np.concatenate([r[1] for r in results])
+        matched = dict((setting, np.concatenate([r[2][setting] for r in results])) for setting in settings)
+        nofPos = dict((setting, np.concatenate([r[3][setting] for r in results])) for setting in settings)
 
-                # if gt is allready matched, and no multiple matches are allowed: next gt
-                if matchedGt and not self.allowMultipleMatches and not gt['ignore']:
-                    continue
+        return framePairs, scores, detCounts, matched, nofPos, self.nMissingDetFiles
 
-                # if det is matched with a non ignoreable gt and current gt is ignorable: next det (due to the sorting only ignor-gts follow)
-                if idxBestGt >= 0 and not matchedWithIgnore and gt['ignore']:
-                    break
+    def evaluateDatasetSettings(self, settings, workers=1):
+        # Evaluates the currently loaded dataset for all given settings (difficulty, ignoreOtherVRU, minIoU) with a
+        # single pass over the files. Returns per setting the tuple (x_points, y_points, avg_prec) together with the
+        # number of processed and skipped frames
+        framePairs, scores, detCounts, matched, nofPos, nMissingDetFiles = self.evaluateDatasetFrames(settings, workers)
 
-                # calculate IoU of gt and det
-                cIoU = self.calcIoU(gt, det)
+        prCurves = dict()
+        for setting in settings:
+            prCurves[setting] = self.calcPRFromArrays(scores, matched[setting], int(nofPos[setting].sum()))
 
-                # smaller than maximum so far: continue
-                if cIoU < maxIoU:
-                    continue
-                else:
-                    maxIoU = cIoU
-                    idxBestGt = idx_gt
+        return prCurves, len(framePairs), nMissingDetFiles
 
-                    if gt['ignore']:
-                        matchedWithIgnore = True
+    def evaluateFrame(self):
 
-            # Write match back to det
-            if idxBestGt >= 0:
-                if matchedWithIgnore:
-                    det['matched'] = -1
-                else:
-                    det['matched'] = 1
+        # sort det lists by detection score desc
+        self.detList.sort(key=lambda k: k['score'], reverse=True)
 
-            # Write match back to gt
-            if idxBestGt >= 0:
-                self.gtList[idxBestGt]['matched'] = 1
+        # sort gt_list by ignore flag (ignored gt at the end of the list)
+        self.gtList.sort(key=lambda k: k['ignore'])
 
-        # extend det and gt lists
-        self.detListAll.extend(self.detList)
-        self.gtListAll.extend(self.gtList)
+        # collect the boxes of the current frame as arrays (x, y, w, h)
+        detBoxes = np.array([[d['x'], d['y'], d['w'], d['h']] for d in self.detList], dtype=np.float64).reshape(-1, 4)
+        gtBoxes = np.array([[g['x'], g['y'], g['w'], g['h']] for g in self.gtList], dtype=np.float64).reshape(-1, 4)
+        gtIgnore = np.array([g['ignore'] for g in self.gtList], dtype=bool)
+
+        # calculate the IoU of all det/gt pairs at once (only the overlapping pairs in crowded frames) and assign the
+        # matches greedily
+        with self.instrumentation.phase('matching'):
+            iou = self.calcFrameIoU(gtBoxes, gtIgnore, detBoxes)
+            detMatched, detGtIdx, gtMatched = self.matchFrame(iou, gtIgnore)
+        self.countFrame(len(detBoxes), len(gtBoxes))
+
+        # Write matches back to det and gt
+        for idxDet, det in enumerate(self.detList):
+            det['matched'] = int(detMatched[idxDet])
+        for idxGt in np.flatnonzero(gtMatched):
+            self.gtList[idxGt]['matched'] = 1
+
+        # append det and gt of the frame to the records of the whole dataset
+        detScores = np.array([d['score'] for d in self.detList], dtype=np.float64)
+        gtClassCodes = [self.getClassCode(g['type']) for g in self.gtList]
+        gtTags = [g['tags'] for g in self.gtList]
+        frameIdx = len(self.frameIds)
+        self.frameIds.append(self.currentGtFile)
+        if self.approximatePR:
+            if self.scoreHistogram is None:
+                self.scoreHistogram = ScoreHistogram(self.nScoreBins)
+            self.scoreHistogram.add(detScores, detMatched)
+        elif self.keepDetRecords:
+            # index of the matched gt in gtAll
+            detGtIdx = np.where(detGtIdx >= 0, detGtIdx + len(self.gtAll), -1)
+            detClassCodes = [self.getClassCode(d['type']) for d in self.detList]
+            self.detAll.extend(detScores, detMatched, box=detBoxes, classCode=detClassCodes, gtIdx=detGtIdx, frameIdx=frameIdx)
+        else:
+            self.detAll.extend(detScores, detMatched)
+            if self.spillDir is not None and len(self.detAll) >= self.spillRunSize:
+                self.spillDetRun()
+        self.gtAll.extend(gtIgnore, gtMatched, box=gtBoxes, classCode=gtClassCodes, tags=gtTags, frameIdx=frameIdx)
+
+    def countFrame(self, nDets, nGt):
+        # counts an evaluated frame with its dets and gt (see instrumentation)
+        if self.instrumentation.enabled:
+            self.instrumentation.count('frames')
+            self.instrumentation.count('dets', nDets)
+            self.instrumentation.count('gt', nGt)
+
+    def getClassCode(self, className):
+        # index of the given class in classNames, unknown classes are added
+        if className not in self.classNames:
+            self.classNames.append(className)
+        return self.classNames.index(className)
 
     def calcIoU(self, gt, det):
         # Calculates the intersection over union of the given gt and det bbs
@@ -333,74 +952,765 @@ class Evaluator():
         iou = area_I / area_U
         return iou
 
+    def calcIoUMatrix(self, gtBoxes, gtIgnore, detBoxes):
+        # Calculates the intersection over union of all given det and gt bbs (boxes as rows of x, y, w, h)
+        # Returns a matrix of shape (nDet, nGt). For ignored gt bbs the union is the area of the det bb only
+        return self.calcIoUElementwise(gtBoxes[np.newaxis, :], gtIgnore[np.newaxis, :], detBoxes[:, np.newaxis])
+
+    def calcIoUElementwise(self, gtBoxes, gtIgnore, detBoxes):
+        # Calculates the intersection over union of gt and det bbs given as arrays of shape (..., 4) which broadcast
+        # against each other. For ignored gt bbs the union is the area of the det bb only
+        detX0 = detBoxes[..., 0]
+        detY0 = detBoxes[..., 1]
+        detW = detBoxes[..., 2]
+        detH = detBoxes[..., 3]
+        gtX0 = gtBoxes[..., 0]
+        gtY0 = gtBoxes[..., 1]
+        gtW = gtBoxes[..., 2]
+        gtH = gtBoxes[..., 3]
+
+        # calculate height and width of intersecting area
+        w_inter = np.minimum(gtW + gtX0, detW + detX0) - np.maximum(gtX0, detX0)
+        h_inter = np.minimum(gtH + gtY0, detH + detY0) - np.maximum(gtY0, detY0)
+        valid = (w_inter > 0) & (h_inter > 0)
+
+        # calculate area (intersection and union)
+        area_I = w_inter * h_inter
+        area_det = detW * detH
+        area_U = np.where(gtIgnore, area_det, (area_det + (gtW * gtH)) - area_I)
+
+        iou = np.zeros(valid.shape)
+        iou[valid] = area_I[valid] / area_U[valid]
+        return iou
+
+    def calcFrameIoU(self, gtBoxes, gtIgnore, detBoxes, minIoU=None):
+        # IoU of the det and gt bbs of a frame: the full matrix (see calcIoUMatrix) or, for crowded frames with few
+        # overlapping bbs, only the overlapping pairs (see calcIoUPairs). Pairs without overlap (IoU 0) can only be left
+        # out if minIoU > 0. matchFrame accepts both
+        if minIoU is None:
+            minIoU = self.minIoU
+        nPairs = len(detBoxes) * len(gtBoxes)
+        if minIoU > 0 and nPairs >= self.sparseIoUMinPairs:
+            candidates = self.getOverlapCandidates(gtBoxes, detBoxes)
+            if candidates[0][1].sum() + candidates[1][1].sum() <= self.sparseIoUMaxShare * nPairs:
+                iouPairs = self.calcIoUPairs(gtBoxes, gtIgnore, detBoxes, candidates)
+                self.instrumentation.count('iouComputations', len(iouPairs['iou']))
+                return iouPairs
+        self.instrumentation.count('iouComputations', nPairs)
+        return self.calcIoUMatrix(gtBoxes, gtIgnore, detBoxes)
+
+    def getOverlapCandidates(self, gtBoxes, detBoxes):
+        # Candidate det/gt pairs of the given bbs by sort and sweep along x or y (the axis with fewer candidates): the
+        # bbs of a pair overlap along the axis, either the gt starts within the det or the det starts within the gt.
+        # Each overlapping pair is a candidate exactly once. Returns for both cases the (start, count) of the ranges of
+        # the candidates of each det (each gt) in the order given by sortedGt (sortedDet) and this order
+        bestCandidates = None
+        for axis in [0, 1]:
+            gtStart = gtBoxes[:, axis]
+            gtEnd = gtBoxes[:, axis + 2] + gtStart
+            detStart = detBoxes[:, axis]
+            detEnd = detBoxes[:, axis + 2] + detStart
+            sortedGt = np.argsort(gtStart, kind='mergesort')
+            sortedDet = np.argsort(detStart, kind='mergesort')
+
+            # gt starting within the det: detStart <= gtStart < detEnd
+            gtStartSorted = gtStart[sortedGt]
+            gtRangeStart = np.searchsorted(gtStartSorted, detStart, side='left')
+            gtRangeCount = np.maximum(np.searchsorted(gtStartSorted, detEnd, side='left') - gtRangeStart, 0)
+            # det starting within the gt: gtStart < detStart < gtEnd
+            detStartSorted = detStart[sortedDet]
+            detRangeStart = np.searchsorted(detStartSorted, gtStart, side='right')
+            detRangeCount = np.maximum(np.searchsorted(detStartSorted, gtEnd, side='left') - detRangeStart, 0)
+
+            candidates = ((gtRangeStart, gtRangeCount, sortedGt), (detRangeStart, detRangeCount, sortedDet))
+            nCandidates = gtRangeCount.sum() + detRangeCount.sum()
+            if bestCandidates is None or nCandidates < bestCandidates[0]:
+                bestCandidates = (nCandidates, candidates)
+        return bestCandidates[1]
+
+    def calcIoUPairs(self, gtBoxes, gtIgnore, detBoxes, candidates=None):
+        # Calculates the IoU of the overlapping det/gt pairs only, from the candidate pairs of getOverlapCandidates
+        # (calculated if not given). Returns a dict with the shape (nDet, nGt) of the full IoU matrix and the det index,
+        # gt index and IoU of all pairs with IoU > 0, sorted by det and gt index
+        if candidates is None:
+            candidates = self.getOverlapCandidates(gtBoxes, detBoxes)
+        (gtRangeStart, gtRangeCount, sortedGt), (detRangeStart, detRangeCount, sortedDet) = candidates
+
+        # expand the ranges of the candidates of each det and of each gt
+        idxDet = np.concatenate([np.repeat(np.arange(len(detBoxes)), gtRangeCount),
+                                 sortedDet[expandRanges(detRangeStart, detRangeCount)]])
+        idxGt = np.concatenate([sortedGt[expandRanges(gtRangeStart, gtRangeCount)],
+                                np.repeat(np.arange(len(gtBoxes)), detRangeCount)])
+
+        iou = self.calcIoUElementwise(gtBoxes[idxGt], gtIgnore[idxGt], detBoxes[idxDet])
+        isOverlap = iou > 0
+        # the pairs are unique, sorting by a single key is enough
+        order = np.argsort((idxDet * len(gtBoxes) + idxGt)[isOverlap])
+        return {
+            'shape': (len(detBoxes), len(gtBoxes)),
+            'idxDet': idxDet[isOverlap][order],
+            'idxGt': idxGt[isOverlap][order],
+            'iou': iou[isOverlap][order],
+        }
+
+    def selectDetIoU(self, iou, idxDets):
+        # IoU of the given det (ascending indices) from the IoU calculated for all det of a frame (full matrix or pairs,
+        # see calcFrameIoU)
+        if not isinstance(iou, dict):
+            return iou[idxDets]
+
+        # map the det index of the pairs to the position in idxDets, pairs of other det are dropped
+        detPosition = np.full(iou['shape'][0], -1, dtype=np.int64)
+        detPosition[idxDets] = np.arange(len(idxDets))
+        idxDet = detPosition[iou['idxDet']]
+        isSelected = idxDet >= 0
+        return {
+            'shape': (len(idxDets), iou['shape'][1]),
+            'idxDet': idxDet[isSelected],
+            'idxGt': iou['idxGt'][isSelected],
+            'iou': iou['iou'][isSelected],
+        }
+
+    def selectGtIoU(self, iouRegular, iouIgnore, idxGts, gtIgnore):
+        # IoU of the given gt (in the given order) from the IoU calculated for all gt of a frame once with the regular
+        # union and once with the union of ignored gt (full matrices or pairs, see calcFrameIoU)
+        if not isinstance(iouRegular, dict):
+            return np.where(gtIgnore[np.newaxis, :], iouIgnore[:, idxGts], iouRegular[:, idxGts])
+
+        # map the gt index of the pairs to the position in idxGts, pairs of other gt are dropped
+        gtPosition = np.full(iouRegular['shape'][1], -1, dtype=np.int64)
+        gtPosition[idxGts] = np.arange(len(idxGts))
+        idxGt = gtPosition[iouRegular['idxGt']]
+        isSelected = idxGt >= 0
+        idxGt = idxGt[isSelected]
+        idxDet = iouRegular['idxDet'][isSelected]
+        iou = np.where(gtIgnore[idxGt], iouIgnore['iou'][isSelected], iouRegular['iou'][isSelected])
+        order = np.lexsort((idxGt, idxDet))
+        return {
+            'shape': (iouRegular['shape'][0], len(idxGts)),
+            'idxDet': idxDet[order],
+            'idxGt': idxGt[order],
+            'iou': iou[order],
+        }
+
+    def matchFrame(self, iou, gtIgnore, minIoU=None):
+        # Greedy assignment on the IoU matrix of one frame. Rows (det) have to be sorted by score desc, columns (gt)
+        # by ignore flag. Each det is matched with the best non ignored gt which is still available. Only if there is
+        # none, it is matched with the best ignored gt. On equal IoU the gt with the higher index is chosen.
+        # minIoU defaults to self.minIoU
+        # Returns the match state of each det (1: matched, -1: matched with ignored gt, 0: not matched), the index of
+        # the matched gt (-1 if not matched) and a flag for each gt if it was matched
+        if minIoU is None:
+            minIoU = self.minIoU
+        if isinstance(iou, dict):
+            return self.matchFramePairs(iou, gtIgnore, minIoU)
+        nDet, nGt = iou.shape
+        nValidGt = nGt - int(np.count_nonzero(gtIgnore))
+
+        detMatched = np.zeros(nDet, dtype=np.int8)
+        detGtIdx = np.full(nDet, -1, dtype=np.intp)
+        gtMatched = np.zeros(nGt, dtype=bool)
+
+        # non ignored gt: sequentially in score order, since every match removes the gt for all following dets
+        iouValid = iou[:, :nValidGt]
+        for idxDet in np.flatnonzero((iouValid >= minIoU).any(axis=1)):
+            row = iouValid[idxDet]
+            if not self.allowMultipleMatches:
+                row = np.where(gtMatched[:nValidGt], -np.inf, row)
+            maxIoU = row.max()
+            if maxIoU < minIoU:
+                continue
+            idxGt = np.flatnonzero(row == maxIoU)[-1]
+            detMatched[idxDet] = 1
+            detGtIdx[idxDet] = idxGt
+            gtMatched[idxGt] = True
+
+        # ignored gt: can be matched by multiple dets, so all remaining dets are processed at once
+        if nValidGt < nGt:
+            idxDets = np.flatnonzero(detMatched == 0)
+            iouIgnore = iou[idxDets, nValidGt:]
+            maxIoU = iouIgnore.max(axis=1)
+            isMatch = maxIoU >= minIoU
+            idxDets = idxDets[isMatch]
+            # index of the last maximum in each row
+            idxGt = nGt - 1 - np.argmax(iouIgnore[isMatch, ::-1] == maxIoU[isMatch, np.newaxis], axis=1)
+            detMatched[idxDets] = -1
+            detGtIdx[idxDets] = idxGt
+            gtMatched[idxGt] = True
+
+        return detMatched, detGtIdx, gtMatched
+
+    def matchFramePairs(self, iouPairs, gtIgnore, minIoU):
+        # Greedy assignment as matchFrame on the overlapping det/gt pairs of one frame (see calcIoUPairs), minIoU > 0.
+        # Yields the same matches as matchFrame on the full IoU matrix
+        nDet, nGt = iouPairs['shape']
+        nValidGt = nGt - int(np.count_nonzero(gtIgnore))
+        pairDet = iouPairs['idxDet']
+        pairGt = iouPairs['idxGt']
+        pairIoU = iouPairs['iou']
+
+        detMatched = np.zeros(nDet, dtype=np.int8)
+        detGtIdx = np.full(nDet, -1, dtype=np.intp)
+        gtMatched = np.zeros(nGt, dtype=bool)
+
+        # non ignored gt: sequentially in score order, the pairs of each det are sorted by gt index
+        isCandidate = (pairGt < nValidGt) & (pairIoU >= minIoU)
+        candDet = pairDet[isCandidate]
+        candGt = pairGt[isCandidate]
+        candIoU = pairIoU[isCandidate]
+        idxDets, starts = np.unique(candDet, return_index=True)
+        ends = np.append(starts[1:], len(candDet))
+        for idxDet, start, end in zip(idxDets, starts, ends):
+            gts = candGt[start:end]
+            row = candIoU[start:end]
+            if not self.allowMultipleMatches:
+                isAvailable = ~gtMatched[gts]
+                gts = gts[isAvailable]
+                row = row[isAvailable]
+                if len(gts) == 0:
+                    continue
+            idxGt = gts[np.flatnonzero(row == row.max())[-1]]
+            detMatched[idxDet] = 1
+            detGtIdx[idxDet] = idxGt
+            gtMatched[idxGt] = True
+
+        # ignored gt: the best pair (highest IoU, then highest gt index) of each remaining det
+        isCandidate = (pairGt >= nValidGt) & (pairIoU >= minIoU) & (detMatched[pairDet] == 0)
+        order = np.lexsort((pairGt[isCandidate], pairIoU[isCandidate], pairDet[isCandidate]))
+        candDet = pairDet[isCandidate][order]
+        candGt = pairGt[isCandidate][order]
+        isBest = np.append(candDet[1:] != candDet[:-1], True)[:len(candDet)]
+        detMatched[candDet[isBest]] = -1
+        detGtIdx[candDet[isBest]] = candGt[isBest]
+        gtMatched[candGt[isBest]] = True
+
+        return detMatched, detGtIdx, gtMatched
+
     def calcPR(self):
+        # score and match state of all det, number of non ignored gt
+        return self.calcCurves()[0]
+
+    def calcCurves(self, nFrames=None):
+        # Calculates the PR-curve (x_points, y_points, avg_prec) of all det and, if the number of evaluated frames is
+        # given, the MR-FPPI curve (fppi, miss_rate, log_avg_mr, see calcMRFromCounts) from the same cumulative tp and
+        # fp counts. The MR-FPPI curve is None if it is not calculated
+        nof_pos = self.gtAll.getNofPos()
+        if self.approximatePR:
+            prCurve = self.calcPRFromHistogram(self.scoreHistogram, nof_pos)
+            if nFrames is None or np.isscalar(prCurve[0]):
+                return prCurve, None
+            tpBins, fpBins = self.scoreHistogram.getCounts()
+            return prCurve, self.calcMRFromCounts(np.cumsum(tpBins), np.cumsum(fpBins), nof_pos, nFrames)
+        if self.spillDir is not None:
+            if len(self.detAll) > 0:
+                self.spillDetRun()
+            return self.calcCurvesFromSpillRuns(self.spillRuns, nof_pos, nFrames)
+        return self.calcCurvesFromArrays(self.detAll.getScores(), self.detAll.getMatched(), nof_pos, nFrames)
+
+    def spillDetRun(self):
+        # Writes the valid dets (not matched with an ignored gt) of detAll sorted desc by score (stable) to a new run
+        # file in spillDir and clears detAll
+        scores = self.detAll.getScores()
+        matched = self.detAll.getMatched()
+        isValid = matched != -1
+        order = np.argsort(-scores[isValid], kind='mergesort')
+        run = np.zeros(len(order), dtype=SPILL_DTYPE)
+        run['score'] = scores[isValid][order]
+        run['matched'] = matched[isValid][order]
+
+        fd, runFile = tempfile.mkstemp(prefix='detRun_', suffix='.bin', dir=self.spillDir)
+        with os.fdopen(fd, 'wb') as f:
+            run.tofile(f)
+        self.spillRuns.append((runFile, len(run)))
+        self.detAll.clear()
+
+    def removeSpillRuns(self):
+        for runFile, nDets in self.spillRuns:
+            if os.path.isfile(runFile):
+                os.remove(runFile)
+        self.spillRuns = list()
+
+    def iterMergedRuns(self, runs):
+        # k-way merge of the given spill runs. Yields the match states of all dets in blocks, sorted desc by score. Dets
+        # with equal score keep the order of the runs, i.e. the result equals a stable sort of all dets
+        runData = [np.memmap(runFile, dtype=SPILL_DTYPE, mode='r', shape=(nDets,)) if nDets > 0 else None for runFile, nDets in runs]
+        # the dets of each run are kept in a block of up to spillBlockSize dets. A block is topped up from its run once
+        # half of it is emitted, so each det is copied at most twice
+        runPos = [0] * len(runs)    # number of dets read from each run
+        blocks = [None] * len(runs)  # current block of each run
+        blockPos = [0] * len(runs)  # number of dets emitted from the current block
+        while True:
+            for idxRun, data in enumerate(runData):
+                nLeft = 0 if blocks[idxRun] is None else len(blocks[idxRun]) - blockPos[idxRun]
+                if data is not None and runPos[idxRun] < len(data) and nLeft <= self.spillBlockSize // 2:
+                    nRead = max(self.spillBlockSize - nLeft, 1)
+                    newDets = np.array(data[runPos[idxRun]:runPos[idxRun] + nRead])
+                    blocks[idxRun] = newDets if nLeft == 0 else np.concatenate([blocks[idxRun][blockPos[idxRun]:], newDets])
+                    blockPos[idxRun] = 0
+                    runPos[idxRun] += len(newDets)
+                elif nLeft == 0:
+                    blocks[idxRun] = None
+            activeRuns = [idxRun for idxRun, block in enumerate(blocks) if block is not None]
+            if len(activeRuns) == 0:
+                return
+
+            # all dets up to the smallest last (score, run) of the blocks which do not end their run can be emitted
+            bounds = [(-blocks[idxRun]['score'][-1], idxRun) for idxRun in activeRuns if runPos[idxRun] < len(runData[idxRun])]
+            scores = list()
+            matched = list()
+            runIdx = list()
+            boundScore, boundRun = min(bounds) if len(bounds) > 0 else (None, None)
+            for idxRun in activeRuns:
+                block = blocks[idxRun][blockPos[idxRun]:]
+                nTake = len(block)
+                if boundScore is not None:
+                    # blocks which start below the bound emit nothing
+                    if -block['score'][0] > boundScore:
+                        continue
+                    nTake = np.searchsorted(-block['score'], boundScore, side='right' if idxRun <= boundRun else 'left')
+                scores.append(block['score'][:nTake])
+                matched.append(block['matched'][:nTake])
+                runIdx.append(np.full(nTake, idxRun, dtype=np.int64))
+                blockPos[idxRun] += nTake
+
+            # lexsort is stable, dets of the same run and with the same score keep their order
+            order = np.lexsort((np.concatenate(runIdx), -np.concatenate(scores)))
+            yield np.concatenate(matched)[order]
+
+    def calcCurvesFromSpillRuns(self, runs, nof_pos, nFrames=None, referencePoints=None):
+        # Calculates the PR-curve and the MR-FPPI curve (see calcCurves) from spilled runs (see spillDetRun), streaming
+        # over the merged runs. The average precision and the log-average miss rate equal the ones of
+        # calcCurvesFromArrays, the curves are subsampled evenly to at most maxCurvePoints points (always including the
+        # last one)
+        if referencePoints is None:
+            referencePoints = self.referencePoints
+
+        # Check for empty lists
+        nDets = sum(nDetsRun for runFile, nDetsRun in runs)
+        if nDets <= 0:
+            print "ERROR. No valid detections present for evaluation. ABORT."
+            return (0,0,0), None
+        if nof_pos <= 0:
+            print "ERROR. No valid ground truth objects present for evaluation. ABORT."
+            return (0,0,0), None
+
+        curveStep = int(np.ceil(nDets / float(self.maxCurvePoints)))
+        x_curve = list()
+        y_curve = list()
+        fppi_curve = list()
+        ref_pts = np.zeros(len(referencePoints))
+        ref_mr = np.ones(len(self.fppiPoints))
+        idxRef = 0      # next reference point
+        idxNextDet = 0  # each det is used for one reference point only
+        tpOffset = 0
+        fpOffset = 0
+        detOffset = 0
+        for matched in self.iterMergedRuns(runs):
+            # cumsum falsepositive and truepositive
+            tp = np.cumsum(matched == 1).astype(np.float64) + tpOffset
+            fp = np.cumsum(matched == 0).astype(np.float64) + fpOffset
+            x_points = np.divide(tp, nof_pos)
+            y_points = np.divide(tp, np.add(tp, fp))
+
+            # precision at the reference points reached in this block, see calcPRFromSortedMatches
+            while idxRef < len(referencePoints):
+                idxDet = max(detOffset + np.searchsorted(x_points, referencePoints[idxRef], side='left'), idxNextDet)
+                if idxDet >= detOffset + len(matched):
+                    break
+                ref_pts[idxRef] = y_points[idxDet - detOffset]
+                idxNextDet = idxDet + 1
+                idxRef += 1
+
+            idxCurve = np.arange(detOffset, detOffset + len(matched))
+            isCurvePoint = ((idxCurve + 1) % curveStep == 0) | (idxCurve == nDets - 1)
+            x_curve.append(x_points[isCurvePoint])
+            y_curve.append(y_points[isCurvePoint])
+
+            # miss rate at the FPPI points of the last det in this block not above them, see calcMRFromCounts
+            if nFrames is not None:
+                fppi = np.divide(fp, nFrames)
+                idxDets = np.searchsorted(fppi, self.fppiPoints, side='right') - 1
+                isReached = idxDets >= 0
+                ref_mr[isReached] = 1 - x_points[idxDets[isReached]]
+                fppi_curve.append(fppi[isCurvePoint])
+
+            tpOffset = tp[-1]
+            fpOffset = fp[-1]
+            detOffset += len(matched)
 
-        # remove all ignored gt
-        self.gtListAll[:] = [g for g in self.gtListAll if g.get('ignore') == False]
+        avg_prec = np.mean(ref_pts)
+        x_points = np.concatenate(x_curve)
+        prCurve = (x_points, np.concatenate(y_curve), avg_prec)
+        if nFrames is None:
+            return prCurve, None
 
-        # remove all det matched with an ignored gt
-        self.detListAll[:] = [d for d in self.detListAll if d.get('matched') != -1]
+        log_avg_mr = np.exp(np.mean(np.log(np.maximum(ref_mr, 1e-10))))
+        return prCurve, (np.concatenate(fppi_curve), 1 - x_points, log_avg_mr)
+
+    def calcPRFromHistogram(self, scoreHistogram, nof_pos, referencePoints=None):
+        # Approximates the PR-curve and the average precision from the tp and fp counts per score bin (see
+        # ScoreHistogram). All dets of a bin form one point of the curve, the precision at a reference point is the
+        # precision of the first bin reaching its recall
+        if referencePoints is None:
+            referencePoints = self.referencePoints
 
         # Check for empty lists
-        if len(self.detListAll) <= 0:
+        if scoreHistogram is None or scoreHistogram.low is None:
             print "ERROR. No valid detections present for evaluation. ABORT."
             return 0,0,0
-        if len(self.gtListAll) <= 0:
+        if nof_pos <= 0:
             print "ERROR. No valid ground truth objects present for evaluation. ABORT."
             return 0,0,0
 
-        # sort detections desc by their detection score
-        self.detListAll.sort(key=lambda k: k['score'], reverse=True)
+        tpBins, fpBins = scoreHistogram.getCounts()
+        tp = np.cumsum(tpBins).astype(np.float64)
+        fp = np.cumsum(fpBins).astype(np.float64)
 
-        # cumsum falsepositive and truepositive
-        fp = np.zeros(len(self.detListAll))
-        tp = np.zeros(len(self.detListAll))
-        tp_cnt = 0
-        fp_cnt = 0
+        # calculate the x and y data points of the PR-curve
+        x_points = np.divide(tp, nof_pos)
+        y_points = np.divide(tp, np.add(tp, fp))
 
-        for idxDet, det in enumerate(self.detListAll):
-            if det['matched'] == 1:
-                # increase tp
-                tp_cnt += 1
-            elif det['matched'] == 0:
-                # increase fp
-                fp_cnt += 1
+        idxBins = np.searchsorted(x_points, referencePoints, side='left')
+        isReached = idxBins < len(x_points)
+        ref_pts = np.zeros(len(referencePoints))
+        ref_pts[isReached] = y_points[idxBins[isReached]]
 
-            fp[idxDet] = fp_cnt
-            tp[idxDet] = tp_cnt
+        avg_prec = np.mean(ref_pts)
 
-        # number of positive cases (gt)
-        nof_pos = len(self.gtListAll)
+        return x_points, y_points, avg_prec
+
+    def calcApproximationError(self, nSampleFrames=None, seed=0):
+        # Estimates the error of approximatePR on a random sample of the frames of the loaded dataset: the sample is
+        # evaluated exactly and with score bins. Returns the exact and the approximated average precision of the sample
+        # and their absolute difference
+        if nSampleFrames is None:
+            nSampleFrames = self.nApproximationSampleFrames
+        rng = np.random.RandomState(seed)
+        idxFrames = np.sort(rng.permutation(len(self.framePairs))[:nSampleFrames])
+        framePairs = [self.framePairs[idx] for idx in idxFrames]
+
+        setting = (self.difficulty, self.ignoreOtherVRU, self.minIoU)
+        scores, detCounts, matched, nofPos = self.evaluateFramePairs(framePairs, [setting])
+        scoreHistogram = ScoreHistogram(self.nScoreBins)
+        scoreHistogram.add(scores, matched[setting])
+
+        apExact = self.calcPRFromArrays(scores, matched[setting], nofPos[setting].sum())[2]
+        apApprox = self.calcPRFromHistogram(scoreHistogram, nofPos[setting].sum())[2]
+
+        return apExact, apApprox, abs(apExact - apApprox)
+
+    def calcPRFromArrays(self, scores, matched, nof_pos, referencePoints=None):
+        # Calculates the PR-curve and the average precision from the scores and match states of all det and the number
+        # of non ignored gt. referencePoints (sorted ascending) defaults to self.referencePoints
+        return self.calcCurvesFromArrays(scores, matched, nof_pos, None, referencePoints)[0]
+
+    def calcCurvesFromArrays(self, scores, matched, nof_pos, nFrames=None, referencePoints=None):
+        # Calculates the PR-curve and the MR-FPPI curve (see calcCurves) from the scores and match states of all det,
+        # the number of non ignored gt and the number of evaluated frames
+        if referencePoints is None:
+            referencePoints = self.referencePoints
+
+        # remove all det matched with an ignored gt
+        isValid = matched != -1
+        scores = scores[isValid]
+        matched = matched[isValid]
+
+        # Check for empty lists
+        if len(scores) <= 0:
+            print "ERROR. No valid detections present for evaluation. ABORT."
+            return (0,0,0), None
+        if nof_pos <= 0:
+            print "ERROR. No valid ground truth objects present for evaluation. ABORT."
+            return (0,0,0), None
+
+        # sort detections desc by their detection score (stable, equal scores keep their order)
+        with self.instrumentation.phase('sort'):
+            matched = matched[np.argsort(-scores, kind='mergesort')]
+
+        with self.instrumentation.phase('calcPR'):
+            # cumsum falsepositive and truepositive
+            tp = np.cumsum(matched == 1).astype(np.float64)
+            fp = np.cumsum(matched == 0).astype(np.float64)
+
+            prCurve = self.calcPRFromCounts(tp, fp, nof_pos, referencePoints)
+            mrCurve = None if nFrames is None else self.calcMRFromCounts(tp, fp, nof_pos, nFrames)
+        return prCurve, mrCurve
+
+    def calcPRFromSortedMatches(self, matched, nof_pos, referencePoints=None):
+        # Calculates the PR-curve and the average precision from the match states (1 or 0) of all valid det, sorted
+        # desc by their detection score. Both, matched and nof_pos, have to be non empty
+
+        # cumsum falsepositive and truepositive
+        tp = np.cumsum(matched == 1).astype(np.float64)
+        fp = np.cumsum(matched == 0).astype(np.float64)
+
+        return self.calcPRFromCounts(tp, fp, nof_pos, referencePoints)
+
+    def calcPRFromCounts(self, tp, fp, nof_pos, referencePoints=None):
+        # Calculates the PR-curve and the average precision from the cumulative tp and fp counts of the det sorted desc
+        # by their detection score
+        if referencePoints is None:
+            referencePoints = self.referencePoints
 
         # calculate the x and y data points of the PR-curve
         x_points = np.divide(tp, nof_pos)
         y_points = np.divide(tp, np.add(tp, fp))
 
-        # calculate the precision at each reference point
-        ref_pts = np.zeros(len(self.referencePoints))
-        idxR = 0
-        ref = self.referencePoints[idxR]
-        for idxDet, rec in enumerate(x_points):
-            if rec >= ref:
-                ref_pts[idxR] = y_points[idxDet]
-                idxR += 1
-                if idxR >= len(self.referencePoints):
-                    break;
-
-                ref = self.referencePoints[idxR]
-                continue
+        # calculate the precision at each reference point: the precision of the first det reaching the recall of the
+        # reference point. Each det is used for one reference point only, the next reference point is taken from a
+        # following det at the earliest. Reference points which are not reached keep a precision of 0
+        idxFirst = np.searchsorted(x_points, referencePoints, side='left')
+        idxRef = np.arange(len(referencePoints))
+        idxDets = np.maximum.accumulate(idxFirst - idxRef) + idxRef
+        isReached = idxDets < len(x_points)
+        ref_pts = np.zeros(len(referencePoints))
+        ref_pts[isReached] = y_points[idxDets[isReached]]
 
         avg_prec = np.mean(ref_pts)
 
         return x_points, y_points, avg_prec
 
+    def calcMRFromCounts(self, tp, fp, nof_pos, nFrames, fppiPoints=None):
+        # Calculates the miss rate over false positives per image (FPPI) curve and the log-average miss rate from the
+        # cumulative tp and fp counts of the det sorted desc by their detection score. The miss rate at an FPPI point
+        # is the one of the last det with an FPPI not above the point (1 if there is none), the log-average miss rate is
+        # the geometric mean over the FPPI points (default: self.fppiPoints)
+        if fppiPoints is None:
+            fppiPoints = self.fppiPoints
+
+        fppi = np.divide(fp, float(nFrames))
+        miss_rate = 1 - np.divide(tp, float(nof_pos))
+
+        idxDets = np.searchsorted(fppi, fppiPoints, side='right') - 1
+        isReached = idxDets >= 0
+        ref_mr = np.ones(len(fppiPoints))
+        ref_mr[isReached] = miss_rate[idxDets[isReached]]
+
+        log_avg_mr = np.exp(np.mean(np.log(np.maximum(ref_mr, 1e-10))))
+
+        return fppi, miss_rate, log_avg_mr
+
+    def calcBreakdown(self):
+        # Breaks the evaluation of all det and gt records down by attributes of the gt: height bin (see heightBins),
+        # occlusion (highest occlusion tag) and sequence (date and sequence of the frame). A group contains its non
+        # ignored gt, the det matched with them and the false positives which can be attributed to the group (by their
+        # own height or frame, false positives count for all occlusion groups). Returns a dict with a list of
+        # (group name, number of non ignored gt, recall, avg_prec) for each attribute and, as 'ignoredMatches', a list
+        # of (class name, number of det, share) of the dets matched with ignored gt by the class of the gt. Requires the
+        # records of all det in memory (see keepDetRecords, runBreakdown)
+        if not isinstance(self.detAll, DetectionRecordBuffer) or self.approximatePR or len(self.spillRuns) > 0:
+            print "ERROR: The breakdown requires the records of all det in memory (keepDetRecords without spillDir and approximatePR)."
+            return 0
+        detH = self.detAll.getColumn('box')[:, 3]
+        detGtIdx = self.detAll.getColumn('gtIdx')
+        detFrameIdx = self.detAll.getColumn('frameIdx')
+        hasGt = self.detAll.getMatched() != 0
+        gtH = self.gtAll.getColumn('box')[:, 3]
+        gtTags = self.gtAll.getColumn('tags')
+        gtFrameIdx = self.gtAll.getColumn('frameIdx')
+        breakdown = dict()
+
+        # height bins, false positives by their own height
+        heightBins = np.asarray(self.heightBins, dtype=np.float64)
+        groupNames = ['{:.0f}-{:.0f}px'.format(low, high) if np.isfinite(high) else '{:.0f}+px'.format(low)
+                      for low, high in zip(heightBins[:-1], heightBins[1:])]
+        gtGroups = np.digitize(gtH, heightBins) - 1
+        detGroups = np.digitize(detH, heightBins) - 1
+        detGroups[hasGt] = gtGroups[detGtIdx[hasGt]]
+        breakdown['height'] = self.calcGroupStats(groupNames, gtGroups, detGroups)
+
+        # highest occlusion tag, false positives (-2) belong to all groups
+        gtGroups = np.zeros(len(gtTags), dtype=np.int64)
+        for idxTag, tag in enumerate(TAGS):
+            gtGroups[(gtTags & tagMask([tag])) != 0] = idxTag + 1
+        detGroups = np.full(len(detGtIdx), -2, dtype=np.int64)
+        detGroups[hasGt] = gtGroups[detGtIdx[hasGt]]
+        breakdown['occlusion'] = self.calcGroupStats(['not occluded'] + TAGS, gtGroups, detGroups)
+
+        # sequence of the frame
+        sequenceIds = [self.getSequenceId(frameId) for frameId in self.frameIds]
+        groupNames, frameGroups = np.unique(np.array(sequenceIds, dtype=str), return_inverse=True)
+        breakdown['sequence'] = self.calcGroupStats(groupNames.tolist(), frameGroups[gtFrameIdx], frameGroups[detFrameIdx])
+
+        # classes of the ignored gt matched by dets
+        isIgnoredMatch = self.detAll.getMatched() == -1
+        classCounts = np.bincount(self.gtAll.getColumn('classCode')[detGtIdx[isIgnoredMatch]], minlength=len(self.classNames))
+        nIgnoredMatches = max(int(np.count_nonzero(isIgnoredMatch)), 1)
+        breakdown['ignoredMatches'] = [(className, int(classCounts[idx]), classCounts[idx] / float(nIgnoredMatches))
+                                       for idx, className in enumerate(self.classNames) if classCounts[idx] > 0]
+
+        return breakdown
+
+    def calcGroupStats(self, groupNames, gtGroups, detGroups):
+        # Number of non ignored gt, recall and avg_prec of each group. gtGroups and detGroups are the group index of each
+        # gt and det record, dets with group -2 belong to all groups, dets with group -1 to none
+        scores = self.detAll.getScores()
+        matched = self.detAll.getMatched()
+        isPos = ~self.gtAll.getColumn('ignore')
+        nofPos = np.bincount(gtGroups[isPos], minlength=len(groupNames))
+        nofMatched = np.bincount(gtGroups[isPos & self.gtAll.getColumn('matched')], minlength=len(groupNames))
+
+        groupStats = list()
+        for idxGroup, groupName in enumerate(groupNames):
+            if nofPos[idxGroup] == 0:
+                groupStats.append((groupName, 0, np.nan, np.nan))
+                continue
+            isGroup = ((detGroups == idxGroup) | (detGroups == -2)) & (matched != -1)
+            avg_prec = 0.0
+            if np.count_nonzero(isGroup) > 0:
+                avg_prec = self.calcPRFromArrays(scores[isGroup], matched[isGroup], nofPos[idxGroup])[2]
+            groupStats.append((groupName, int(nofPos[idxGroup]), nofMatched[idxGroup] / float(nofPos[idxGroup]), avg_prec))
+        return groupStats
+
+    def getSequenceId(self, frameId):
+        # date and sequence of a frame identifier, e.g. 2014-12-04_082614 (the frame identifier if it does not match)
+        match = FRAME_ID_PATTERN.search(frameId)
+        if match is None:
+            return frameId
+        return match.group(1) + '_' + match.group(2)
+
+    def writeSummary(self, jsonPath=None, csvPath=None):
+        # Writes the summary of all runs (one row per method and setting) to a JSON file (list of objects) and/or a CSV
+        # file (columns of SUMMARY_FIELDS which are used by any row). NaN values are written as null or empty cells
+        rows = list()
+        for row in self.summary:
+            rows.append(dict())
+            for key, value in row.items():
+                if isinstance(value, np.generic):
+                    value = value.item()
+                if isinstance(value, bool):
+                    value = int(value)
+                rows[-1][key] = None if isinstance(value, float) and np.isnan(value) else value
+
+        if jsonPath is not None:
+            with open(jsonPath, 'w') as f:
+                json.dump(rows, f, indent=2, sort_keys=True)
+        if csvPath is not None:
+            fields = [field for field in SUMMARY_FIELDS if any(field in row for row in rows)]
+            with open(csvPath, 'wb') as f:
+                writer = csv.DictWriter(f, fields)
+                writer.writeheader()
+                writer.writerows(rows)
+
+    def getResultConfig(self):
+        # All settings of the evaluator which affect the curves calculated by run, see getResultCacheKey
+        config = dict()
+        for name in ['difficulty', 'ignoreOtherVRU', 'gtExt', 'detExt', 'detectionsType', 'toleratedOtherClasses',
+                     'minIoU', 'nmsThreshold', 'nmsTopK', 'initScore', 'allowMultipleMatches', 'referencePoints',
+                     'fppiPoints', 'approximatePR', 'nScoreBins', 'maxCurvePoints']:
+            value = getattr(self, name)
+            config[name] = value.tolist() if isinstance(value, np.ndarray) else value
+        config['tags'] = TAGS
+        # the spill runs subsample long curves (see maxCurvePoints)
+        config['spill'] = self.spillDir is not None
+        return config
+
+    def getResultCacheKey(self):
+        # Key of the result of the currently loaded dataset (see loadDataset) in the result cache. A packed det file
+        # is fingerprinted as a whole
+        detFiles = self.detFiles if self.detReader is None else [self.pathToDetFiles]
+        return ResultCache(self.resultCacheDir).getKey(self.gtFiles, detFiles, self.getResultConfig())
+
+    def getFrameStamps(self, framePairs):
+        # Fingerprint of the det file of each frame pair: size and mtime of the file, the hash of the dets of the frame
+        # for a packed det file (records are appended, so the mtime of the packed file changes for all frames) and an
+        # empty string for frames without det file
+        stamps = list()
+        for gtFilePath, detFilePath in framePairs:
+            if detFilePath is None:
+                stamps.append('')
+            elif self.detReader is not None:
+                dets = self.detReader.readFrame(self.getFrameId(detFilePath, self.detExt))
+                stamps.append(hashlib.md5(dets.tobytes()).hexdigest())
+            else:
+                stat = os.stat(detFilePath)
+                stamps.append('{}\t{!r}'.format(stat.st_size, stat.st_mtime))
+        return stamps
+
+    def evaluateDatasetIncremental(self, workers=1):
+        # Evaluates the currently loaded dataset for the current setting like evaluateDatasetParallel, but matches only
+        # the frames whose det file changed (see getFrameStamps) since the last evaluation of the same det path with
+        # the same gt files and configuration. The per frame results (scores and match states of the det, number of
+        # non ignored gt) of the other frames are taken from the result cache, the results of all frames are stored
+        # again. Returns the scores and match states of all det in frame order, the number of non ignored gt and the
+        # number of processed frames
+        setting = (self.difficulty, self.ignoreOtherVRU, self.minIoU)
+        resultCache = ResultCache(self.resultCacheDir, self.resultCacheMaxBytes)
+        config = self.getResultConfig()
+        config['frameResults'] = os.path.abspath(self.pathToDetFiles)
+        cacheKey = resultCache.getKey(self.gtFiles, [], config)
+        stored = resultCache.load(cacheKey)
+
+        frameIds = [self.getFrameId(gtFilePath, self.gtExt) for gtFilePath, detFilePath in self.framePairs]
+        stamps = self.getFrameStamps(self.framePairs)
+
+        # index of the stored frame with the same identifier and stamp
+        storedFrames = dict()
+        if stored is not None:
+            storedFrames = dict((frame, idx) for idx, frame in enumerate(zip(stored['frameIds'].tolist(), stored['stamps'].tolist())))
+        idxStored = np.array([storedFrames.get(frame, -1) for frame in zip(frameIds, stamps)], dtype=np.int64)
+        isChanged = idxStored < 0
+        changedPairs = [framePair for framePair, bChanged in zip(self.framePairs, isChanged) if bChanged]
+        print 'Matching {} of {} frames, the det files of the other frames are unchanged'.format(len(changedPairs), len(frameIds))
+
+        # match the changed frames, appended to the stored det
+        if workers > 1 and len(changedPairs) > 0:
+            results = self.mapFrameChunks(evaluateFrameChunkSettings, changedPairs, workers, [setting])
+        else:
+            results = [self.evaluateFramePairs(changedPairs, [setting])]
+        scoresSrc = [stored['scores'] if stored is not None else np.zeros(0)] + [r[0] for r in results]
+        matchedSrc = [stored['matched'] if stored is not None else np.zeros(0, dtype=np.int8)] + [r[2][setting] for r in results]
+        detCountsStored = stored['detCounts'] if stored is not None else np.zeros(0, dtype=np.int64)
+        nofPosStored = stored['nofPos'] if stored is not None else np.zeros(0, dtype=np.int64)
+        detCountsNew = np.concatenate([np.zeros(0, dtype=np.int64)] + [r[1] for r in results])
+        nofPosNew = np.concatenate([np.zeros(0, dtype=np.int64)] + [r[3][setting] for r in results])
+
+        # gather the det of all frames in frame order
+        startsStored = np.cumsum(detCountsStored) - detCountsStored
+        startsNew = np.cumsum(detCountsNew) - detCountsNew + detCountsStored.sum()
+        detCounts = np.zeros(len(frameIds), dtype=np.int64)
+        starts = np.zeros(len(frameIds), dtype=np.int64)
+        nofPos = np.zeros(len(frameIds), dtype=np.int64)
+        detCounts[~isChanged] = detCountsStored[idxStored[~isChanged]]
+        starts[~isChanged] = startsStored[idxStored[~isChanged]]
+        nofPos[~isChanged] = nofPosStored[idxStored[~isChanged]]
+        detCounts[isChanged] = detCountsNew
+        starts[isChanged] = startsNew
+        nofPos[isChanged] = nofPosNew
+        idxDets = np.repeat(starts - (np.cumsum(detCounts) - detCounts), detCounts) + np.arange(detCounts.sum())
+        scores = np.concatenate(scoresSrc)[idxDets]
+        matched = np.concatenate(matchedSrc)[idxDets]
+
+        if stored is None or len(changedPairs) > 0 or len(frameIds) != len(storedFrames):
+            resultCache.store(cacheKey, {'frameIds': np.array(frameIds, dtype=str), 'stamps': np.array(stamps, dtype=str),
+                                         'detCounts': detCounts, 'scores': scores, 'matched': matched, 'nofPos': nofPos})
+
+        return scores, matched, int(nofPos.sum()), len(frameIds)
+
     def clear(self):
-        # Clear after run
-        self.gtListAll = list()
-        self.detListAll = list()
+        # Clear after run, new buffers as copies of the evaluator (see mapFrameChunks) share them
+        self.gtAll = GtBuffer()
+        self.detAll = DetectionRecordBuffer() if self.keepDetRecords else DetectionBuffer()
+        self.frameIds = list()
+        self.scoreHistogram = None
+        self.removeSpillRuns()
+        self.stopPrefetch()
+        # the packed det file is opened again on the next read
+        if self.detReader is not None:
+            self.detReader.close()
 
     # starts the evaluation process, main loop
-    def run(self, detectionEvalList):
+    # workers > 1 distributes the frames over a pool of worker processes
+    def run(self, detectionEvalList, workers=1):
+
+        # PR-graphs on the left, MR-FPPI graphs on the right
+        if self.plot:
+            plt = getPyplot()
+        if self.plot and self.plotMissRate:
+            plt.gcf().set_size_inches(16, 7)
+            axesPR = plt.subplot(1, 2, 1)
+            axesMR = plt.subplot(1, 2, 2)
+            plt.sca(axesPR)
 
         # Iterate over each given set of detections
         for detTuple in detectionEvalList:
@@ -419,94 +1729,702 @@ class Evaluator():
                 bValidDataSet = self.loadDataset()
                 # check DataSet
                 if bValidDataSet != 1:
-                    print "Cancel evaluation process. Please check the content of your selected annotation and detection folders. One .json-file per frame. Same number of frames required."
+                    print "Cancel evaluation process. Please check the content of your selected annotation and detection folders. One .json-file per frame."
                     return
                 nSkippedFrames = 0
                 nProcessedFrames = 0
 
-                # process each frame
-                while(self.currentGtFileIdx < len(self.gtFiles)):
+                # reuse the curves of an unchanged method
+                resultCache = None
+                cachedResult = None
+                if self.resultCacheDir:
+                    resultCache = ResultCache(self.resultCacheDir, self.resultCacheMaxBytes)
+                    cacheKey = self.getResultCacheKey()
+                    cachedResult = resultCache.load(cacheKey)
+
+                if cachedResult is not None:
+                    print 'Using cached result of ' + curDetMethodName
+                    prCurve = (cachedResult['x_points'], cachedResult['y_points'], cachedResult['avg_prec'][()])
+                    mrCurve = (cachedResult['fppi'], cachedResult['miss_rate'], cachedResult['log_avg_mr'][()])
+                    nProcessedFrames = int(cachedResult['nProcessedFrames'])
+                    nSkippedFrames = int(cachedResult['nSkippedFrames'])
+                elif resultCache is not None and not self.approximatePR and self.spillDir is None:
+                    # match only the frames with changed det files
+                    scores, matched, nofPos, nProcessedFrames = self.evaluateDatasetIncremental(workers)
+                    prCurve, mrCurve = self.calcCurvesFromArrays(scores, matched, nofPos, nProcessedFrames)
+                elif workers > 1 and not self.approximatePR and self.spillDir is None:
+                    # process all frames in parallel
+                    scores, matched, nofPos, nProcessedFrames = self.evaluateDatasetParallel(workers)
+
+                    # calculate precision-recall and miss rate values
+                    prCurve, mrCurve = self.calcCurvesFromArrays(scores, matched, nofPos, nProcessedFrames)
+                else:
+                    # process each frame, the files are read ahead
+                    self.startPrefetch(self.framePairs)
+                    try:
+                        while(self.currentGtFileIdx < len(self.framePairs)):
 
-                    # load current frame data (gt and det)
-                    bValid = self.loadFrame()
+                            # load current frame data (gt and det)
+                            bValid = self.loadFrame()
 
-                    if bValid == 0:
-                        if self.verbose == 1:
-                            print 'Skip current frame due to errors.'
-                        nSkippedFrames += 1
-                        continue
+                            if bValid == 0:
+                                if self.verbose == 1:
+                                    print 'Skip current frame due to errors.'
+                                nSkippedFrames += 1
+                                continue
 
-                    # process current frame, calculate matches
-                    self.evaluateFrame()
+                            # process current frame, calculate matches
+                            self.evaluateFrame()
 
-                    nProcessedFrames += 1
+                            nProcessedFrames += 1
+                    finally:
+                        self.stopPrefetch()
 
-                # calculate precision-recall values
-                x_points, y_points, avg_prec = self.calcPR()
+                    # calculate precision-recall and miss rate values
+                    prCurve, mrCurve = self.calcCurves(nProcessedFrames)
+                    self.removeSpillRuns()
 
                 # check for error
-                if len(x_points) <= 1 and x_points == 0 and y_points == 0 and avg_prec == 0:
+                x_points, y_points, avg_prec = prCurve
+                if np.isscalar(x_points):
                     return 0
+                fppi, miss_rate, log_avg_mr = mrCurve
 
-                # plot the calculated PR-graph
-                if self.ignoreOtherVRU:
-                    line, = plt.plot(x_points, y_points, linewidth=2)
-                    line.set_label(curDetMethodName +': {0:.3f}'.format(avg_prec) + ' ignore')
-                    lineColor = plt.get(line, 'color')
-                else:
-                    line, = plt.plot(x_points, y_points, '--', linewidth=2, color=lineColor)
-                    line.set_label(curDetMethodName + ': {0:.3f}'.format(avg_prec) + ' discard')
+                if resultCache is not None and cachedResult is None:
+                    resultCache.store(cacheKey, {'x_points': x_points, 'y_points': y_points, 'avg_prec': avg_prec,
+                                                 'fppi': fppi, 'miss_rate': miss_rate, 'log_avg_mr': log_avg_mr,
+                                                 'nProcessedFrames': nProcessedFrames, 'nSkippedFrames': nSkippedFrames})
+
+                # plot the calculated PR-graph (and MR-FPPI graph in the same color)
+                if self.plot:
+                    lineColor = self.plotPR(curDetMethodName, x_points, y_points, avg_prec, self.ignoreOtherVRU, lineColor)
+                if self.plot and self.plotMissRate:
+                    plt.sca(axesMR)
+                    self.plotMR(curDetMethodName, fppi, miss_rate, log_avg_mr, self.ignoreOtherVRU, lineColor)
+                    plt.sca(axesPR)
 
                 print '#########################'
                 print 'Finished evaluation of ' + curDetMethodName + '\n'
                 print 'Avg prec: ', avg_prec
+                print 'Log-avg miss rate: ', log_avg_mr
                 print 'Processed number of frames: ', nProcessedFrames
+                print 'Frames without detection file: ', self.nMissingDetFiles
                 print 'Skipped ', nSkippedFrames, ' Frames'
+                self.summary.append({'method': curDetMethodName, 'difficulty': self.difficulty, 'ignoreOtherVRU': ignoreFlag,
+                                     'minIoU': self.minIoU, 'avgPrec': avg_prec, 'logAvgMissRate': log_avg_mr,
+                                     'nFrames': nProcessedFrames})
+                if self.approximatePR and self.nApproximationSampleFrames > 0 and cachedResult is None:
+                    apExact, apApprox, apError = self.calcApproximationError()
+                    print 'Approximation on {} sampled frames: AP exact {:.4f}, approx. {:.4f}, error {:.4f}'.format(
+                        min(self.nApproximationSampleFrames, len(self.framePairs)), apExact, apApprox, apError)
                 print '#########################\n'
 
+        if self.plot and self.plotMissRate:
+            plt.sca(axesMR)
+            plt.xscale('log')
+            plt.yscale('log')
+            plt.axis([self.fppiPoints[0], self.fppiPoints[-1] * 10, 0.01, 1])
+            plt.xlabel('False positives per image')
+            plt.ylabel('Miss rate')
+            plt.legend(loc='lower left')
+            plt.sca(axesPR)
+
         # return
         return 1
 
+    # plot an MR-FPPI graph in the given color, solid if other VRUs are ignored, otherwise dashed
+    def plotMR(self, methodName, fppi, miss_rate, log_avg_mr, ignoreOtherVRU, lineColor):
+        with self.instrumentation.phase('plot'):
+            plt = getPyplot()
+            if ignoreOtherVRU:
+                line, = plt.plot(fppi, miss_rate, linewidth=2, color=lineColor)
+                line.set_label(methodName + ': {0:.3f}'.format(log_avg_mr) + ' ignore')
+            else:
+                line, = plt.plot(fppi, miss_rate, '--', linewidth=2, color=lineColor)
+                line.set_label(methodName + ': {0:.3f}'.format(log_avg_mr) + ' discard')
+
+    # plot a PR-graph, solid if other VRUs are ignored, otherwise dashed in the given color. Returns the line color
+    def plotPR(self, methodName, x_points, y_points, avg_prec, ignoreOtherVRU, lineColor=None):
+        with self.instrumentation.phase('plot'):
+            plt = getPyplot()
+            if ignoreOtherVRU:
+                line, = plt.plot(x_points, y_points, linewidth=2)
+                line.set_label(methodName +': {0:.3f}'.format(avg_prec) + ' ignore')
+                lineColor = plt.get(line, 'color')
+            else:
+                line, = plt.plot(x_points, y_points, '--', linewidth=2, color=lineColor)
+                line.set_label(methodName + ': {0:.3f}'.format(avg_prec) + ' discard')
+        return lineColor
+
+    # starts the evaluation of multiple detection methods against the same gt, which is parsed only once and kept in
+    # memory (or loaded from the gt cache). With workers > 1 the methods are evaluated in parallel. Prints a comparison
+    # table and plots the PR-graphs of all methods. Returns a dict with the tuple (x_points, y_points, avg_prec) for
+    # each (method name, ignoreOtherVRU)
+    def runComparison(self, detectionEvalList, workers=1):
+        self.clear()
+        if not self.loadGtFiles():
+            print "Cancel evaluation process. Please check the content of your selected annotation folder."
+            return
+        if self.gtCache is None:
+            self.loadGtMemory()
+
+        settings = [(self.difficulty, ignoreFlag, self.minIoU) for ignoreFlag in [1, 0]]
+        if workers > 1 and len(detectionEvalList) > 1:
+            worker = copy.copy(self)
+            worker.clear()
+            methodResults = mapWorkers(evaluateMethodWorker, [(worker, detTuple, settings) for detTuple in detectionEvalList], workers)
+        else:
+            methodResults = [self.evaluateMethod(detTuple, settings) for detTuple in detectionEvalList]
 
+        results = dict()
+        print '#########################'
+        print 'Comparison of {} methods [{}]\n'.format(len(detectionEvalList), self.difficulty)
+        print '{:<24} {:>10} {:>10} {:>8} {:>8}'.format('Method', 'AP ignore', 'AP discard', 'Frames', 'No det')
+        for detTuple, methodResult in zip(detectionEvalList, methodResults):
+            curDetMethodName = detTuple[0]
+            if methodResult is None:
+                print '{:<24} {:>10} {:>10}'.format(curDetMethodName, 'invalid', 'invalid')
+                continue
+            prCurves, nProcessedFrames, nMissingDetFiles = methodResult
 
+            lineColor = None
+            for setting in settings:
+                x_points, y_points, avg_prec = prCurves[setting]
+                results[(curDetMethodName, setting[1])] = prCurves[setting]
+                self.summary.append({'method': curDetMethodName, 'difficulty': self.difficulty, 'ignoreOtherVRU': setting[1],
+                                     'minIoU': self.minIoU, 'avgPrec': avg_prec, 'nFrames': nProcessedFrames})
+                if self.plot and not np.isscalar(x_points):
+                    lineColor = self.plotPR(curDetMethodName, x_points, y_points, avg_prec, setting[1], lineColor)
+            print '{:<24} {:>10.4f} {:>10.4f} {:>8} {:>8}'.format(curDetMethodName, prCurves[settings[0]][2], prCurves[settings[1]][2],
+                                                               nProcessedFrames, nMissingDetFiles)
+        print '#########################\n'
+
+        return results
+
+    # evaluates the det files of one method (name, path) for the given settings against the loaded gt files. Returns
+    # the PR-curves of the settings (see evaluateDatasetSettings), or None if the det files are not valid
+    def evaluateMethod(self, detTuple, settings):
+        self.pathToDetFiles = detTuple[1]
+        if self.verbose == 1:
+            print 'Start evaluation for {}'.format(detTuple[0])
+        if self.loadDetFiles() != 1:
+            print "Skip {}. Please check the content of the detection folder. One .json-file per frame.".format(detTuple[0])
+            return None
+        return self.evaluateDatasetSettings(settings)
+
+
+    # Loads the dataset of a detection method (method name, path of the det files) for the evaluation modes which
+    # evaluate each method in one pass. Returns 1 on success, otherwise prints that the evaluation is cancelled and
+    # returns 0
+    def loadMethodDataset(self, detTuple):
+        self.pathToDetFiles = detTuple[1]
+
+        if self.verbose == 1:
+            print 'Start evaluation for {}'.format(detTuple[0])
+
+        bValidDataSet = self.loadDataset()
+        # check DataSet
+        if bValidDataSet != 1:
+            print "Cancel evaluation process. Please check the content of your selected annotation and detection folders. One .json-file per frame."
+            return 0
+        return 1
 
+    # starts the evaluation process for all difficulties and both ignoreOtherVRU settings, each file is read once
+    # per detection method. Returns a dict with the tuple (x_points, y_points, avg_prec) for each
+    # (method name, difficulty, ignoreOtherVRU)
+    def runAllSettings(self, detectionEvalList, workers=1):
+        results = dict()
 
+        # Iterate over each given set of detections
+        for detTuple in detectionEvalList:
+            curDetMethodName = detTuple[0]
+            if not self.loadMethodDataset(detTuple):
+                return
+
+            settings = [(difficulty, ignoreFlag, self.minIoU) for difficulty in self.difficulties for ignoreFlag in [1, 0]]
+            prCurves, nProcessedFrames, nMissingDetFiles = self.evaluateDatasetSettings(settings, workers)
+
+            print '#########################'
+            print 'Finished evaluation of ' + curDetMethodName + '\n'
+            for difficulty in self.difficulties:
+                for ignoreFlag in [1, 0]:
+                    x_points, y_points, avg_prec = prCurves[(difficulty, ignoreFlag, self.minIoU)]
+                    results[(curDetMethodName, difficulty, ignoreFlag)] = (x_points, y_points, avg_prec)
+                    self.summary.append({'method': curDetMethodName, 'difficulty': difficulty, 'ignoreOtherVRU': ignoreFlag,
+                                         'minIoU': self.minIoU, 'avgPrec': avg_prec, 'nFrames': nProcessedFrames})
+                    print 'Avg prec {:<9} {:<8}: '.format(difficulty, 'ignore' if ignoreFlag else 'discard'), avg_prec
+            print 'Processed number of frames: ', nProcessedFrames
+            print 'Frames without detection file: ', nMissingDetFiles
+            print '#########################\n'
+
+        return results
+
+
+    # starts the evaluation process for a list of IoU thresholds (default: self.iouThresholds) at the current
+    # difficulty and ignoreOtherVRU setting, each frame is parsed and its IoU matrix calculated once per detection
+    # method. Returns a dict with the tuple (x_points, y_points, avg_prec) for each (method name, minIoU) and the
+    # mean avg_prec over all thresholds for each method name
+    def runIoUSweep(self, detectionEvalList, iouThresholds=None, workers=1):
+        if iouThresholds is None:
+            iouThresholds = self.iouThresholds
+        results = dict()
+        meanAvgPrec = dict()
 
+        # Iterate over each given set of detections
+        for detTuple in detectionEvalList:
+            curDetMethodName = detTuple[0]
+            if not self.loadMethodDataset(detTuple):
+                return
+
+            settings = [(self.difficulty, self.ignoreOtherVRU, minIoU) for minIoU in iouThresholds]
+            prCurves, nProcessedFrames, nMissingDetFiles = self.evaluateDatasetSettings(settings, workers)
+
+            print '#########################'
+            print 'Finished evaluation of ' + curDetMethodName + '\n'
+            for setting in settings:
+                results[(curDetMethodName, setting[2])] = prCurves[setting]
+                self.summary.append({'method': curDetMethodName, 'difficulty': self.difficulty, 'ignoreOtherVRU': self.ignoreOtherVRU,
+                                     'minIoU': setting[2], 'avgPrec': prCurves[setting][2], 'nFrames': nProcessedFrames})
+                print 'Avg prec IoU {:.2f}: '.format(setting[2]), prCurves[setting][2]
+            meanAvgPrec[curDetMethodName] = np.mean([prCurves[setting][2] for setting in settings])
+            print 'Mean avg prec: ', meanAvgPrec[curDetMethodName]
+            print 'Processed number of frames: ', nProcessedFrames
+            print 'Frames without detection file: ', nMissingDetFiles
+            print '#########################\n'
+
+        return results, meanAvgPrec
+
+    # starts the evaluation process for a list of NMS thresholds (default: self.nmsThresholds) at the current settings.
+    # The raw dets of each frame are parsed once, NMS (and nmsTopK) is applied for each threshold. Plots the PR-graph
+    # of each threshold and returns a dict with the tuple (x_points, y_points, avg_prec) for each (method name,
+    # nmsThreshold)
+    def runNMSSweep(self, detectionEvalList, nmsThresholds=None, workers=1):
+        if nmsThresholds is None:
+            nmsThresholds = self.nmsThresholds
+        results = dict()
 
+        # Iterate over each given set of detections
+        for detTuple in detectionEvalList:
+            curDetMethodName = detTuple[0]
+            if not self.loadMethodDataset(detTuple):
+                return
+
+            settings = [(self.difficulty, self.ignoreOtherVRU, self.minIoU, nmsThreshold) for nmsThreshold in nmsThresholds]
+            prCurves, nProcessedFrames, nMissingDetFiles = self.evaluateDatasetSettings(settings, workers)
+
+            print '#########################'
+            print 'Finished evaluation of ' + curDetMethodName + '\n'
+            for setting in settings:
+                x_points, y_points, avg_prec = prCurves[setting]
+                results[(curDetMethodName, setting[3])] = prCurves[setting]
+                self.summary.append({'method': curDetMethodName, 'difficulty': self.difficulty, 'ignoreOtherVRU': self.ignoreOtherVRU,
+                                     'minIoU': self.minIoU, 'nmsThreshold': setting[3], 'avgPrec': avg_prec,
+                                     'nFrames': nProcessedFrames})
+                print 'Avg prec NMS {}: '.format(setting[3]), avg_prec
+                # no PR-graph if there are no valid dets
+                if not self.plot or np.isscalar(x_points):
+                    continue
+                line, = getPyplot().plot(x_points, y_points, linewidth=2)
+                line.set_label(curDetMethodName + ' NMS {}: {:.3f}'.format(setting[3], avg_prec))
+            print 'Processed number of frames: ', nProcessedFrames
+            print 'Frames without detection file: ', nMissingDetFiles
+            print '#########################\n'
+
+        return results
+
+    # starts the evaluation process at the current settings and prints the AP and recall of each method by gt height,
+    # occlusion and sequence and the classes of the ignored gt matched by the dets (see calcBreakdown). Use the
+    # difficulty 'hard' to include small and occluded gt. Returns a dict with the breakdown of each method name
+    def runBreakdown(self, detectionEvalList):
+        # the breakdown needs the records of all det in memory, spill runs and score bins are not used
+        if self.spillDir is not None or self.approximatePR:
+            print "WARNING: spillDir and approximatePR are not used by the breakdown, all det are kept in memory."
+        spillDir, approximatePR, keepDetRecords = self.spillDir, self.approximatePR, self.keepDetRecords
+        self.spillDir = None
+        self.approximatePR = False
+        self.keepDetRecords = True
+        results = dict()
+
+        try:
+            # Iterate over each given set of detections
+            for detTuple in detectionEvalList:
+                curDetMethodName = detTuple[0]
+                if not self.loadMethodDataset(detTuple):
+                    return
 
-#########################################################################
-# entry point of evaluation script
+                # process each frame
+                while(self.currentGtFileIdx < len(self.framePairs)):
+                    if self.loadFrame() == 0:
+                        continue
+                    self.evaluateFrame()
 
-# Path to the ground truth files, e.g: ../labelData/test/tsinghuaDaimlerDataset
-pathToGtFiles = '../labelData/test/tsinghuaDaimlerDataset/'
-#pathToGtFiles = '../labelData/test/tsinghuaDaimlerDataset'
+                breakdown = self.calcBreakdown()
+                results[curDetMethodName] = breakdown
+                for attribute in ['height', 'occlusion', 'sequence']:
+                    for groupName, nofPos, recall, avg_prec in breakdown[attribute]:
+                        self.summary.append({'method': curDetMethodName, 'difficulty': self.difficulty,
+                                             'ignoreOtherVRU': self.ignoreOtherVRU, 'minIoU': self.minIoU,
+                                             'attribute': attribute, 'group': groupName, 'nofPos': nofPos,
+                                             'recall': recall, 'avgPrec': avg_prec})
 
-# Save location of the resulting figure
-pathToFigSaveLoc = '/tmp/resultsFig.png'
+                print '#########################'
+                print 'Finished evaluation of ' + curDetMethodName + ' [' + self.difficulty + ']\n'
+                for attribute in ['height', 'occlusion', 'sequence']:
+                    print '{:<24} {:>8} {:>8} {:>8}'.format(attribute, 'Gt', 'Recall', 'AP')
+                    for groupName, nofPos, recall, avg_prec in breakdown[attribute]:
+                        print '{:<24} {:>8} {:>8.3f} {:>8.3f}'.format(groupName, nofPos, recall, avg_prec)
+                    print ''
+                print '{:<24} {:>8} {:>8}'.format('ignored matches', 'Det', 'Share')
+                for className, nDets, share in breakdown['ignoredMatches']:
+                    print '{:<24} {:>8} {:>8.3f}'.format(className, nDets, share)
+                print 'Processed number of frames: ', len(self.frameIds)
+                print '#########################\n'
+        finally:
+            self.spillDir, self.approximatePR, self.keepDetRecords = spillDir, approximatePR, keepDetRecords
+            self.removeSpillRuns()
+
+        return results
+
+    # starts the evaluation process at the current settings and estimates confidence intervals of the average precision
+    # of each method by resampling the frames with replacement. The frames are matched once, each resample only
+    # recomputes the PR-curve. The same resamples are used for all methods, which yields confidence intervals of the
+    # paired differences between the methods. Returns a dict with (avg_prec, lower, upper) for each method name and a
+    # dict with (difference, lower, upper) for each pair of method names
+    def runBootstrap(self, detectionEvalList, nResamples=1000, confidence=0.95, seed=0, workers=1):
+        setting = (self.difficulty, self.ignoreOtherVRU, self.minIoU)
+        methodNames = list()
+        methodData = list()
+        avgPrec = list()
+
+        # Iterate over each given set of detections, keep the match states of all det with the index of their frame
+        for detTuple in detectionEvalList:
+            curDetMethodName = detTuple[0]
+            if not self.loadMethodDataset(detTuple):
+                return
+
+            framePairs, scores, detCounts, matched, nofPos, nMissingDetFiles = self.evaluateDatasetFrames([setting], workers)
+            matched = matched[setting]
+
+            # frames are identified by their index in the list of gt files, frames which are not evaluated for a
+            # method count without gt and det
+            gtFileIdx = dict((gtFilePath, idx) for idx, gtFilePath in enumerate(self.gtFiles))
+            idxFrames = np.array([gtFileIdx[pair[0]] for pair in framePairs], dtype=np.int64)
+            nofPosFrames = np.zeros(len(self.gtFiles), dtype=np.int64)
+            nofPosFrames[idxFrames] = nofPos[setting]
+            idxFrameOfDet = np.repeat(idxFrames, detCounts)
+
+            # valid det sorted desc by their detection score
+            isValid = matched != -1
+            order = np.argsort(-scores[isValid], kind='mergesort')
+            methodData.append((matched[isValid][order], idxFrameOfDet[isValid][order], nofPosFrames))
+
+            x_points, y_points, avg_prec = self.calcPRFromArrays(scores, matched, int(nofPos[setting].sum()))
+            methodNames.append(curDetMethodName)
+            avgPrec.append(avg_prec)
+
+        # average precision of each method for each resample
+        rnd = np.random.RandomState(seed)
+        nFrames = len(self.gtFiles)
+        resampledAvgPrec = np.zeros((len(methodNames), nResamples))
+        for idxResample in range(nResamples):
+            # number of times each frame is drawn
+            frameWeights = np.bincount(rnd.randint(0, nFrames, nFrames), minlength=nFrames)
+            for idxMethod, (matchedSorted, idxFrameOfDet, nofPosFrames) in enumerate(methodData):
+                matchedResample = np.repeat(matchedSorted, frameWeights[idxFrameOfDet])
+                nofPosResample = int(np.dot(frameWeights, nofPosFrames))
+                if len(matchedResample) > 0 and nofPosResample > 0:
+                    resampledAvgPrec[idxMethod, idxResample] = self.calcPRFromSortedMatches(matchedResample, nofPosResample)[2]
+
+        percentiles = [50. * (1. - confidence), 50. * (1. + confidence)]
+        results = dict()
+        differences = dict()
+        print '#########################'
+        print 'Bootstrap confidence intervals ({} resamples, {:.0%})\n'.format(nResamples, confidence)
+        for idxMethod, curDetMethodName in enumerate(methodNames):
+            lower, upper = np.percentile(resampledAvgPrec[idxMethod], percentiles)
+            results[curDetMethodName] = (avgPrec[idxMethod], lower, upper)
+            self.summary.append({'method': curDetMethodName, 'difficulty': self.difficulty, 'ignoreOtherVRU': self.ignoreOtherVRU,
+                                 'minIoU': self.minIoU, 'avgPrec': avgPrec[idxMethod], 'lower': lower, 'upper': upper})
+            print '{}: {:.4f} [{:.4f}, {:.4f}]'.format(curDetMethodName, avgPrec[idxMethod], lower, upper)
+        for idxA in range(len(methodNames)):
+            for idxB in range(idxA + 1, len(methodNames)):
+                lower, upper = np.percentile(resampledAvgPrec[idxA] - resampledAvgPrec[idxB], percentiles)
+                difference = avgPrec[idxA] - avgPrec[idxB]
+                differences[(methodNames[idxA], methodNames[idxB])] = (difference, lower, upper)
+                print '{} - {}: {:+.4f} [{:+.4f}, {:+.4f}]'.format(methodNames[idxA], methodNames[idxB], difference, lower, upper)
+        print '#########################\n'
+
+        return results, differences
+
+
+# Evaluates detections frame by frame as they are produced (e.g. by a running training job) without writing them to disk.
+# Only the score and match state of each det is kept (in detAll), the current PR-curve can be queried at any time. Usage:
+#   evaluator = StreamingEvaluator(pathToGtFiles)
+#   evaluator.addFrame(frameId, boxes, scores)    # boxes as rows of mincol, minrow, maxcol, maxrow
+#   x_points, y_points, avg_prec = evaluator.getPR()
+class StreamingEvaluator(Evaluator):
+    def __init__(self, gtFilePath):
+        Evaluator.__init__(self, gtFilePath)
+
+        # number of non ignored gt in all evaluated frames
+        self.nofPos = 0
+        # identifiers of all evaluated frames
+        self.evaluatedFrames = set()
+        # frame identifier -> gt file, loaded on first use
+        self.gtFileIndex = None
+
+    def loadGtIndex(self):
+        if not self.loadGtFiles():
+            return 0
+        self.gtFileIndex = dict((self.getFrameId(gtFilePath, self.gtExt), gtFilePath) for gtFilePath in self.gtFiles)
+        return 1
+
+    # match the dets of one frame (all of type detectionsType) and add them to the evaluation
+    def addFrame(self, frameId, boxes, scores):
+        if self.gtFileIndex is None and not self.loadGtIndex():
+            return 0
+        if frameId not in self.gtFileIndex:
+            print 'Error: No ground truth for frame {}. Skip frame.'.format(frameId)
+            return 0
+        if frameId in self.evaluatedFrames:
+            print 'Error: Frame {} was already evaluated. Skip frame.'.format(frameId)
+            return 0
+
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        detFrame = {
+            'boxes': np.column_stack([boxes[:, 0], boxes[:, 1], boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]]),
+            'scores': np.asarray(scores, dtype=np.float64).reshape(-1),
+        }
+        gtFrame = self.parseGtFile(self.gtFileIndex[frameId])
+
+        scores, matched, nofPos = self.matchParsedFrame(gtFrame, detFrame, self.difficulty, self.ignoreOtherVRU)
+        self.detAll.extend(scores, matched)
+        self.nofPos += nofPos
+        self.evaluatedFrames.add(frameId)
+        return 1
 
-# Create list of all different detection results, containing the name of the used detections method along with the path of the generated .json-files
-detectionEvalList = list()
-detectionEvalList.append(('ACF', '../detection'))
-#detectionEvalList.append(('LDCF', '[YOUR_ALGO_PATH]/cyclist_gt+dt_LDCF'))
-#detectionEvalList.append(('VGG16_SP', '[YOUR_ALGO_PATH]/cyclist_gt+dt_VGG16_SP_test'))
+    # PR-curve and average precision of all frames added so far
+    def getPR(self, referencePoints=None):
+        return self.calcPRFromArrays(self.detAll.getScores(), self.detAll.getMatched(), self.nofPos, referencePoints)
 
-# Create Evaluator object with path to ground truth data
-eval = Evaluator(pathToGtFiles)
+    # start a new evaluation (e.g. for the next checkpoint)
+    def reset(self):
+        self.detAll.clear()
+        self.nofPos = 0
+        self.evaluatedFrames = set()
 
 
-bValid = eval.run(detectionEvalList)
+# Evaluates a chunk of (gtFile, detFile) pairs with the given evaluator, used as worker by
+# Evaluator.evaluateDatasetParallel. Returns the scores and match states of all det in frame order, the number of
+# non ignored gt and the number of processed frames
+def evaluateFrameChunk(args):
+    evaluator, framePairs = args
+    evaluator.framePairs = framePairs
+    evaluator.currentGtFileIdx = 0
+    evaluator.currentDetFileIdx = 0
 
-if bValid > 0:
-    plt.axis([0.0, 1, 0.0, 1])
-    plt.xlabel('Recall')
-    plt.ylabel('Precision')
-    plt.title('Tsinghua Daimler Evaluation Results [' + eval.difficulty + ']')
-    plt.legend()
+    nProcessedFrames = 0
+    while evaluator.currentGtFileIdx < len(evaluator.framePairs):
+        if evaluator.loadFrame() == 0:
+            continue
+        evaluator.evaluateFrame()
+        nProcessedFrames += 1
 
-    plt.savefig(pathToFigSaveLoc)
-    print "Saved resulting figure to: " + pathToFigSaveLoc
+    return evaluator.detAll.getScores(), evaluator.detAll.getMatched(), evaluator.gtAll.getNofPos(), nProcessedFrames
 
-    plt.show(block=True)
 
-    sys.exit(0)
+# Applies chunkFunc to a chunk of frame pairs, used as worker by Evaluator.mapFrameChunks. Returns the result together
+# with the instrumentation of the worker
+def evaluateFrameChunkInstrumented(args):
+    chunkFunc, evaluator = args[0], args[1]
+    return chunkFunc(args[1:]), evaluator.instrumentation
+
+
+# Evaluates one detection method, used as worker by Evaluator.runComparison
+def evaluateMethodWorker(args):
+    evaluator, detTuple, settings = args
+    return evaluator.evaluateMethod(detTuple, settings)
+
+
+# Applies func to each of the given args with a pool of worker processes, returns the results in the order of args
+def mapWorkers(func, argsList, workers):
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(func, argsList)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+# Evaluates a chunk of (gtFile, detFile) pairs for a list of settings, used as worker by
+# Evaluator.evaluateDatasetSettings
+def evaluateFrameChunkSettings(args):
+    evaluator, framePairs, settings = args
+    return evaluator.evaluateFramePairs(framePairs, settings)
+
+
+# Indices of the given ranges (start, count) of an array, concatenated
+def expandRanges(starts, counts):
+    return np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+
+
+# Bitmask of the given list of tags, unknown tags are not represented
+def tagMask(tags):
+    mask = 0
+    for tag in tags:
+        if tag in TAGS:
+            mask |= 1 << TAGS.index(tag)
+    return mask
+
+
+# matplotlib.pyplot, imported on first use. Unless interactive is set (or pyplot is already imported), the
+# non-interactive Agg backend is used, which needs no display
+def getPyplot(interactive=False):
+    global plt
+    if plt is None:
+        if 'matplotlib.pyplot' not in sys.modules and not interactive:
+            import matplotlib
+            matplotlib.use('Agg')
+        import matplotlib.pyplot
+        plt = matplotlib.pyplot
+    return plt
+
+
+
+
+
+
+
+
+#########################################################################
+
+
+# entry point of evaluation script, e.g.
+#   python evaluation.py --gt ../labelData/test/tsinghuaDaimlerDataset --method ACF ../detection --figure /tmp/resultsFig.png
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluation of detections on the Tsinghua-Daimler Cyclist Benchmark.')
+    parser.add_argument('--gt', default='../labelData/test/tsinghuaDaimlerDataset/',
+                        help='path to the ground truth files')
+    parser.add_argument('--method', nargs=2, action='append', metavar=('NAME', 'PATH'),
+                        help='name of a detection method and the path of its .json-files (or packed detection file), can be repeated')
+    parser.add_argument('--difficulty', choices=['easy', 'moderate', 'hard'], default='easy')
+    parser.add_argument('--min-iou', type=float, default=0.5, help='minimal IoU of a match')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--gt-cache', help='path of the binary ground truth cache')
+    parser.add_argument('--result-cache', help='directory of the result cache, unchanged methods are not evaluated again')
+    parser.add_argument('--json-backend', choices=jsonio.JSON_BACKENDS,
+                        help='json module used to read the files (default: fastest installed one)')
+    parser.add_argument('--read-ahead', type=int, default=64,
+                        help='number of files read ahead in a background thread, 0: no read-ahead')
+    parser.add_argument('--verbose', action='store_true')
+
+    # evaluation modes, default: PR-graphs of each method with and without ignoring other VRUs
+    parser.add_argument('--compare', action='store_true',
+                        help='parse the gt once and compare the methods in a table (in parallel, if workers > 1)')
+    parser.add_argument('--all-settings', action='store_true',
+                        help='evaluate all difficulties with and without ignoring other VRUs in one pass')
+    parser.add_argument('--iou-sweep', action='store_true',
+                        help='evaluate the IoU thresholds 0.5:0.05:0.95 in one pass')
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N',
+                        help='estimate confidence intervals of the avg prec with N bootstrap resamples')
+    parser.add_argument('--breakdown', action='store_true',
+                        help='break the AP and recall down by gt height, occlusion and sequence')
+    parser.add_argument('--nms-sweep', type=float, nargs='+', metavar='THRESHOLD',
+                        help='reduce the raw detections by NMS with each threshold, one PR-graph per threshold')
+
+    # output
+    parser.add_argument('--figure', help='save location of the resulting figure')
+    parser.add_argument('--show', action='store_true', help='show the resulting figure')
+    parser.add_argument('--json', help='write the results to this JSON file')
+    parser.add_argument('--csv', help='write the results to this CSV file')
+    parser.add_argument('--instrument', action='store_true',
+                        help='print the time of each phase (glob, read, jsonLoads, matching, sort, calcPR, plot) and counters')
+    parser.add_argument('--instrument-json', help='write the phase times and counters to this JSON file')
+    parser.add_argument('--profile', help='run the evaluation with cProfile and write the statistics to this file')
+    args = parser.parse_args(argv)
+
+    detectionEvalList = [tuple(method) for method in args.method] if args.method else [('ACF', '../detection')]
+
+    # the selected json backend must be installed
+    try:
+        jsonio.getLoads(args.json_backend)
+    except ImportError as e:
+        print "ERROR: {}. ABORT.".format(e)
+        return 1
 
+    # Create Evaluator object with path to ground truth data
+    eval = Evaluator(args.gt)
+    eval.difficulty = args.difficulty
+    eval.minIoU = args.min_iou
+    eval.gtCacheFile = args.gt_cache
+    eval.resultCacheDir = args.result_cache
+    eval.jsonBackend = args.json_backend
+    eval.readAhead = args.read_ahead
+    eval.verbose = 1 if args.verbose else 0
+    if eval.verbose == 1:
+        print 'Reading json files with ' + jsonio.getBackendName(args.json_backend)
+    eval.plot = args.figure is not None or args.show
+    if args.show:
+        getPyplot(interactive=True)
+
+    eval.instrumentation.enabled = args.instrument or args.instrument_json is not None
+
+    # run the selected evaluation mode, with the profiler if requested
+    if args.profile is not None:
+        bValid, bPlot = profileCall(args.profile, runMode, eval, args, detectionEvalList)
+        print "Saved profile to: " + args.profile
+    else:
+        bValid, bPlot = runMode(eval, args, detectionEvalList)
+
+    eval.writeSummary(args.json, args.csv)
+
+    if bValid > 0 and bPlot and eval.plot:
+        with eval.instrumentation.phase('plot'):
+            plt = getPyplot()
+            plt.axis([0.0, 1, 0.0, 1])
+            plt.xlabel('Recall')
+            plt.ylabel('Precision')
+            plt.title('Tsinghua Daimler Evaluation Results [' + eval.difficulty + ']')
+            plt.legend()
+
+            if args.figure is not None:
+                plt.savefig(args.figure)
+                print "Saved resulting figure to: " + args.figure
+        if args.show:
+            plt.show(block=True)
+
+    if args.instrument:
+        eval.instrumentation.printSummary()
+    if args.instrument_json is not None:
+        eval.instrumentation.writeJson(args.instrument_json)
+
+    return 0 if bValid > 0 else 1
+
+
+# Runs the evaluation mode selected by the command line arguments of main. Returns if the evaluation was valid (1 or 0)
+# and if the mode plots PR-graphs
+def runMode(eval, args, detectionEvalList):
+    bPlot = False
+    if args.all_settings:
+        bValid = 1 if eval.runAllSettings(detectionEvalList, workers=args.workers) else 0
+    elif args.iou_sweep:
+        bValid = 1 if eval.runIoUSweep(detectionEvalList, workers=args.workers) else 0
+    elif args.bootstrap > 0:
+        bValid = 1 if eval.runBootstrap(detectionEvalList, nResamples=args.bootstrap, workers=args.workers) else 0
+    elif args.breakdown:
+        bValid = 1 if eval.runBreakdown(detectionEvalList) else 0
+    elif args.nms_sweep:
+        bValid = 1 if eval.runNMSSweep(detectionEvalList, args.nms_sweep, workers=args.workers) else 0
+        bPlot = True
+    elif args.compare:
+        bValid = 1 if eval.runComparison(detectionEvalList, workers=args.workers) else 0
+        bPlot = True
+    else:
+        bValid = 1 if eval.run(detectionEvalList, workers=args.workers) else 0
+        bPlot = True
+    return bValid, bPlot
+
+
+if __name__ == '__main__':
+    sys.exit(main())
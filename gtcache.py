@@ -0,0 +1,203 @@
+#!/usr/bin/python
+#   ----------------------
+#   The Tsinghua-Daimler Cyclist Benchmark
+#   ----------------------
+#
+#
+#   License agreement
+#-  ----------------
+#
+#   This dataset is made freely available for non-commercial purposes such as academic research, teaching, scientific publications, or personal experimentation. Permission is granted to use, copy, and distribute the data given that you agree:
+#   1. That the dataset comes "AS IS", without express or implied warranty. Although every effort has been made to ensure accuracy, Daimler (or the website host) does not accept any responsibility for errors or omissions.
+#   2. That you include a reference to the above publication in any published work that makes use of the dataset.
+#   3. That if you have altered the content of the dataset or created derivative work, prominent notices are made so that any recipients know that they are not receiving the original data.
+#   4. That you may not use or distribute the dataset or any derivative work for commercial purposes as, for example, licensing or selling the data, or using the data with a purpose to procure a commercial gain.
+#   5. That this original license notice is retained with all copies or derivatives of the dataset.
+#   6. That all rights not expressly granted to you are reserved by Daimler. 
+#
+#   Contact
+#   -------
+#
+#   Fabian Flohr
+#   mail: tdcb at fabian-flohr.de
+
+
+# Binary cache of a ground truth split. All annotations of the split are stored as columns in a single file, which is
+# memory-mapped on load:
+#   frameIds:       frame identifier of each frame (sorted like the gt files)
+#   frameOffsets:   index of the first object of each frame in the object columns, plus the total number of objects
+#   boxes:          x, y, w, h of each object
+#   classCodes:     index of the class of each object in the classNames list of the header
+#   tags:           bitmask of the tags of each object (bit i is set for the i-th entry of the tagNames of the header)
+#
+# The file starts with a magic string, the length of the json header and the json header itself. The header contains
+# a fingerprint (name, size and mtime) of all source files, so the cache becomes invalid as soon as a file changes.
+
+import os
+import json
+import struct
+import hashlib
+import numpy as np
+
+CACHE_MAGIC = 'TDCBGT01'
+# alignment of the arrays within the cache file
+CACHE_ALIGN = 64
+
+
+# Fingerprint of a list of files based on their name, size and modification time
+def filesFingerprint(files):
+    md5 = hashlib.md5()
+    for filePath in files:
+        stat = os.stat(filePath)
+        md5.update('{}\t{}\t{!r}\n'.format(os.path.basename(filePath), stat.st_size, stat.st_mtime))
+    return md5.hexdigest()
+
+
+class GtCache(object):
+    def __init__(self, cacheFile):
+        # path of the cache file, None for a cache which is only kept in memory (see fromFrames)
+        self.cacheFile = cacheFile
+        # header of the loaded cache
+        self.header = None
+        # arrays of the loaded cache (memory-mapped)
+        self.frameIds = None
+        self.frameOffsets = None
+        self.boxes = None
+        self.classCodes = None
+        self.tags = None
+        # class names as array, indexed by the class codes
+        self.classNames = None
+        # frame identifier -> frame index
+        self.frameIdx = dict()
+
+    # the memory-mapped arrays are not pickled (e.g. when sending the evaluator to worker processes), they are mapped
+    # again on first access
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.cacheFile is None:
+            state['mappedFingerprint'] = None
+            return state
+        for key in ['header', 'frameIds', 'frameOffsets', 'boxes', 'classCodes', 'tags', 'classNames']:
+            state[key] = None
+        state['frameIdx'] = dict()
+        state['mappedFingerprint'] = self.header['fingerprint'] if self.header else None
+        return state
+
+    def __setstate__(self, state):
+        fingerprint = state.pop('mappedFingerprint')
+        self.__dict__.update(state)
+        if fingerprint is not None:
+            self.map(fingerprint)
+
+    # Loads the cache if it exists and was created from the given gt files with the given tag names.
+    # Returns True on success
+    def load(self, gtFiles, tagNames):
+        if not os.path.isfile(self.cacheFile):
+            return False
+        return self.map(filesFingerprint(gtFiles), tagNames)
+
+    # Maps the arrays of the cache file, if its fingerprint (and tag names) match
+    def map(self, fingerprint, tagNames=None):
+        with open(self.cacheFile, 'rb') as f:
+            if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                return False
+            headerLen, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(headerLen))
+
+        if header['fingerprint'] != fingerprint:
+            return False
+        if tagNames is not None and header['tagNames'] != list(tagNames):
+            return False
+
+        arrays = dict()
+        for name, desc in header['arrays'].items():
+            shape = tuple(desc['shape'])
+            if np.prod(shape) == 0:
+                arrays[name] = np.zeros(shape, dtype=desc['dtype'])
+            else:
+                arrays[name] = np.memmap(self.cacheFile, dtype=desc['dtype'], mode='r', offset=desc['offset'], shape=shape)
+
+        self.setArrays(header, arrays)
+        return True
+
+    # Fills the cache in memory from parsed frames (dicts of boxes, identity and tags, see Evaluator.parseGtFile) in the
+    # order of frameIds, without writing a cache file
+    def fromFrames(self, tagNames, frameIds, frames):
+        classNames, arrays = self.buildArrays(tagNames, frameIds, frames)
+        header = {'fingerprint': None, 'tagNames': list(tagNames), 'classNames': classNames}
+        self.setArrays(header, dict(arrays))
+
+    def setArrays(self, header, arrays):
+        self.header = header
+        self.frameIds = arrays['frameIds']
+        self.frameOffsets = arrays['frameOffsets']
+        self.boxes = arrays['boxes']
+        self.classCodes = arrays['classCodes']
+        self.tags = arrays['tags']
+        self.classNames = np.array(header['classNames'], dtype=object)
+        self.frameIdx = dict((frameId, idx) for idx, frameId in enumerate(self.frameIds.tolist()))
+
+    # Writes a new cache file for the given gt files. frames is a list of parsed frames (dicts of boxes, identity and
+    # tags, see Evaluator.parseGtFile) in the order of frameIds
+    def write(self, gtFiles, tagNames, frameIds, frames):
+        classNames, arrays = self.buildArrays(tagNames, frameIds, frames)
+
+        # header, the arrays start behind the header. Space for the digits of the array offsets is reserved in advance
+        header = {
+            'fingerprint': filesFingerprint(gtFiles),
+            'tagNames': list(tagNames),
+            'classNames': classNames,
+            'arrays': dict((name, {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': 0}) for name, array in arrays),
+        }
+        dataStart = self.alignOffset(len(CACHE_MAGIC) + 8 + len(json.dumps(header)) + 32 * len(arrays))
+        offset = dataStart
+        for name, array in arrays:
+            header['arrays'][name]['offset'] = offset
+            offset = self.alignOffset(offset + array.nbytes)
+        headerText = json.dumps(header)
+        assert len(CACHE_MAGIC) + 8 + len(headerText) <= dataStart
+
+        # write to a temporary file first, so that a concurrent reader never sees a partial cache
+        tmpFile = '{}.{}.tmp'.format(self.cacheFile, os.getpid())
+        with open(tmpFile, 'wb') as f:
+            f.write(CACHE_MAGIC)
+            f.write(struct.pack('<Q', len(headerText)))
+            f.write(headerText)
+            for name, array in arrays:
+                f.seek(header['arrays'][name]['offset'])
+                f.write(np.ascontiguousarray(array).tobytes())
+        os.rename(tmpFile, self.cacheFile)
+
+    # Columns of the given parsed frames, returns the class names and the list of (name, array)
+    def buildArrays(self, tagNames, frameIds, frames):
+        boxes = np.concatenate([np.zeros((0, 4))] + [frame['boxes'] for frame in frames]).astype(np.float64)
+        identity = np.concatenate([np.zeros(0, dtype=object)] + [frame['identity'] for frame in frames])
+        classNames, classCodes = np.unique(identity.astype(str), return_inverse=True)
+        tags = np.concatenate([np.zeros(0, dtype=np.uint8)] + [frame['tags'] for frame in frames])
+        frameOffsets = np.cumsum([0] + [len(frame['boxes']) for frame in frames]).astype(np.int64)
+
+        arrays = [
+            ('frameIds', np.array(frameIds, dtype=str)),
+            ('frameOffsets', frameOffsets),
+            ('boxes', boxes),
+            ('classCodes', classCodes.astype(np.uint16)),
+            ('tags', tags.astype(np.uint8 if len(tagNames) <= 8 else np.uint32)),
+        ]
+        return classNames.tolist(), arrays
+
+    def alignOffset(self, offset):
+        return (offset + CACHE_ALIGN - 1) // CACHE_ALIGN * CACHE_ALIGN
+
+    # Returns the parsed frame (dict of boxes, identity and tags) of the given frame identifier or None if the frame is
+    # not part of the cache
+    def getFrame(self, frameId):
+        idx = self.frameIdx.get(frameId)
+        if idx is None:
+            return None
+        start = self.frameOffsets[idx]
+        end = self.frameOffsets[idx + 1]
+        return {
+            'boxes': np.array(self.boxes[start:end]),
+            'identity': self.classNames[self.classCodes[start:end]],
+            'tags': np.array(self.tags[start:end], dtype=np.int32),
+        }
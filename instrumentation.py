@@ -0,0 +1,136 @@
+#!/usr/bin/python
+#   ----------------------
+#   The Tsinghua-Daimler Cyclist Benchmark
+#   ----------------------
+#
+#
+#   License agreement
+#-  ----------------
+#
+#   This dataset is made freely available for non-commercial purposes such as academic research, teaching, scientific publications, or personal experimentation. Permission is granted to use, copy, and distribute the data given that you agree:
+#   1. That the dataset comes "AS IS", without express or implied warranty. Although every effort has been made to ensure accuracy, Daimler (or the website host) does not accept any responsibility for errors or omissions.
+#   2. That you include a reference to the above publication in any published work that makes use of the dataset.
+#   3. That if you have altered the content of the dataset or created derivative work, prominent notices are made so that any recipients know that they are not receiving the original data.
+#   4. That you may not use or distribute the dataset or any derivative work for commercial purposes as, for example, licensing or selling the data, or using the data with a purpose to procure a commercial gain.
+#   5. That this original license notice is retained with all copies or derivatives of the dataset.
+#   6. That all rights not expressly granted to you are reserved by Daimler. 
+#
+#   Contact
+#   -------
+#
+#   Fabian Flohr
+#   mail: tdcb at fabian-flohr.de
+
+
+# Instrumentation of the evaluation: the time spent in each phase (e.g. glob, read, jsonLoads, matching, sort, calcPR,
+# plot) and counters (e.g. frames, dets, gt, iouComputations, bytesRead). Phases are measured with
+#   with instrumentation.phase('read'):
+#       ...
+# If the instrumentation is disabled, phase returns a shared object without any function and count returns at once,
+# the overhead is a method call.
+
+import json
+import pstats
+import cProfile
+from timeit import default_timer as timer
+
+
+class NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+NULL_PHASE = NullPhase()
+
+
+class Phase(object):
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = timer()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.instrumentation.addTime(self.name, timer() - self.start)
+        return False
+
+
+class Instrumentation(object):
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        # phase name -> total seconds and number of calls
+        self.times = dict()
+        self.calls = dict()
+        # counter name -> value
+        self.counters = dict()
+        # start of the measurement (see reset)
+        self.startTime = timer()
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        return Phase(self, name)
+
+    def addTime(self, name, seconds, calls=1):
+        self.times[name] = self.times.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    # adds the times and counters of another instrumentation, e.g. of a worker process
+    def merge(self, other):
+        for name, seconds in other.times.items():
+            self.addTime(name, seconds, other.calls[name])
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        self.times = dict()
+        self.calls = dict()
+        self.counters = dict()
+        self.startTime = timer()
+
+    # times and counters as dict. The times of worker processes are summed up, they can exceed the wall time
+    def toDict(self):
+        return {'wallSeconds': timer() - self.startTime,
+                'phases': dict((name, {'seconds': self.times[name], 'calls': self.calls[name]}) for name in self.times),
+                'counters': dict(self.counters)}
+
+    def writeJson(self, jsonPath):
+        with open(jsonPath, 'w') as f:
+            json.dump(self.toDict(), f, indent=2, sort_keys=True)
+
+    def printSummary(self):
+        summary = self.toDict()
+        wallSeconds = summary['wallSeconds']
+        print '#########################'
+        print 'Instrumentation (wall time {:.3f} s)'.format(wallSeconds)
+        print '{:<20} {:>10} {:>8} {:>10}'.format('phase', 'seconds', 'share', 'calls')
+        for name, phase in sorted(summary['phases'].items(), key=lambda item: -item[1]['seconds']):
+            print '{:<20} {:>10.3f} {:>7.1f}% {:>10}'.format(name, phase['seconds'], 100.0 * phase['seconds'] / max(wallSeconds, 1e-12), phase['calls'])
+        print '{:<20} {:>10}'.format('counter', 'value')
+        for name, value in sorted(summary['counters'].items()):
+            print '{:<20} {:>10}'.format(name, value)
+        print '#########################\n'
+
+
+# number of functions printed by profileCall
+PROFILE_STATS_LINES = 25
+
+
+# Calls func(*args, **kwargs) with the profiler cProfile, writes the statistics to profileFile (e.g. for snakeviz or
+# pstats) and prints the functions with the highest cumulative time. Returns the result of func
+def profileCall(profileFile, func, *args, **kwargs):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(profileFile)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(PROFILE_STATS_LINES)
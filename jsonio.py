@@ -0,0 +1,168 @@
+#!/usr/bin/python
+#   ----------------------
+#   The Tsinghua-Daimler Cyclist Benchmark
+#   ----------------------
+#
+#
+#   License agreement
+#-  ----------------
+#
+#   This dataset is made freely available for non-commercial purposes such as academic research, teaching, scientific publications, or personal experimentation. Permission is granted to use, copy, and distribute the data given that you agree:
+#   1. That the dataset comes "AS IS", without express or implied warranty. Although every effort has been made to ensure accuracy, Daimler (or the website host) does not accept any responsibility for errors or omissions.
+#   2. That you include a reference to the above publication in any published work that makes use of the dataset.
+#   3. That if you have altered the content of the dataset or created derivative work, prominent notices are made so that any recipients know that they are not receiving the original data.
+#   4. That you may not use or distribute the dataset or any derivative work for commercial purposes as, for example, licensing or selling the data, or using the data with a purpose to procure a commercial gain.
+#   5. That this original license notice is retained with all copies or derivatives of the dataset.
+#   6. That all rights not expressly granted to you are reserved by Daimler. 
+#
+#   Contact
+#   -------
+#
+#   Fabian Flohr
+#   mail: tdcb at fabian-flohr.de
+
+
+# Reading of the json label and detection files:
+#   loads       decodes a json text with the fastest installed backend (see JSON_BACKENDS) or a selected one
+#   decode*     extract the boxes, classes, tags and scores of the objects of a decoded frame as arrays. The json
+#               backend still builds a dict per object, only the evaluator's own per object dicts are avoided
+#   FilePrefetcher
+#               reads many small files with read-ahead in a background thread, while the caller decodes and
+#               evaluates the previous files
+
+import threading
+import Queue
+import operator
+import collections
+import numpy as np
+
+# json modules in the order of preference, the first installed one is used by default. ujson is used with
+# precise_float, so that the scores are decoded exactly like by the json module
+JSON_BACKENDS = ['ujson', 'simplejson', 'json']
+# backend name -> loads function
+loadsFunctions = dict()
+
+getBox = operator.itemgetter('mincol', 'minrow', 'maxcol', 'maxrow')
+getIdentity = operator.itemgetter('identity')
+getTags = operator.itemgetter('tags')
+
+
+# loads function of the given backend (None: first installed backend of JSON_BACKENDS)
+def getLoads(backend=None):
+    if backend in loadsFunctions:
+        return loadsFunctions[backend]
+
+    for name in JSON_BACKENDS if backend is None else [backend]:
+        try:
+            module = __import__(name)
+        except ImportError:
+            continue
+        if name == 'ujson':
+            loads = lambda text: module.loads(text, precise_float=True)
+        else:
+            loads = module.loads
+        loadsFunctions[backend] = loads
+        return loads
+
+    raise ImportError('json backend {} is not installed'.format(backend))
+
+
+# name of the backend used for the given backend setting
+def getBackendName(backend=None):
+    if backend is not None:
+        return backend
+    for name in JSON_BACKENDS:
+        try:
+            __import__(name)
+            return name
+        except ImportError:
+            continue
+
+
+def loads(text, backend=None):
+    return getLoads(backend)(text)
+
+
+# boxes (rows of x, y, w, h) of the decoded objects (children of a frame)
+def decodeBoxes(children):
+    boxes = np.array(map(getBox, children), dtype=np.float64).reshape(-1, 4)
+    boxes[:, 2:] -= boxes[:, :2]
+    return boxes
+
+
+# boxes, classes (object array) and tag lists of the decoded gt objects (the dicts built by loads), read with itemgetter
+# instead of copying each object to a new dict
+def decodeGtObjects(children):
+    identity = np.empty(len(children), dtype=object)
+    identity[:] = map(getIdentity, children)
+    return decodeBoxes(children), identity, map(getTags, children)
+
+
+# boxes and scores of the decoded dets of the given class, the score of dets without score (missing, null or NaN, as
+# in packed files) is initScore
+def decodeDetObjects(children, identity, initScore):
+    children = [detIn for detIn in children if detIn['identity'] == identity]
+    scores = np.array([detIn.get('score') for detIn in children], dtype=np.float64)
+    scores[np.isnan(scores)] = initScore
+    return decodeBoxes(children), scores
+
+
+# Reads the given files in order in a background thread, at most readAhead files ahead of the reader. read returns
+# the prefetched text of the given files (files skipped by the reader are dropped), other files are read directly.
+# Files which cannot be read are read again directly by read (which raises the error). The thread and queue are not
+# pickled, an unpickled prefetcher reads all files directly
+class FilePrefetcher(object):
+    def __init__(self, filePaths, readAhead=64):
+        # files not read yet by read
+        self.filePaths = collections.deque(filePaths)
+        self.pending = set(filePaths)
+        self.queue = Queue.Queue(maxsize=max(readAhead, 1))
+        self.stopped = False
+        self.thread = threading.Thread(target=self.readAll, args=(list(filePaths),))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['queue'] = None
+        state['thread'] = None
+        return state
+
+    def readAll(self, filePaths):
+        for filePath in filePaths:
+            if self.stopped:
+                break
+            try:
+                with open(filePath, 'r') as f:
+                    text = f.read()
+            except (IOError, OSError):
+                text = None
+            self.queue.put((filePath, text))
+
+    def read(self, filePath):
+        if self.queue is not None and filePath in self.pending:
+            # files skipped by the reader are dropped from the queue
+            while True:
+                nextPath = self.filePaths.popleft()
+                self.pending.discard(nextPath)
+                prefetchedPath, text = self.queue.get()
+                if nextPath == filePath:
+                    break
+            if text is not None:
+                return text
+        with open(filePath, 'r') as f:
+            return f.read()
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.stopped = True
+        # unblock the thread, if it waits for free space in the queue
+        while self.thread.is_alive():
+            try:
+                self.queue.get(timeout=0.01)
+            except Queue.Empty:
+                pass
+        self.thread.join()
+        self.thread = None
+        self.queue = None
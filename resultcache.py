@@ -0,0 +1,103 @@
+#!/usr/bin/python
+#   ----------------------
+#   The Tsinghua-Daimler Cyclist Benchmark
+#   ----------------------
+#
+#
+#   License agreement
+#-  ----------------
+#
+#   This dataset is made freely available for non-commercial purposes such as academic research, teaching, scientific publications, or personal experimentation. Permission is granted to use, copy, and distribute the data given that you agree:
+#   1. That the dataset comes "AS IS", without express or implied warranty. Although every effort has been made to ensure accuracy, Daimler (or the website host) does not accept any responsibility for errors or omissions.
+#   2. That you include a reference to the above publication in any published work that makes use of the dataset.
+#   3. That if you have altered the content of the dataset or created derivative work, prominent notices are made so that any recipients know that they are not receiving the original data.
+#   4. That you may not use or distribute the dataset or any derivative work for commercial purposes as, for example, licensing or selling the data, or using the data with a purpose to procure a commercial gain.
+#   5. That this original license notice is retained with all copies or derivatives of the dataset.
+#   6. That all rights not expressly granted to you are reserved by Daimler. 
+#
+#   Contact
+#   -------
+#
+#   Fabian Flohr
+#   mail: tdcb at fabian-flohr.de
+
+
+# Cache of evaluation results, one .npz file per entry in the cache directory. An entry is keyed on a fingerprint of
+# everything the result depends on: the format version of the gt cache and of the entries, the gt and det files (name,
+# size and mtime, see filesFingerprint) and the configuration of the evaluator. Entries which were not used for the
+# longest time are removed as soon as the cache directory exceeds its size limit (the mtime of an entry is updated on
+# each use).
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from gtcache import CACHE_MAGIC, filesFingerprint
+
+# version of the entries, has to be changed whenever the stored results or their calculation change
+RESULT_CACHE_VERSION = 'TDCBRC01'
+RESULT_EXT = '.npz'
+
+
+class ResultCache(object):
+    def __init__(self, cacheDir, maxBytes=256 * 1024 * 1024):
+        # directory of the entries, created on first store
+        self.cacheDir = cacheDir
+        # size limit of all entries in bytes
+        self.maxBytes = maxBytes
+
+    # Key of the result for the given gt files, det files (or packed det file) and configuration (dict of json
+    # serializable values)
+    def getKey(self, gtFiles, detFiles, config):
+        md5 = hashlib.md5()
+        md5.update(RESULT_CACHE_VERSION + '\n' + CACHE_MAGIC + '\n')
+        md5.update(filesFingerprint(gtFiles) + '\n')
+        md5.update(filesFingerprint(detFiles) + '\n')
+        md5.update(json.dumps(config, sort_keys=True))
+        return md5.hexdigest()
+
+    def getEntryPath(self, key):
+        return os.path.join(self.cacheDir, key + RESULT_EXT)
+
+    # Returns the arrays of the entry as dict, None if there is no (readable) entry for the key
+    def load(self, key):
+        entryPath = self.getEntryPath(key)
+        if not os.path.isfile(entryPath):
+            return None
+        try:
+            with np.load(entryPath) as entry:
+                arrays = dict((name, entry[name]) for name in entry.files)
+        except (IOError, ValueError):
+            return None
+        # mark as recently used
+        os.utime(entryPath, None)
+        return arrays
+
+    # Stores the arrays (dict of name -> array) as entry of the key and removes the least recently used entries if
+    # the size limit is exceeded. The entry is written to a temporary file first, so concurrent runs never read a
+    # partially written entry
+    def store(self, key, arrays):
+        if not os.path.isdir(self.cacheDir):
+            os.makedirs(self.cacheDir)
+        fd, tmpPath = tempfile.mkstemp(suffix=RESULT_EXT, dir=self.cacheDir, prefix='.tmp_')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.rename(tmpPath, self.getEntryPath(key))
+        self.evict()
+
+    # Removes the least recently used entries until the size of all entries is within maxBytes
+    def evict(self):
+        entries = list()
+        for fileName in os.listdir(self.cacheDir):
+            if fileName.endswith(RESULT_EXT) and not fileName.startswith('.'):
+                stat = os.stat(os.path.join(self.cacheDir, fileName))
+                entries.append((stat.st_mtime, stat.st_size, fileName))
+        entries.sort()
+
+        totalBytes = sum(entry[1] for entry in entries)
+        for mtime, size, fileName in entries:
+            if totalBytes <= self.maxBytes:
+                break
+            os.remove(os.path.join(self.cacheDir, fileName))
+            totalBytes -= size
@@ -0,0 +1,316 @@
+#!/usr/bin/python
+#   ----------------------
+#   The Tsinghua-Daimler Cyclist Benchmark
+#   ----------------------
+#
+#
+#   License agreement
+#-  ----------------
+#
+#   This dataset is made freely available for non-commercial purposes such as academic research, teaching, scientific publications, or personal experimentation. Permission is granted to use, copy, and distribute the data given that you agree:
+#   1. That the dataset comes "AS IS", without express or implied warranty. Although every effort has been made to ensure accuracy, Daimler (or the website host) does not accept any responsibility for errors or omissions.
+#   2. That you include a reference to the above publication in any published work that makes use of the dataset.
+#   3. That if you have altered the content of the dataset or created derivative work, prominent notices are made so that any recipients know that they are not receiving the original data.
+#   4. That you may not use or distribute the dataset or any derivative work for commercial purposes as, for example, licensing or selling the data, or using the data with a purpose to procure a commercial gain.
+#   5. That this original license notice is retained with all copies or derivatives of the dataset.
+#   6. That all rights not expressly granted to you are reserved by Daimler. 
+#
+#   Contact
+#   -------
+#
+#   Fabian Flohr
+#   mail: tdcb at fabian-flohr.de
+
+
+# Generator of synthetic datasets in the TDCB format, e.g. to benchmark the tools at a multiple of the size of the real
+# dataset. For each frame it writes (in the folder structure of the real dataset):
+#   labelData/{split}/tsinghuaDaimlerDataset/{frameId}_labelData.json      gt, layout of GroundTruthAnnotations_sample.json
+#   detection/{method}/{frameId}_detection.json                              dets, layout of Detections_sample.json
+#   disparity/{split}/tsinghuaDaimlerDataset/{frameId}_disparity.png       16 bit disparity image (see depth.py)
+#   camera/{split}/tsinghuaDaimlerDataset/{frameId}_camera.json            camera parameters (see camera.py)
+#
+# The objects stand on a flat road in front of the camera: the distance of an object follows from its box height and
+# its real height, the bottom of the box from the distance and the height and pitch of the camera. Each frame is generated from
+# its own random state seeded by (seed, frame index), the dataset is the same for the same seed and configuration,
+# independent of which outputs are written.
+#
+# Example:
+#   python synthetic.py -o /tmp/tdcbSynthetic --frames 10000 --seed 0
+#   python evaluation.py --gt /tmp/tdcbSynthetic/labelData/test/tsinghuaDaimlerDataset --method synthetic /tmp/tdcbSynthetic/detection/synthetic
+
+import os
+import sys
+import json
+import argparse
+import datetime
+import numpy as np
+from detection import Detection, PackedDetectionWriter
+
+
+class SyntheticDataset(object):
+    def __init__(self, seed=0):
+
+        # ################################################
+        # ######### CONFIGURATION ##########
+
+        # seed of the random states of all frames
+        self.seed = seed
+        # image size (width, height) in pixel
+        self.imageSize = (2048, 1024)
+        # number of frames of each sequence, all frames of a sequence share the date and sequence number
+        self.framesPerSequence = 100
+        # date of the first sequence, each following day has sequencesPerDay sequences
+        self.startDate = datetime.date(2014, 12, 4)
+        self.sequencesPerDay = 10
+
+        # mean number of gt objects per frame (poisson distributed)
+        self.objectsPerFrame = 4.0
+        # probability of each class of the gt objects
+        self.classMix = {'cyclist': 0.45, 'pedestrian': 0.3, 'mopedrider': 0.08, 'motorcyclist': 0.05, 'bike': 0.05,
+                         'tricyclist': 0.05, 'wheelchairuser': 0.02}
+        # box height in pixel, log-normal distributed with this median and sigma (of the log), clipped to the bounds
+        self.heightMedian = 60.0
+        self.heightSigma = 0.6
+        self.heightBounds = (20.0, 600.0)
+        # ratio of box width and height per class, defaultAspect for classes not listed
+        self.classAspect = {'cyclist': 0.5, 'pedestrian': 0.4, 'mopedrider': 0.5, 'motorcyclist': 0.5, 'bike': 0.6,
+                            'tricyclist': 0.6}
+        self.defaultAspect = 0.45
+        # real height of the objects in meter per class, defaultRealHeight for classes not listed
+        self.classRealHeight = {'cyclist': 1.8, 'pedestrian': 1.7, 'bike': 1.1, 'wheelchairuser': 1.3}
+        self.defaultRealHeight = 1.7
+        # probability of each occlusion tag (at most one tag per object)
+        self.occlusionProbs = {'occluded>10': 0.1, 'occluded>40': 0.1, 'occluded>80': 0.05}
+
+        # name of the simulated detection method (folder of the det files)
+        self.methodName = 'synthetic'
+        # class of the dets, gt of this class are the true positives
+        self.detectionsType = 'cyclist'
+        # probability that a gt of detectionsType is detected, reduced by occlusionRecallFactor for occluded gt
+        self.recall = 0.9
+        self.occlusionRecallFactor = 0.6
+        # probability that a gt of another class is detected as detectionsType
+        self.confusionRate = 0.1
+        # probability of an additional, shifted det of a detected gt (as removed by NMS)
+        self.duplicateRate = 0.2
+        # standard deviation of the box coordinates of the dets, relative to the box height
+        self.boxNoise = 0.05
+        # mean number of false positives per frame (poisson distributed), placed like gt objects
+        self.falsePositivesPerFrame = 2.0
+        # scores of true and false positives, normal distributed with these means and the same standard deviation
+        self.truePositiveScore = 2.0
+        self.falsePositiveScore = 0.0
+        self.scoreSigma = 1.0
+
+        # camera parameters as written to the camera json files (see CIsoCamera.loadFromJson)
+        self.intrinsic = {'fx': 2262.52, 'fy': 2265.3017905988554, 'u0': 1096.98, 'v0': 513.137}
+        self.extrinsic = {'baseline': 0.209313, 'x': 1.7, 'y': 0.1, 'z': 1.18, 'yaw': 0.0, 'pitch': 0.038, 'roll': 0.0}
+        # standard deviation of the disparity in pixel
+        self.disparityNoise = 0.1
+        # zlib compression level of the disparity images (the noise makes higher levels slow)
+        self.pngCompressLevel = 1
+
+        # ################################################
+
+    # frame identifier of the frame with the given index, e.g. tsinghuaDaimlerDataset_2014-12-04_000000_000000012
+    def getFrameId(self, idxFrame):
+        idxSequence = idxFrame // self.framesPerSequence
+        date = self.startDate + datetime.timedelta(days=idxSequence // self.sequencesPerDay)
+        return 'tsinghuaDaimlerDataset_{}_{:06d}_{:09d}'.format(date.isoformat(), idxSequence, idxFrame % self.framesPerSequence)
+
+    # random state of the frame with the given index, stream 0 for the objects, 1 for the disparity image
+    def getRandomState(self, idxFrame, stream=0):
+        return np.random.RandomState([self.seed, idxFrame, stream])
+
+    # Samples n boxes standing on the road. Returns the boxes (rows of mincol, minrow, maxcol, maxrow) and the
+    # distances of the objects in meter
+    def sampleBoxes(self, rng, identities):
+        n = len(identities)
+        width, height = self.imageSize
+        h = np.exp(rng.normal(np.log(self.heightMedian), self.heightSigma, n))
+        h = np.clip(h, self.heightBounds[0], self.heightBounds[1])
+        w = h * np.array([self.classAspect.get(identity, self.defaultAspect) for identity in identities])
+        realHeight = np.array([self.classRealHeight.get(identity, self.defaultRealHeight) for identity in identities])
+
+        distance = self.intrinsic['fy'] * realHeight / h
+        maxrow = self.getRoadRow(distance)
+        mincol = rng.uniform(0, np.maximum(width - w, 1))
+        boxes = np.column_stack([mincol, maxrow - h, mincol + w, np.minimum(maxrow, height - 1)])
+        return np.round(boxes).astype(np.int64), distance
+
+    # image row of the road at the given distance (x in camera coordinates, see CIsoCamera.image_to_world)
+    def getRoadRow(self, distance):
+        pitch = self.extrinsic['pitch']
+        return self.intrinsic['v0'] + self.intrinsic['fy'] * (self.extrinsic['z'] / distance - np.sin(pitch)) / np.cos(pitch)
+
+    # Generates the gt objects (dicts in the layout of the gt json files) and dets (Detection) of a frame, together
+    # with the distance of each gt object
+    def generateFrame(self, idxFrame):
+        rng = self.getRandomState(idxFrame)
+        frameId = self.getFrameId(idxFrame)
+        imgName = frameId + '_leftImg8bit.png'
+
+        classNames = sorted(self.classMix.keys())
+        classProbs = np.array([self.classMix[className] for className in classNames], dtype=np.float64)
+        tagNames = sorted(self.occlusionProbs.keys())
+        tagProbs = np.array([self.occlusionProbs[tag] for tag in tagNames] + [0.0])
+        tagProbs[-1] = max(1.0 - tagProbs.sum(), 0.0)
+
+        # gt objects
+        nObjects = rng.poisson(self.objectsPerFrame)
+        identities = [classNames[idx] for idx in rng.choice(len(classNames), nObjects, p=classProbs / classProbs.sum())]
+        boxes, distances = self.sampleBoxes(rng, identities)
+        idxTags = rng.choice(len(tagProbs), nObjects, p=tagProbs / tagProbs.sum())
+
+        children = list()
+        for idxObj, identity in enumerate(identities):
+            mincol, minrow, maxcol, maxrow = boxes[idxObj].tolist()
+            trackNr = 400000 + idxObj
+            children.append({
+                'maxcol': maxcol,
+                'tags': [tagNames[idxTags[idxObj]]] if idxTags[idxObj] < len(tagNames) else [],
+                'trackid': '{}_{}'.format(identity, trackNr),
+                'mincol': mincol,
+                'minrow': minrow,
+                'maxrow': maxrow,
+                'uniqueid': idxFrame * 1000 + idxObj,
+                'type': 'rect',
+                'children': [],
+                'identity': identity,
+            })
+
+        # dets of the gt objects (true positives, confusions and duplicates)
+        detection = Detection(imgName)
+        for idxObj, child in enumerate(children):
+            if child['identity'] == self.detectionsType:
+                probDetected = self.recall * (self.occlusionRecallFactor if child['tags'] else 1.0)
+            else:
+                probDetected = self.confusionRate
+            if rng.uniform() >= probDetected:
+                continue
+            nDets = 2 if rng.uniform() < self.duplicateRate else 1
+            h = child['maxrow'] - child['minrow']
+            for idxDet in range(nDets):
+                noise = rng.normal(0, self.boxNoise * h * (idxDet + 1), 4)
+                score = rng.normal(self.truePositiveScore, self.scoreSigma) - idxDet * self.scoreSigma
+                self.addDet(detection, [child['mincol'], child['minrow'], child['maxcol'], child['maxrow']] + noise, score)
+
+        # false positives
+        nFalsePositives = rng.poisson(self.falsePositivesPerFrame)
+        fpBoxes, fpDistances = self.sampleBoxes(rng, [self.detectionsType] * nFalsePositives)
+        for box in fpBoxes:
+            self.addDet(detection, box, rng.normal(self.falsePositiveScore, self.scoreSigma))
+
+        return children, detection, distances
+
+    def addDet(self, detection, box, score):
+        mincol, minrow, maxcol, maxrow = np.round(box).astype(np.int64).tolist()
+        detection.addDetAnnotation(minrow, mincol, max(maxrow, minrow + 1), max(maxcol, mincol + 1), float(score), self.detectionsType)
+
+    # 16 bit disparity image of a frame (stored disparity * 256 + 1, 0 for invalid pixels): the road below the horizon
+    # and the gt objects as planes at their distance, nearer objects in front
+    def createDisparityImage(self, idxFrame, children, distances):
+        rng = self.getRandomState(idxFrame, 1)
+        width, height = self.imageSize
+        fx, fy, v0 = self.intrinsic['fx'], self.intrinsic['fy'], self.intrinsic['v0']
+        baseline, z, pitch = self.extrinsic['baseline'], self.extrinsic['z'], self.extrinsic['pitch']
+
+        # inverse of getRoadRow, no road above the horizon
+        rows = np.arange(height, dtype=np.float64)
+        roadDisparity = np.maximum(fx * baseline / z * ((rows - v0) * np.cos(pitch) / fy + np.sin(pitch)), 0.0)
+        disparity = np.repeat(roadDisparity[:, np.newaxis], width, axis=1)
+        for idxObj in np.argsort(-distances, kind='mergesort'):
+            child = children[idxObj]
+            minrow, maxrow = max(child['minrow'], 0), min(child['maxrow'] + 1, height)
+            mincol, maxcol = max(child['mincol'], 0), min(child['maxcol'] + 1, width)
+            disparity[minrow:maxrow, mincol:maxcol] = fx * baseline / distances[idxObj]
+
+        isValid = disparity > 0
+        disparity += rng.normal(0, self.disparityNoise, disparity.shape)
+        encoded = np.clip(np.round(disparity * 256 + 1), 1, 65535)
+        return np.where(isValid, encoded, 0).astype(np.uint16)
+
+    def writeDisparityImage(self, filePath, disparity):
+        import PIL.Image as Image
+        Image.fromarray(disparity).save(filePath, compress_level=self.pngCompressLevel)
+
+    def getCameraJson(self):
+        return json.dumps({'intrinsic': self.intrinsic, 'extrinsic': self.extrinsic}, sort_keys=True, indent=4)
+
+    # Writes nFrames frames (starting with frame index firstFrame) of the split to rootFolder. The dets are written
+    # as json files or, if packed is set, appended to the packed file detection/{method}.tdcbdet. Returns the number
+    # of written frames
+    def write(self, rootFolder, nFrames, split='test', firstFrame=0, disparity=True, camera=True, packed=False):
+        labelFolder = os.path.join(rootFolder, 'labelData', split, 'tsinghuaDaimlerDataset')
+        detFolder = os.path.join(rootFolder, 'detection', self.methodName)
+        dispFolder = os.path.join(rootFolder, 'disparity', split, 'tsinghuaDaimlerDataset')
+        cameraFolder = os.path.join(rootFolder, 'camera', split, 'tsinghuaDaimlerDataset')
+        folders = [labelFolder, os.path.dirname(detFolder) if packed else detFolder]
+        folders += [dispFolder] if disparity else []
+        folders += [cameraFolder] if camera else []
+        for folder in folders:
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+
+        cameraJson = self.getCameraJson()
+        writer = PackedDetectionWriter(detFolder + '.tdcbdet') if packed else None
+        try:
+            for idxFrame in range(firstFrame, firstFrame + nFrames):
+                frameId = self.getFrameId(idxFrame)
+                children, detection, distances = self.generateFrame(idxFrame)
+
+                gtFrame = {'imagename': frameId + '_leftImg8bit.png', 'tags': [], 'children': children,
+                           'identity': 'entitylist'}
+                with open(os.path.join(labelFolder, frameId + '_labelData.json'), 'w') as f:
+                    f.write(json.dumps(gtFrame, indent=2))
+                if writer is not None:
+                    writer.write(detection)
+                else:
+                    with open(os.path.join(detFolder, frameId + '_detection.json'), 'w') as f:
+                        f.write(detection.toJsonText())
+                if disparity:
+                    self.writeDisparityImage(os.path.join(dispFolder, frameId + '_disparity.png'),
+                                             self.createDisparityImage(idxFrame, children, distances))
+                if camera:
+                    with open(os.path.join(cameraFolder, frameId + '_camera.json'), 'w') as f:
+                        f.write(cameraJson)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        return nFrames
+
+
+# writes a synthetic dataset in the specified folder
+def main(argv):
+    parser = argparse.ArgumentParser(description='Generates a synthetic dataset in the format of the Tsinghua-Daimler Cyclist Benchmark.')
+    parser.add_argument('-o', '--datasetRootFolder', type=str, required=True,
+                        help='Root folder of the dataset, the labelData, detection, disparity and camera folders are created in it')
+    parser.add_argument('--frames', type=int, default=1000, help='number of frames')
+    parser.add_argument('--first-frame', type=int, default=0, help='index of the first frame, e.g. to extend a dataset')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--split', default='test', help='name of the split folders')
+    parser.add_argument('--method', default='synthetic', help='name of the simulated detection method')
+    parser.add_argument('--objects', type=float, default=4.0, help='mean number of gt objects per frame')
+    parser.add_argument('--false-positives', type=float, default=2.0, help='mean number of false positives per frame')
+    parser.add_argument('--recall', type=float, default=0.9, help='probability that a cyclist is detected')
+    parser.add_argument('--box-noise', type=float, default=0.05, help='noise of the det boxes relative to the box height')
+    parser.add_argument('--no-disparity', action='store_true', help='do not write disparity images')
+    parser.add_argument('--no-camera', action='store_true', help='do not write camera files')
+    parser.add_argument('--packed', action='store_true', help='write the dets to a packed detection file (see detection.py)')
+    opts = parser.parse_args(argv[1:])
+
+    dataset = SyntheticDataset(opts.seed)
+    dataset.methodName = opts.method
+    dataset.objectsPerFrame = opts.objects
+    dataset.falsePositivesPerFrame = opts.false_positives
+    dataset.recall = opts.recall
+    dataset.boxNoise = opts.box_noise
+
+    nFrames = dataset.write(opts.datasetRootFolder, opts.frames, opts.split, opts.first_frame,
+                            disparity=not opts.no_disparity, camera=not opts.no_camera, packed=opts.packed)
+    print 'Wrote {} frames to {}'.format(nFrames, os.path.abspath(opts.datasetRootFolder))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,757 @@
+#!/usr/bin/python
+#   ----------------------
+#   The Tsinghua-Daimler Cyclist Benchmark
+#   ----------------------
+#
+#
+#   License agreement
+#-  ----------------
+#
+#   This dataset is made freely available for non-commercial purposes such as academic research, teaching, scientific publications, or personal experimentation. Permission is granted to use, copy, and distribute the data given that you agree:
+#   1. That the dataset comes "AS IS", without express or implied warranty. Although every effort has been made to ensure accuracy, Daimler (or the website host) does not accept any responsibility for errors or omissions.
+#   2. That you include a reference to the above publication in any published work that makes use of the dataset.
+#   3. That if you have altered the content of the dataset or created derivative work, prominent notices are made so that any recipients know that they are not receiving the original data.
+#   4. That you may not use or distribute the dataset or any derivative work for commercial purposes as, for example, licensing or selling the data, or using the data with a purpose to procure a commercial gain.
+#   5. That this original license notice is retained with all copies or derivatives of the dataset.
+#   6. That all rights not expressly granted to you are reserved by Daimler. 
+#
+#   Contact
+#   -------
+#
+#   Fabian Flohr
+#   mail: tdcb at fabian-flohr.de
+
+
+
+# Regression tests of the evaluation against the reference implementations of the original evaluation script (the
+# per pair loops over lists of dicts). The vectorized engine has to reproduce their results exactly, e.g. the match
+# flags of each det and gt and the points of the PR-curve. Run with:
+#   python -m unittest -v test_evaluation
+
+import os
+import json
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from evaluation import Evaluator, ScoreHistogram
+from resultcache import ResultCache
+from gtcache import GtCache
+from detection import Detection, PackedDetectionReader, PackedDetectionWriter, PACKED_DET_DTYPE
+from synthetic import SyntheticDataset
+
+
+# matching loop of the original Evaluator.evaluateFrame, sets the 'matched' flags of the given det and gt dicts
+def matchFrameReference(evaluator, gtList, detList):
+    # sort det lists by detection score desc
+    detList.sort(key=lambda k: k['score'], reverse=True)
+
+    # sort gt_list by ignore flag (ignored gt at the end of the list)
+    gtList.sort(key=lambda k: k['ignore'])
+
+    # iterate over all detections (sorted by score) and find best matching gt (highest IoU)
+    for det in detList:
+        maxIoU = evaluator.minIoU
+        idxBestGt = -1
+        matchedWithIgnore = False
+
+        # iterate over all gt annotations
+        for idx_gt, gt in enumerate(gtList):
+            matchedGt = gt['matched']
+
+            # if gt is allready matched, and no multiple matches are allowed: next gt
+            if matchedGt and not evaluator.allowMultipleMatches and not gt['ignore']:
+                continue
+
+            # if det is matched with a non ignoreable gt and current gt is ignorable: next det (due to the sorting only ignor-gts follow)
+            if idxBestGt >= 0 and not matchedWithIgnore and gt['ignore']:
+                break
+
+            # calculate IoU of gt and det
+            cIoU = evaluator.calcIoU(gt, det)
+
+            # smaller than maximum so far: continue
+            if cIoU < maxIoU:
+                continue
+            else:
+                maxIoU = cIoU
+                idxBestGt = idx_gt
+
+                if gt['ignore']:
+                    matchedWithIgnore = True
+
+        # Write match back to det
+        if idxBestGt >= 0:
+            if matchedWithIgnore:
+                det['matched'] = -1
+            else:
+                det['matched'] = 1
+
+        # Write match back to gt
+        if idxBestGt >= 0:
+            gtList[idxBestGt]['matched'] = 1
+
+
+# original Evaluator.calcPR on the det and gt dicts of all frames, with the reference points of the evaluator
+def calcPRReference(evaluator, detListAll, gtListAll):
+    # remove all ignored gt
+    gtListAll[:] = [g for g in gtListAll if g.get('ignore') == False]
+
+    # remove all det matched with an ignored gt
+    detListAll[:] = [d for d in detListAll if d.get('matched') != -1]
+
+    # Check for empty lists
+    if len(detListAll) <= 0:
+        return 0,0,0
+    if len(gtListAll) <= 0:
+        return 0,0,0
+
+    # sort detections desc by their detection score
+    detListAll.sort(key=lambda k: k['score'], reverse=True)
+
+    # cumsum falsepositive and truepositive
+    fp = np.zeros(len(detListAll))
+    tp = np.zeros(len(detListAll))
+    tp_cnt = 0
+    fp_cnt = 0
+
+    for idxDet, det in enumerate(detListAll):
+        if det['matched'] == 1:
+            # increase tp
+            tp_cnt += 1
+        elif det['matched'] == 0:
+            # increase fp
+            fp_cnt += 1
+
+        fp[idxDet] = fp_cnt
+        tp[idxDet] = tp_cnt
+
+    # number of positive cases (gt)
+    nof_pos = len(gtListAll)
+
+    # calculate the x and y data points of the PR-curve
+    x_points = np.divide(tp, nof_pos)
+    y_points = np.divide(tp, np.add(tp, fp))
+
+    # calculate the precision at each reference point
+    ref_pts = np.zeros(len(evaluator.referencePoints))
+    idxR = 0
+    ref = evaluator.referencePoints[idxR]
+    for idxDet, rec in enumerate(x_points):
+        if rec >= ref:
+            ref_pts[idxR] = y_points[idxDet]
+            idxR += 1
+            if idxR >= len(evaluator.referencePoints):
+                break;
+
+            ref = evaluator.referencePoints[idxR]
+            continue
+
+    avg_prec = np.mean(ref_pts)
+
+    return x_points, y_points, avg_prec
+
+
+# greedy NMS with the per pair calcIoU, returns a flag for each det if it is kept
+def calcNMSKeepReference(evaluator, boxes, scores, nmsThreshold, topK=None):
+    dets = [{'x': x, 'y': y, 'w': w, 'h': h, 'ignore': 0} for x, y, w, h in boxes]
+    kept = list()
+    for idxDet in sorted(range(len(dets)), key=lambda idx: scores[idx], reverse=True):
+        if all(evaluator.calcIoU(dets[idxKept], dets[idxDet]) <= nmsThreshold for idxKept in kept):
+            kept.append(idxDet)
+    keep = np.zeros(len(dets), dtype=bool)
+    keep[kept[:topK]] = True
+    return keep
+
+
+# Random frame with crowded, overlapping and partly identical boxes (float coordinates), ignored gt, tied IoU and tied
+# scores. Returns the gt and det lists in the layout of Evaluator.loadFrame
+def createRandomFrame(rng, nGt, nDet):
+    gtList = list()
+    for idxGt in range(nGt):
+        x, y = rng.uniform(0, 600, 2)
+        w, h = rng.uniform(5, 120, 2)
+        if idxGt > 0 and rng.rand() < 0.2:
+            # duplicate of a previous gt, dets have the same IoU with both
+            gt = gtList[rng.randint(idxGt)]
+            x, y, w, h = gt['x'], gt['y'], gt['w'], gt['h']
+        gtList.append({'x': x, 'y': y, 'w': w, 'h': h, 'type': 'cyclist', 'ignore': int(rng.rand() < 0.3), 'tags': 0,
+                       'matched': 0})
+
+    detList = list()
+    for idxDet in range(nDet):
+        if nGt > 0 and rng.rand() < 0.7:
+            # det near a gt, some of them exactly on it
+            gt = gtList[rng.randint(nGt)]
+            shift = 0.0 if rng.rand() < 0.2 else rng.normal(0, 8)
+            x, y, w, h = gt['x'] + shift, gt['y'] - shift, gt['w'] * rng.uniform(0.8, 1.2), gt['h']
+        else:
+            x, y = rng.uniform(0, 600, 2)
+            w, h = rng.uniform(5, 120, 2)
+        # few distinct scores, many ties
+        detList.append({'x': x, 'y': y, 'w': w, 'h': h, 'type': 'cyclist', 'score': float(rng.randint(0, 8)) / 8,
+                        'matched': 0})
+
+    return gtList, detList
+
+
+def copyFrame(gtList, detList):
+    return [dict(gt) for gt in gtList], [dict(det) for det in detList]
+
+
+class MatchingTest(unittest.TestCase):
+    def checkMatching(self, evaluator, seed, nFrames=200):
+        rng = np.random.RandomState(seed)
+        for idxFrame in range(nFrames):
+            gtList, detList = createRandomFrame(rng, rng.randint(0, 15), rng.randint(0, 40))
+            refGtList, refDetList = copyFrame(gtList, detList)
+            matchFrameReference(evaluator, refGtList, refDetList)
+
+            evaluator.gtList, evaluator.detList = gtList, detList
+            evaluator.currentGtFile = 'frame{}'.format(idxFrame)
+            evaluator.evaluateFrame()
+
+            # both sort the lists stably, the dicts are in the same order
+            self.assertEqual([det['matched'] for det in evaluator.detList], [det['matched'] for det in refDetList])
+            self.assertEqual([gt['matched'] for gt in evaluator.gtList], [gt['matched'] for gt in refGtList])
+
+    def testMatching(self):
+        self.checkMatching(Evaluator(None), 0)
+
+    def testMultipleMatches(self):
+        evaluator = Evaluator(None)
+        evaluator.allowMultipleMatches = True
+        self.checkMatching(evaluator, 1)
+
+    def testMinIoU(self):
+        for minIoU in [0.3, 0.7]:
+            evaluator = Evaluator(None)
+            evaluator.minIoU = minIoU
+            self.checkMatching(evaluator, 2)
+
+    def testSparseMatching(self):
+        # every frame is matched on the overlapping pairs only (see calcIoUPairs)
+        for allowMultipleMatches in [False, True]:
+            evaluator = Evaluator(None)
+            evaluator.sparseIoUMinPairs = 0
+            evaluator.sparseIoUMaxShare = 1.0
+            evaluator.allowMultipleMatches = allowMultipleMatches
+            self.checkMatching(evaluator, 3)
+
+    def testIoUPairs(self):
+        # the overlapping pairs are the non zero entries of the IoU matrix, also for large, touching and empty bbs
+        evaluator = Evaluator(None)
+        rng = np.random.RandomState(5)
+        for idxFrame in range(100):
+            nGt, nDet = rng.randint(0, 30), rng.randint(0, 200)
+            size = rng.choice([10, 100, 800])
+            gtBoxes = np.round(np.column_stack([rng.uniform(-50, 2048, (nGt, 2)), rng.uniform(0, size, (nGt, 2))]), 1)
+            detBoxes = np.round(np.column_stack([rng.uniform(-50, 2048, (nDet, 2)), rng.uniform(0, size, (nDet, 2))]), 1)
+            if nGt > 0 and nDet > 0:
+                # touching and identical bbs
+                detBoxes[0] = gtBoxes[0] + [gtBoxes[0, 2], 0, 0, 0]
+                detBoxes[-1] = gtBoxes[-1]
+            gtIgnore = rng.rand(nGt) < 0.3
+
+            iou = evaluator.calcIoUMatrix(gtBoxes, gtIgnore, detBoxes)
+            iouPairs = evaluator.calcIoUPairs(gtBoxes, gtIgnore, detBoxes)
+            self.assertEqual(iouPairs['shape'], iou.shape)
+            idxDet, idxGt = np.nonzero(iou)
+            self.assertTrue(np.array_equal(iouPairs['idxDet'], idxDet))
+            self.assertTrue(np.array_equal(iouPairs['idxGt'], idxGt))
+            self.assertTrue(np.array_equal(iouPairs['iou'], iou[idxDet, idxGt]))
+
+    def testFrameIoU(self):
+        # crowded frames with small bbs use the pairs, frames with large bbs the full matrix
+        evaluator = Evaluator(None)
+        rng = np.random.RandomState(6)
+        for size, bSparse in [(40, True), (600, False)]:
+            gtBoxes = np.column_stack([rng.uniform(0, 2048, (100, 2)), rng.uniform(size / 2, size, (100, 2))])
+            detBoxes = np.column_stack([rng.uniform(0, 2048, (3000, 2)), rng.uniform(size / 2, size, (3000, 2))])
+            iou = evaluator.calcFrameIoU(gtBoxes, np.zeros(100, dtype=bool), detBoxes)
+            self.assertEqual(isinstance(iou, dict), bSparse)
+
+
+class NMSTest(unittest.TestCase):
+    def testNMSKeep(self):
+        evaluator = Evaluator(None)
+        rng = np.random.RandomState(7)
+        for idxFrame in range(100):
+            # clusters of bbs around a few objects, some of them identical, tied scores
+            nDets = rng.randint(0, 150)
+            centers = np.column_stack([rng.uniform(0, 2048, (5, 2)), rng.uniform(10, rng.choice([50, 500]), (5, 2))])
+            boxes = centers[rng.randint(0, 5, nDets)] + rng.normal(0, 5, (nDets, 4)) * (rng.rand(nDets, 1) < 0.8)
+            scores = np.round(rng.rand(nDets), 1)
+            for nmsThreshold, topK in [(0.3, None), (0.5, None), (0.7, 10), (None, 5)]:
+                keep = evaluator.calcNMSKeep(boxes, scores, nmsThreshold, topK)
+                refKeep = calcNMSKeepReference(evaluator, boxes, scores, np.inf if nmsThreshold is None else nmsThreshold, topK)
+                self.assertTrue(np.array_equal(keep, refKeep))
+
+            # pairs calculated once for the lowest threshold
+            order = np.argsort(-scores, kind='mergesort')
+            nmsPairs = evaluator.calcNMSPairs(boxes[order], 0.3)
+            for nmsThreshold in [0.3, 0.5, 0.7]:
+                keep = evaluator.calcNMSKeep(boxes[order], scores[order], nmsThreshold, None, nmsPairs)
+                self.assertTrue(np.array_equal(keep, evaluator.calcNMSKeep(boxes[order], scores[order], nmsThreshold)))
+
+
+class PRTest(unittest.TestCase):
+    # random match states and scores with many ties of nDets det and the number of non ignored gt
+    def createRandomDets(self, rng, nDets):
+        scores = np.round(rng.uniform(0, 1, nDets), rng.randint(1, 4))
+        matched = rng.choice(np.array([-1, 0, 1], dtype=np.int8), nDets, p=[0.1, 0.5, 0.4])
+        nofPos = int(np.count_nonzero(matched == 1)) + rng.randint(0, 50)
+        return scores, matched, nofPos
+
+    def checkPR(self, evaluator, seed, nTests=50):
+        rng = np.random.RandomState(seed)
+        for idxTest in range(nTests):
+            scores, matched, nofPos = self.createRandomDets(rng, rng.randint(1, 2000))
+            detListAll = [{'score': score, 'matched': int(m)} for score, m in zip(scores, matched)]
+            gtListAll = [{'ignore': False}] * nofPos + [{'ignore': True}] * rng.randint(0, 10)
+
+            ref = calcPRReference(evaluator, detListAll, gtListAll)
+            result = evaluator.calcPRFromArrays(scores, matched, nofPos)
+            self.assertTrue(np.array_equal(result[0], ref[0]))
+            self.assertTrue(np.array_equal(result[1], ref[1]))
+            self.assertEqual(result[2], ref[2])
+
+    def testPR(self):
+        self.checkPR(Evaluator(None), 0)
+
+    def testReferencePoints(self):
+        # fine and irregular grids of reference points
+        evaluator = Evaluator(None)
+        evaluator.referencePoints = np.linspace(0, 1, 101)
+        self.checkPR(evaluator, 1)
+        evaluator.referencePoints = np.sort(np.random.RandomState(2).uniform(0, 1, 37))
+        self.checkPR(evaluator, 3)
+
+    def testLogAvgMissRate(self):
+        # fixed curve of 10 dets on 5 frames with 10 gt, FPPI points 10^-2..10^0 (9 points)
+        evaluator = Evaluator(None)
+        tp = np.array([1, 2, 2, 3, 4, 4, 4, 5, 5, 5], dtype=np.float64)
+        fp = np.array([0, 0, 1, 1, 1, 2, 3, 3, 4, 5], dtype=np.float64)
+        fppi, miss_rate, log_avg_mr = evaluator.calcMRFromCounts(tp, fp, 10, 5)
+        self.assertTrue(np.allclose(fppi, [0, 0, 0.2, 0.2, 0.2, 0.4, 0.6, 0.6, 0.8, 1.0]))
+        self.assertTrue(np.allclose(miss_rate, [0.9, 0.8, 0.8, 0.7, 0.6, 0.6, 0.6, 0.5, 0.5, 0.5]))
+        # FPPI points up to 0.178: det 2, 0.316: det 5, 0.562: det 6, 1.0: det 10
+        refMR = [0.8] * 6 + [0.6, 0.6, 0.5]
+        self.assertAlmostEqual(log_avg_mr, np.exp(np.mean(np.log(refMR))))
+        self.assertAlmostEqual(log_avg_mr, 0.7122719229539476)
+
+        # FPPI points below the FPPI of the first det have miss rate 1
+        fppi, miss_rate, log_avg_mr = evaluator.calcMRFromCounts(np.array([0.0, 1.0]), np.array([1.0, 1.0]), 4, 1)
+        self.assertAlmostEqual(log_avg_mr, 0.75 ** (1 / 9.0))
+
+        # a miss rate of 0 is clamped to 1e-10
+        fppi, miss_rate, log_avg_mr = evaluator.calcMRFromCounts(np.array([1.0]), np.array([0.0]), 1, 1)
+        self.assertTrue(np.isclose(log_avg_mr, 1e-10, rtol=1e-9, atol=0))
+
+    def testSpillRuns(self):
+        # the merged spill runs (read in small blocks) yield the curves of the in memory arrays
+        rng = np.random.RandomState(4)
+        evaluator = Evaluator(None)
+        evaluator.spillDir = tempfile.mkdtemp(prefix='tdcbTest_')
+        evaluator.spillBlockSize = 7
+        try:
+            for idxTest in range(20):
+                scores, matched, nofPos = self.createRandomDets(rng, rng.randint(1, 3000))
+                nFrames = rng.randint(1, 100)
+                bounds = np.sort(rng.randint(0, len(scores), rng.randint(0, 6)))
+                for chunkScores, chunkMatched in zip(np.split(scores, bounds), np.split(matched, bounds)):
+                    evaluator.detAll.extend(chunkScores, chunkMatched)
+                    evaluator.spillDetRun()
+
+                prCurve, mrCurve = evaluator.calcCurvesFromSpillRuns(evaluator.spillRuns, nofPos, nFrames)
+                refPRCurve, refMRCurve = evaluator.calcCurvesFromArrays(scores, matched, nofPos, nFrames)
+                for values, refValues in zip(prCurve + mrCurve, refPRCurve + refMRCurve):
+                    self.assertTrue(np.array_equal(values, refValues))
+
+                # subsampled curves, the same avg_prec and log-average miss rate
+                evaluator.maxCurvePoints = 50
+                prCurve, mrCurve = evaluator.calcCurvesFromSpillRuns(evaluator.spillRuns, nofPos, nFrames)
+                self.assertLessEqual(len(prCurve[0]), 50)
+                self.assertEqual(prCurve[2], refPRCurve[2])
+                self.assertEqual(mrCurve[2], refMRCurve[2])
+                evaluator.maxCurvePoints = 100000
+                evaluator.removeSpillRuns()
+        finally:
+            evaluator.removeSpillRuns()
+            shutil.rmtree(evaluator.spillDir)
+
+    def testMergedRuns(self):
+        # runs with overlapping, disjoint and equal score ranges, merged in blocks of different sizes equal a stable sort
+        rng = np.random.RandomState(5)
+        evaluator = Evaluator(None)
+        evaluator.spillDir = tempfile.mkdtemp(prefix='tdcbTest_')
+        try:
+            scoresAll = list()
+            matchedAll = list()
+            for idxRun in range(12):
+                nDets = rng.randint(0, 300)
+                scores = np.round(rng.rand(nDets), 2) + [0, idxRun, 5][idxRun % 3]
+                matched = rng.choice([-1, 0, 1], nDets).astype(np.int8)
+                evaluator.detAll.extend(scores, matched)
+                evaluator.spillDetRun()
+                scoresAll.append(scores[matched != -1])
+                matchedAll.append(matched[matched != -1])
+            scoresAll = np.concatenate(scoresAll)
+            refMatched = np.concatenate(matchedAll)[np.argsort(-scoresAll, kind='mergesort')]
+
+            for spillBlockSize in [1, 2, 7, 64, 1000]:
+                evaluator.spillBlockSize = spillBlockSize
+                blocks = list(evaluator.iterMergedRuns(evaluator.spillRuns))
+                self.assertTrue(np.array_equal(np.concatenate(blocks), refMatched))
+        finally:
+            evaluator.removeSpillRuns()
+            shutil.rmtree(evaluator.spillDir)
+
+
+class ScoreHistogramTest(unittest.TestCase):
+    def testFirstRange(self):
+        # the first scores span all bins, the width is not doubled
+        histogram = ScoreHistogram(4096)
+        histogram.add(np.array([0.1, 0.5, 0.9]), np.array([1, 0, 1]))
+        self.assertAlmostEqual(histogram.width, 0.8 / 4095)
+        self.assertEqual((histogram.tp[0], histogram.fp[2047], histogram.tp[-1]), (1, 1, 1))
+
+        # equal scores
+        histogram = ScoreHistogram(4096)
+        histogram.add(np.array([0.5, 0.5]), np.array([1, 0]))
+        self.assertEqual((histogram.tp[0], histogram.fp[0]), (1, 1))
+
+    def testNonFiniteScores(self):
+        for score in [np.inf, -np.inf, np.nan]:
+            histogram = ScoreHistogram()
+            self.assertRaises(ValueError, histogram.add, np.array([0.1, score]), np.array([1, 0]))
+        # dets matched with ignored gt are not counted
+        histogram.add(np.array([0.1, np.inf]), np.array([1, -1]))
+        self.assertEqual(histogram.tp.sum(), 1)
+
+
+class PackedDetectionTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='tdcbPacked_')
+        self.packedFile = os.path.join(self.folder, 'method.tdcbdet')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def testConvertJson(self):
+        # a json det file converted to a packed file yields the same boxes and scores, also for dets without score
+        children = [{'mincol': 10, 'minrow': 20, 'maxcol': 40, 'maxrow': 90, 'score': 0.25, 'identity': 'cyclist'},
+                    {'mincol': 50, 'minrow': 20, 'maxcol': 80, 'maxrow': 90, 'identity': 'cyclist'},
+                    {'mincol': 90, 'minrow': 20, 'maxcol': 99, 'maxrow': 90, 'score': None, 'identity': 'cyclist'},
+                    {'mincol': 10, 'minrow': 20, 'maxcol': 40, 'maxrow': 90, 'score': 0.5, 'identity': 'pedestrian'}]
+        for child in children:
+            child.update({'trackid': 'None', 'tags': []})
+        frameId = 'tsinghuaDaimlerDataset_2014-12-04_082614_000027014'
+        jsonFile = os.path.join(self.folder, frameId + '_detection.json')
+        with open(jsonFile, 'w') as f:
+            json.dump({'imgname': frameId + '_leftImg8bit.png', 'children': children}, f)
+
+        detection = Detection(frameId + '_leftImg8bit.png')
+        detection.fromJsonFile(jsonFile)
+        detection.appendToPackedFile(self.packedFile)
+
+        evaluator = Evaluator(None)
+        evaluator.initScore = 0.75
+        jsonDets = evaluator.parseDetFile(jsonFile)
+        evaluator.detReader = PackedDetectionReader(self.packedFile)
+        packedDets = evaluator.parseDetFile(jsonFile)
+        evaluator.detReader.close()
+
+        self.assertTrue(np.array_equal(jsonDets['scores'], [0.25, 0.75, 0.75]))
+        self.assertTrue(np.array_equal(packedDets['scores'], jsonDets['scores']))
+        self.assertTrue(np.array_equal(packedDets['boxes'], jsonDets['boxes']))
+
+    def testReadFrame(self):
+        # the last record of a frame is used, the file is opened again after close
+        with PackedDetectionWriter(self.packedFile) as writer:
+            for frameId, nDets in [('a', 2), ('b', 0), ('a', 3)]:
+                dets = np.zeros(nDets, dtype=PACKED_DET_DTYPE)
+                dets['score'] = np.arange(nDets)
+                writer.writeFrame(frameId, dets)
+
+        with PackedDetectionReader(self.packedFile) as reader:
+            self.assertTrue(reader.isValid())
+            self.assertEqual(reader.getFrameIds(), ['a', 'b'])
+            self.assertTrue(np.array_equal(reader.readFrame('a')['score'], [0, 1, 2]))
+            reader.close()
+            self.assertIsNone(reader.file)
+            self.assertEqual(len(reader.readFrame('b')), 0)
+            self.assertIsNone(reader.readFrame('c'))
+        self.assertIsNone(reader.file)
+
+
+# Evaluation of a synthetic dataset (see synthetic.py), written to a temporary folder
+class DatasetTest(unittest.TestCase):
+    nFrames = 60
+
+    @classmethod
+    def setUpClass(cls):
+        cls.rootFolder = tempfile.mkdtemp(prefix='tdcbTest_')
+        dataset = SyntheticDataset(seed=0)
+        dataset.write(cls.rootFolder, cls.nFrames, disparity=False, camera=False)
+        cls.gtFolder = os.path.join(cls.rootFolder, 'labelData', 'test', 'tsinghuaDaimlerDataset')
+        cls.detFolder = os.path.join(cls.rootFolder, 'detection', dataset.methodName)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.rootFolder)
+
+    def createEvaluator(self, gtFolder=None, detFolder=None):
+        evaluator = Evaluator(gtFolder or self.gtFolder)
+        evaluator.pathToDetFiles = detFolder or self.detFolder
+        evaluator.plot = False
+        self.assertEqual(evaluator.loadDataset(), 1)
+        return evaluator
+
+    # copy of the dataset in a new temporary folder for tests which change files, returns the folder and the gt and
+    # det folders of the copy
+    def copyDataset(self):
+        folder = tempfile.mkdtemp(prefix='tdcbTest_')
+        shutil.copytree(self.rootFolder, os.path.join(folder, 'data'))
+        relGtFolder = os.path.relpath(self.gtFolder, self.rootFolder)
+        relDetFolder = os.path.relpath(self.detFolder, self.rootFolder)
+        return folder, os.path.join(folder, 'data', relGtFolder), os.path.join(folder, 'data', relDetFolder)
+
+    # rewrites a det file with the scores of its dets changed and a later mtime
+    def changeDetFile(self, detFilePath):
+        with open(detFilePath, 'r') as f:
+            jsonDict = json.load(f)
+        for child in jsonDict['children']:
+            child['score'] = 1.0 - child['score']
+        with open(detFilePath, 'w') as f:
+            json.dump(jsonDict, f)
+        self.touchFile(detFilePath)
+
+    def touchFile(self, filePath):
+        stat = os.stat(filePath)
+        os.utime(filePath, (stat.st_atime, stat.st_mtime + 10))
+
+    # PR-curve and MR-FPPI curve of the serial evaluation (loadFrame and evaluateFrame for each frame)
+    def evaluateSerial(self, evaluator):
+        nFrames = 0
+        while evaluator.currentGtFileIdx < len(evaluator.framePairs):
+            if evaluator.loadFrame() == 0:
+                continue
+            evaluator.evaluateFrame()
+            nFrames += 1
+        return evaluator.calcCurves(nFrames)
+
+    def assertCurvesEqual(self, curves, refCurves):
+        for curve, refCurve in zip(curves, refCurves):
+            for values, refValues in zip(curve, refCurve):
+                self.assertTrue(np.array_equal(values, refValues))
+
+    def testParallel(self):
+        for difficulty in ['easy', 'hard']:
+            evaluator = self.createEvaluator()
+            evaluator.difficulty = difficulty
+            refCurves = self.evaluateSerial(evaluator)
+
+            evaluator = self.createEvaluator()
+            evaluator.difficulty = difficulty
+            scores, matched, nofPos, nFrames = evaluator.evaluateDatasetParallel(3)
+            self.assertEqual(nFrames, self.nFrames)
+            self.assertCurvesEqual(evaluator.calcCurvesFromArrays(scores, matched, nofPos, nFrames), refCurves)
+
+    def testBreakdown(self):
+        # the breakdown keeps all det in memory, also if spill runs or score bins are configured
+        evaluator = self.createEvaluator()
+        refBreakdown = evaluator.runBreakdown([('A', self.detFolder)])['A']
+
+        spillDir = tempfile.mkdtemp(prefix='tdcbSpill_')
+        try:
+            for approximatePR in [False, True]:
+                evaluator = self.createEvaluator()
+                evaluator.spillDir = spillDir
+                evaluator.spillRunSize = 10
+                evaluator.approximatePR = approximatePR
+                breakdown = evaluator.runBreakdown([('A', self.detFolder)])['A']
+                self.assertEqual(repr(breakdown), repr(refBreakdown))
+                self.assertEqual((evaluator.spillDir, evaluator.approximatePR), (spillDir, approximatePR))
+                self.assertEqual(os.listdir(spillDir), [])
+        finally:
+            shutil.rmtree(spillDir)
+
+        # the records of the dets are only kept for the breakdown
+        evaluator = self.createEvaluator()
+        self.evaluateSerial(evaluator)
+        self.assertEqual(evaluator.detAll.dtype.names, ('score', 'matched'))
+        self.assertEqual(evaluator.calcBreakdown(), 0)
+
+    def testPrefetchStopped(self):
+        # the read-ahead thread is stopped if a frame cannot be read
+        evaluator = self.createEvaluator()
+        framePairs = evaluator.framePairs[:5] + [(os.path.join(self.rootFolder, 'missing_labelData.json'), None)]
+        self.assertRaises(IOError, evaluator.evaluateFramePairs, framePairs, [('hard', 1, 0.5)])
+        self.assertIsNone(evaluator.prefetcher)
+
+    def testResultCacheKey(self):
+        # the key changes with the configuration and with each gt or det file
+        folder, gtFolder, detFolder = self.copyDataset()
+        try:
+            evaluator = self.createEvaluator(gtFolder, detFolder)
+            keys = [evaluator.getResultCacheKey()]
+            self.assertEqual(self.createEvaluator(gtFolder, detFolder).getResultCacheKey(), keys[0])
+
+            evaluator.minIoU = 0.6
+            keys.append(evaluator.getResultCacheKey())
+            evaluator.minIoU = 0.5
+            evaluator.nmsThreshold = 0.5
+            keys.append(evaluator.getResultCacheKey())
+
+            self.touchFile(evaluator.gtFiles[3])
+            keys.append(self.createEvaluator(gtFolder, detFolder).getResultCacheKey())
+            self.changeDetFile(evaluator.detFiles[5])
+            keys.append(self.createEvaluator(gtFolder, detFolder).getResultCacheKey())
+            os.remove(evaluator.detFiles[7])
+            keys.append(self.createEvaluator(gtFolder, detFolder).getResultCacheKey())
+            self.assertEqual(len(set(keys)), len(keys))
+        finally:
+            shutil.rmtree(folder)
+
+    def testResultCacheEviction(self):
+        # the least recently stored or loaded entries are removed first
+        cacheDir = tempfile.mkdtemp(prefix='tdcbCache_')
+        try:
+            resultCache = ResultCache(cacheDir)
+            arrays = {'scores': np.arange(1000, dtype=np.float64)}
+            for mtime, key in enumerate(['a', 'b', 'c']):
+                resultCache.store(key, arrays)
+                os.utime(resultCache.getEntryPath(key), (1000 + mtime, 1000 + mtime))
+            self.assertTrue(np.array_equal(resultCache.load('a')['scores'], arrays['scores']))
+
+            resultCache.maxBytes = 3 * os.path.getsize(resultCache.getEntryPath('a'))
+            resultCache.store('d', arrays)
+            self.assertIsNone(resultCache.load('b'))
+            self.assertEqual(sorted(os.listdir(cacheDir)), ['a.npz', 'c.npz', 'd.npz'])
+            resultCache.store('e', arrays)
+            self.assertEqual(sorted(os.listdir(cacheDir)), ['a.npz', 'd.npz', 'e.npz'])
+        finally:
+            shutil.rmtree(cacheDir)
+
+    def testResultCacheRun(self):
+        # an unchanged method is not matched again, after a change only the frames of the changed det files are
+        # matched (for both settings of ignoreOtherVRU). The results equal the ones without cache
+        folder, gtFolder, detFolder = self.copyDataset()
+        try:
+            evaluator = self.createEvaluator(gtFolder, detFolder)
+            evaluator.resultCacheDir = os.path.join(folder, 'cache')
+            evaluator.instrumentation.enabled = True
+            for changedFrames, workers, nMatchedFrames in [([], 1, 2 * self.nFrames), ([], 1, 0), ([4], 1, 2), ([10, 20], 2, 4)]:
+                for idxFrame in changedFrames:
+                    self.changeDetFile(evaluator.detFiles[idxFrame])
+                evaluator.instrumentation.reset()
+                evaluator.summary = list()
+                self.assertEqual(evaluator.run([('A', detFolder)], workers=workers), 1)
+                self.assertEqual(evaluator.instrumentation.counters.get('frames', 0), nMatchedFrames)
+
+                refEvaluator = self.createEvaluator(gtFolder, detFolder)
+                refEvaluator.run([('A', detFolder)])
+                self.assertEqual(repr(evaluator.summary), repr(refEvaluator.summary))
+        finally:
+            shutil.rmtree(folder)
+
+    def assertGtCacheEqual(self, evaluator):
+        # the frames of the gt cache equal the parsed gt files
+        parser = Evaluator(None)
+        for gtFilePath in evaluator.gtFiles:
+            gtFrame = evaluator.gtCache.getFrame(evaluator.getFrameId(gtFilePath, evaluator.gtExt))
+            refGtFrame = parser.parseGtFile(gtFilePath)
+            for key in ['boxes', 'identity', 'tags']:
+                self.assertTrue(np.array_equal(gtFrame[key], refGtFrame[key]))
+
+    def testGtCacheRebuild(self):
+        # the cache is used as long as the gt files are unchanged and compiled again after a gt file is changed or added
+        folder, gtFolder, detFolder = self.copyDataset()
+        try:
+            evaluator = self.createEvaluator(gtFolder, detFolder)
+            evaluator.gtCacheFile = os.path.join(folder, 'gt.tdcbgt')
+            self.assertEqual(evaluator.loadDataset(), 1)
+            self.assertTrue(GtCache(evaluator.gtCacheFile).load(evaluator.gtFiles, evaluator.gtCache.header['tagNames']))
+            self.assertGtCacheEqual(evaluator)
+
+            # unchanged, not compiled again
+            cacheStat = os.stat(evaluator.gtCacheFile)
+            self.assertEqual(evaluator.loadDataset(), 1)
+            self.assertEqual(os.stat(evaluator.gtCacheFile).st_mtime, cacheStat.st_mtime)
+            self.assertIsNotNone(evaluator.gtCache.cacheFile)
+
+            # changed gt file
+            gtFilePath = evaluator.gtFiles[3]
+            with open(gtFilePath, 'r') as f:
+                jsonDict = json.load(f)
+            jsonDict['children'].append({'mincol': 100, 'minrow': 200, 'maxcol': 140, 'maxrow': 290, 'identity': 'cyclist',
+                                         'tags': ['occluded>10'], 'trackid': 'cyclist_1', 'type': 'rect', 'uniqueid': 99})
+            with open(gtFilePath, 'w') as f:
+                json.dump(jsonDict, f)
+            self.touchFile(gtFilePath)
+            self.assertFalse(GtCache(evaluator.gtCacheFile).load(evaluator.gtFiles, evaluator.gtCache.header['tagNames']))
+            self.assertEqual(evaluator.loadDataset(), 1)
+            self.assertGtCacheEqual(evaluator)
+
+            # added gt file (without det file)
+            frameId = evaluator.getFrameId(gtFilePath, evaluator.gtExt)
+            shutil.copy(gtFilePath, os.path.join(gtFolder, frameId[:-9] + '000999999' + evaluator.gtExt))
+            self.assertEqual(evaluator.loadDataset(), 1)
+            self.assertEqual(len(evaluator.gtCache.frameIds), self.nFrames + 1)
+            self.assertGtCacheEqual(evaluator)
+        finally:
+            shutil.rmtree(folder)
+
+    def testGtCachePickle(self):
+        # the memory-mapped gt cache is sent to the workers without its arrays and mapped again
+        folder = tempfile.mkdtemp(prefix='tdcbTest_')
+        try:
+            evaluator = self.createEvaluator()
+            evaluator.gtCacheFile = os.path.join(folder, 'gt.tdcbgt')
+            self.assertEqual(evaluator.loadDataset(), 1)
+            pickled = pickle.dumps(evaluator.gtCache, pickle.HIGHEST_PROTOCOL)
+            self.assertLess(len(pickled), evaluator.gtCache.boxes.nbytes)
+            gtCache = pickle.loads(pickled)
+            self.assertTrue(isinstance(gtCache.boxes, np.memmap))
+            evaluator.gtCache = gtCache
+            self.assertGtCacheEqual(evaluator)
+
+            scores, matched, nofPos, nFrames = evaluator.evaluateDatasetParallel(2)
+            refCurves = self.evaluateSerial(self.createEvaluator())
+            self.assertCurvesEqual(evaluator.calcCurvesFromArrays(scores, matched, nofPos, nFrames), refCurves)
+        finally:
+            shutil.rmtree(folder)
+
+    def testInvalidDetFolder(self):
+        # the evaluation modes cancel on a det folder without det files
+        missingFolder = os.path.join(self.rootFolder, 'missing')
+        evaluator = self.createEvaluator()
+        evaluator.verbose = 0
+        for runMode in [evaluator.runAllSettings, evaluator.runIoUSweep, evaluator.runNMSSweep, evaluator.runBreakdown,
+                        evaluator.runBootstrap]:
+            self.assertIsNone(runMode([('A', self.detFolder), ('B', missingFolder)]))
+        self.assertFalse(evaluator.keepDetRecords)
+
+    def testNMSSweep(self):
+        # one pass over all NMS thresholds (IoU calculated once for the raw dets, pairs or full matrices) yields the
+        # results of a pass per threshold
+        for sparseIoUMinPairs in [20000, 0]:
+            evaluator = self.createEvaluator()
+            evaluator.sparseIoUMinPairs = sparseIoUMinPairs
+            evaluator.sparseIoUMaxShare = 1.0
+            settings = [('hard', 1, 0.5, nmsThreshold) for nmsThreshold in [None, 0.1, 0.3, 0.5]]
+            scores, detCounts, matched, nofPos = evaluator.evaluateFramePairs(evaluator.framePairs, settings)
+            nKept = set()
+            for setting in settings:
+                refScores, refDetCounts, refMatched, refNofPos = evaluator.evaluateFramePairs(evaluator.framePairs, [setting])
+                self.assertTrue(np.array_equal(matched[setting], refMatched[setting]))
+                self.assertTrue(np.array_equal(nofPos[setting], refNofPos[setting]))
+                nKept.add(int(np.count_nonzero(matched[setting] != -1)))
+            # the thresholds suppress different dets
+            self.assertEqual(len(nKept), len(settings))
+
+
+if __name__ == '__main__':
+    unittest.main()